@@ -1,6 +1,37 @@
 from .query import AQuery
 from .query import AQueryError
 from .table import ATable
+from .columnar_table import AColumnarTable
+from .table_index import ATableIndex
+from .snapshot import AArrowTable
+from .table_view import ATableView
 from .filter import AFilter
+from .writer import AWriter
+from .writer import ACSVWriter
+from .writer import AJSONLinesWriter
+from .writer import AParquetWriter
 from .write_table import AWriteTable
-from .query_engine import AQueryEngine
\ No newline at end of file
+from .write_workbook import AWriteWorkbook
+from .query_engine import AQueryEngine
+from .result_stream import AResultStream
+from .query_pool import AQueryEnginePool
+from .async_query_engine import AAsyncQueryEngine
+from .query_cache import AQueryCache
+from .temp_table import ATempTable
+from .backend import ABackend
+from .backend import AMSSQLBackend
+from .sqlite_backend import ASQLiteBackend
+from .query_stats import AQueryStats
+from .query_stats import AJSONLinesSink
+from .partition import APartitionedQuery
+from .partition import APartitionValues
+from .aggregate import AAggregate
+from .aggregate import AAggregateQuery
+from .aggregate import ACountQuery
+from .rules import ARule
+from .rules import AIsEmpty
+from .rules import ALike
+from .rules import AMismatch
+from .rules import AColumnsDiffer
+from .rules import ARuleQuery
+from .rules import ARuleFilter
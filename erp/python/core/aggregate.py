@@ -0,0 +1,113 @@
+"""
+module: aggregate
+
+Computes counts and other aggregates over the rows of a query on the server,
+so that only the aggregates are transferred
+"""
+from .query import AQuery
+from .query import AQueryError
+from .sqlutil import strip_order_by
+
+
+class AAggregate(object):
+    """ An aggregate over a result column of a query.
+
+    Attributes:
+        function : One of COUNT, SUM, MIN, MAX and AVG
+        column   : Name of the result column, or None to count the rows
+        distinct : If True only the distinct values of the column are
+                   aggregated
+        name     : Name of the aggregate in the result
+    """
+    FUNCTIONS = ('COUNT', 'SUM', 'MIN', 'MAX', 'AVG')
+
+    def __init__(self, function, column=None, distinct=False, name=None):
+        function = function.upper()
+        if function not in AAggregate.FUNCTIONS:
+            raise AQueryError('Undefined aggregate ' + function)
+        if column is None and (function != 'COUNT' or distinct):
+            raise AQueryError(function + ' needs a column')
+        self._function = function
+        self._column = column
+        self._distinct = distinct
+        if name is None:
+            name = '_'.join([function] + (['DISTINCT'] if distinct else []) +
+                ([column] if column else []))
+        self._name = name
+
+    @property
+    def function(self):
+        return self._function
+
+    @property
+    def column(self):
+        return self._column
+
+    @property
+    def distinct(self):
+        return self._distinct
+
+    @property
+    def name(self):
+        return self._name
+
+    def sql(self, alias):
+        if self._column is None:
+            return 'COUNT(*)'
+        return '{}({}{}.{})'.format(self._function,
+            'DISTINCT ' if self._distinct else '', alias, self._column)
+
+
+class AAggregateQuery(AQuery):
+    """ Computes aggregates over the rows of a query.
+
+    The query is wrapped as a derived table, so the server returns a single
+    row holding one column per aggregate.
+
+    Attributes:
+        base       : The aggregated query
+        aggregates : The list of AAggregate objects
+        values     : The list of aggregate values once the query has run
+    """
+    ALIAS = 'agg'
+
+    def __init__(self, base, aggregates):
+        if not aggregates:
+            raise AQueryError('At least one aggregate is required')
+        self._base = base
+        self._aggregates = list(aggregates)
+        super().__init__()
+        self._requires = base.requires
+
+    @property
+    def base(self):
+        return self._base
+
+    @property
+    def aggregates(self):
+        return self._aggregates
+
+    @property
+    def values(self):
+        return list(self.table._data[0])
+
+    def _init_query(self):
+        self._query = 'SELECT {} FROM ({}\n) AS {}'.format(', '.join(
+            '{} AS {}'.format(aggregate.sql(self.ALIAS), aggregate.name)
+            for aggregate in self._aggregates),
+            strip_order_by(self._base.query), self.ALIAS)
+        self._query_tuple = self._base.query_tuple
+
+
+class ACountQuery(AAggregateQuery):
+    """ Counts the rows of a query without transferring them.
+
+    Attributes:
+        count : The number of rows once the query has run
+    """
+    def __init__(self, base):
+        super().__init__(base, [AAggregate('COUNT', name='N')])
+
+    @property
+    def count(self):
+        return self.values[0]
@@ -0,0 +1,243 @@
+"""
+module: async_query_engine
+
+Executes queries from asyncio code without blocking the event loop
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from .query import AQueryError
+from .query_engine import AQueryEngine
+from .query_engine import DEFAULT_BATCH_SIZE
+
+
+class AAsyncQueryEngine(object):
+    """ Implements an asyncio front end to the query engine.
+
+    The DB API 2.0 drivers are blocking. This engine runs every driver call
+    on a bounded thread executor so that a slow query does not stall the
+    other tasks of the event loop. Each running query holds one connection
+    and the number of connections is bounded by size. Connections are
+    opened on demand and reused.
+
+    A query may be given a deadline in seconds. When the deadline passes or
+    the awaiting task is cancelled, the engine asks the server to cancel the
+    statement and raises in the caller right away. The connection is
+    discarded once the blocking call has returned and its slot is then
+    given back to the pool.
+
+    Attributes:
+        server   : string name of the SQL Server instance
+        user     : string name of the user
+        password : string name of the user
+        database : string name of the database to connect to
+        port     : integer port over which the server is listening
+        cache    : Optional AQueryCache shared by all the connections
+        backend  : Optional ABackend used instead of SQL Server
+        listeners : Callables that receive the AQueryStats of each
+                   execution on any of the connections
+        columnar : If True results are stored in AColumnarTable objects
+        records  : If True rows are named tuples of the column names
+        size     : maximum number of concurrent queries and connections
+    """
+    def __init__(self, server=None, user=None, password=None,
+            database=None, port=1433, size=4, cache=None, backend=None,
+            listeners=None, columnar=False,
+            records=False):
+        if size < 1:
+            raise AQueryError('Engine size must be a positive integer')
+        self._server = server
+        self._user = user
+        self._password = password
+        self._database = database
+        self._port = port
+        self._size = size
+        self._cache = cache
+        self._backend = backend
+        self._listeners = listeners
+        self._columnar = columnar
+        self._records = records
+        self._idle = []
+        self._abandoned = set()
+        self._slots = asyncio.Semaphore(size)
+        self._executor = ThreadPoolExecutor(max_workers=size,
+            thread_name_prefix='AAsyncQueryEngine')
+
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        raise RuntimeError('This is a read-only field')
+
+    def _create_engine(self):
+        return AQueryEngine(
+            server=self._server,
+            user=self._user,
+            password=self._password,
+            database=self._database,
+            port=self._port,
+            cache=self._cache,
+            backend=self._backend,
+            listeners=self._listeners,
+            columnar=self._columnar,
+            records=self._records)
+
+    def _deadline(self, timeout):
+        if timeout is None:
+            return None
+        return asyncio.get_running_loop().time() + timeout
+
+    def _remaining(self, deadline):
+        if deadline is None:
+            return None
+        return max(deadline - asyncio.get_running_loop().time(), 0)
+
+    async def _checkout(self, deadline):
+        ''' Waits for a free slot and returns an engine for it '''
+        await asyncio.wait_for(self._slots.acquire(),
+            self._remaining(deadline))
+        if self._idle:
+            return self._idle.pop()
+        try:
+            return await self._call(None, deadline, self._create_engine)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, engine):
+        ''' Returns an engine to the pool unless it has been abandoned '''
+        if engine in self._abandoned:
+            return
+        self._idle.append(engine)
+        self._slots.release()
+
+    def _abandon(self, engine, future):
+        ''' Cancels the statement running on an engine and discards the
+        engine. The slot is released only once the blocking call has
+        returned, so the executor never runs more than size calls.
+        '''
+        self._abandoned.add(engine)
+        try:
+            engine.cancel()
+        except Exception:
+            pass
+        def done(future):
+            # The error of the cancelled statement is expected
+            if not future.cancelled() and future.exception() is not None:
+                logging.debug('Abandoned query failed : %s',
+                    future.exception())
+            self._abandoned.discard(engine)
+            try:
+                engine.close()
+            except Exception:
+                pass
+            self._slots.release()
+        future.add_done_callback(done)
+
+    async def _call(self, engine, deadline, fn, *args):
+        ''' Runs a blocking call on the executor.
+
+        If the call does not complete before the deadline or the awaiting
+        task is cancelled, the statement on the engine is cancelled and the
+        engine is abandoned.
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, fn, *args)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future),
+                self._remaining(deadline))
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if engine is not None:
+                self._abandon(engine, future)
+            raise
+
+    async def execute(self, query, timeout=None):
+        """ Executes a query and parks the results in the query object.
+
+        Args :
+            query : A query object
+            timeout : Optional deadline in seconds for the query
+
+        Returns :
+            The query object
+
+        Raises :
+            asyncio.TimeoutError if the deadline passes
+        """
+        deadline = self._deadline(timeout)
+        engine = await self._checkout(deadline)
+        try:
+            await self._call(engine, deadline, engine.execute, query)
+        finally:
+            self._release(engine)
+        return query
+
+    async def execute_many(self, queries, timeout=None):
+        """ Executes a number of independent queries concurrently.
+
+        Args :
+            queries : An iterable of query objects
+            timeout : Optional deadline in seconds for each query
+
+        Returns :
+            The list of query objects in the order they were given
+        """
+        return list(await asyncio.gather(
+            *[self.execute(query, timeout) for query in queries]))
+
+    async def iterate(self, query, batch_size=DEFAULT_BATCH_SIZE,
+            timeout=None):
+        """ Executes a query and yields its rows as they are fetched.
+
+        Usage :
+            async for row in engine.iterate(query):
+                ...
+
+        Args :
+            query : A query object
+            batch_size : Number of rows fetched per round trip
+            timeout : Optional deadline in seconds for the whole query
+        """
+        deadline = self._deadline(timeout)
+        engine = await self._checkout(deadline)
+        stream = None
+        batches = None
+        try:
+            stream = await self._call(engine, deadline, engine.execute_iter,
+                query, batch_size)
+            batches = stream.batches()
+            while True:
+                batch = await self._call(engine, deadline, next, batches,
+                    None)
+                if batch is None:
+                    break
+                for row in batch:
+                    yield row
+        finally:
+            try:
+                # Closing drains the cursor, which blocks like a fetch.
+                # Closing the batches closes the stream as well.
+                if stream and engine not in self._abandoned:
+                    await self._call(engine, None,
+                        batches.close if batches else stream.close)
+            finally:
+                self._release(engine)
+
+    async def close(self):
+        """ Waits for running queries and closes all connections """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown, True)
+        for engine in self._idle:
+            engine.close()
+        self._idle = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
@@ -0,0 +1,178 @@
+"""
+module: backend
+
+Abstracts the data base driver used by the query engine
+"""
+from abc import ABCMeta,abstractmethod
+import datetime
+from decimal import Decimal
+
+from .query import AQueryError
+from .table import ATable
+
+try:
+    import pymssql
+except ImportError:
+    pymssql = None
+
+
+class ABackend(object, metaclass=ABCMeta):
+    """ A data base backend.
+
+    The query engine is written against DB API 2.0. A backend supplies
+    everything that differs between data bases: how a connection is opened,
+    how the SQL text of a query is adapted to the dialect of the data base
+    and how the type of a result column is described.
+
+    Queries are written in the T-SQL dialect of the ERP data base with
+    pyformat (%s) parameters.
+
+    Attributes:
+        database : string name of the database the backend connects to
+        supports_batches : True if one statement may hold several queries
+                   whose result sets are read with nextset
+    """
+    supports_batches = False
+
+    def __init__(self, database):
+        self._database = database
+
+    @property
+    def database(self):
+        return self._database
+
+    @database.setter
+    def database(self, database):
+        raise RuntimeError('This is a read-only field')
+
+    @abstractmethod
+    def connect(self):
+        ''' Opens and returns a new DB API 2.0 connection '''
+        pass
+
+    def translate(self, sql):
+        ''' Adapts the T-SQL text of a query to the backend dialect '''
+        return sql
+
+    def materialize_sql(self, temp_table):
+        ''' Returns the statement that materializes a temporary table '''
+        return temp_table.create_sql()
+
+    def cancel(self, conn):
+        ''' Cancels the statement running on a connection. Called from a
+        thread other than the one executing the statement.
+        '''
+        raise AQueryError('Cancel is not supported by ' + type(self).__name__)
+
+    def is_disconnect(self, error):
+        ''' Returns True if an error raised by the driver means that the
+        connection has been dropped and a new one may succeed
+        '''
+        return False
+
+    @abstractmethod
+    def translate_type_code(self, type_code):
+        ''' Given a type code returns a string description of the type.
+
+        Returns None if the backend does not report the type of a column.
+        The type is then inferred from the values in the column.
+        '''
+        pass
+
+    def describe(self, cursor):
+        ''' Returns the column names and the column types of the result
+        set the cursor is positioned on.
+
+        Note: description attribute returns a lits of tuples where
+        each tuple describes the columns.
+        '''
+        # Return it as list and not as tuples
+        # Note : This implies mutability that seems worng but is useful
+        # for minor data massaging without allocation.
+        cols = []
+        types = []
+        for col in cursor.description:
+            cols.append(col[0])
+            types.append(self.translate_type_code(col[1]))
+        return cols, types
+
+    def infer_type(self, value):
+        ''' Returns the string description of the type of a value '''
+        if isinstance(value, str):
+            return ATable.STRING
+        if isinstance(value, (bool, int, float, Decimal)):
+            return ATable.NUMBER
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            return ATable.DATETIME
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return ATable.BINARY
+        raise AQueryError('Undefined type ' + type(value).__name__)
+
+
+class AMSSQLBackend(ABackend):
+    """ A backend for Microsoft SQL Server using pymssql.
+
+    Attributes:
+        server   : string name of the SQL Server instance
+        user     : string name of the user
+        password : string name of the user
+        database : string name of the database to connect to
+        port     : integer port over which the server is listening
+    """
+    supports_batches = True
+
+    def __init__(self, server, user, password, database, port):
+        super().__init__(database)
+        if pymssql is None:
+            raise AQueryError('pymssql is required to connect to SQL Server')
+        self._server = server
+        self._user = user
+        self._password = password
+        self._port = port
+
+    def connect(self):
+        return pymssql.connect(
+            server=self._server,
+            user=self._user,
+            password=self._password,
+            database=self._database,
+            timeout=0,
+            login_timeout=60,
+            charset='UTF-8',
+            as_dict=False,
+            host='',
+            appname=None,
+            port=self._port,
+            autocommit=False)
+
+    def cancel(self, conn):
+        # pymssql exposes the cancel request on the _mssql connection
+        conn._conn.cancel()
+
+    def is_disconnect(self, error):
+        if not isinstance(error, (pymssql.OperationalError,
+                pymssql.InterfaceError)):
+            return False
+        # DB-Library errors : read from or write to the server failed,
+        # unable to connect, the connection is dead or not enabled
+        code = error.args[0] if error.args else None
+        return code in (20004, 20006, 20009, 20047)
+
+    def translate_type_code(self, type_code):
+        ''' Given a type code returns a string description of the type.
+
+        DB-API specifies a list of types for each column. This gives
+        a string representation that can be used by objects downstream
+        in the Data Pipeline without adding dependencies to DB-API.
+        '''
+        if type_code == pymssql.STRING:
+            return 'string'
+        if type_code == pymssql.NUMBER:
+            return 'number'
+        if type_code == 5: # Handle Row ID as a Number
+            return 'number'
+        if type_code == pymssql.DATETIME:
+            return 'datetime'
+        if type_code == pymssql.BINARY:
+            return 'binary'
+        raise AQueryError('Undefined type_code ' + str(type_code))
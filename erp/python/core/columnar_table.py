@@ -0,0 +1,509 @@
+"""
+module: columnar_table
+
+A table that stores each column in a typed array instead of a list of rows
+"""
+import datetime
+import sys
+
+from .query import AQueryError
+from .table import ATable
+from .table import _LazyRows
+from .table import _TypedTable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class _Column(object):
+    ''' A column held in a numpy array with a mask of its NULL entries '''
+    def __init__(self, values, nulls=None):
+        self._values = values
+        self._nulls = nulls if nulls is not None and nulls.any() else None
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, idx):
+        if self._nulls is not None and self._nulls[idx]:
+            return None
+        return self._values[idx:idx + 1].tolist()[0]
+
+    def tolist(self, start, stop):
+        values = self._values[start:stop].tolist()
+        if self._nulls is not None:
+            for idx in numpy.flatnonzero(self._nulls[start:stop]).tolist():
+                values[idx] = None
+        return values
+
+    def valid(self):
+        ''' Returns the array of the values that are not NULL '''
+        if self._values.dtype == object:
+            return self._values[numpy.array([value is not None
+                for value in self._values], dtype=bool)]
+        if self._nulls is None:
+            return self._values
+        return self._values[~self._nulls]
+
+    @property
+    def nbytes(self):
+        size = self._values.nbytes
+        if self._values.dtype == object:
+            size += sum(sys.getsizeof(x) for x in self._values)
+        if self._nulls is not None:
+            size += self._nulls.nbytes
+        return size
+
+
+class _CategoricalColumn(object):
+    ''' A column of strings held as codes into a list of distinct values.
+    The code of NULL is -1. The categories are sorted when their values can
+    be compared, so that the order of the codes is the order of the values.
+    '''
+    def __init__(self, codes, categories, ordered):
+        self._codes = codes
+        self._categories = categories
+        self._ordered = ordered
+
+    def __len__(self):
+        return len(self._codes)
+
+    def get(self, idx):
+        code = int(self._codes[idx])
+        return self._categories[code] if code >= 0 else None
+
+    def tolist(self, start, stop):
+        categories = self._categories
+        return [categories[code] if code >= 0 else None
+            for code in self._codes[start:stop].tolist()]
+
+    def valid(self):
+        return self._codes[self._codes >= 0]
+
+    @property
+    def categories(self):
+        return self._categories
+
+    @property
+    def ordered(self):
+        return self._ordered
+
+    @property
+    def nbytes(self):
+        return self._codes.nbytes + sys.getsizeof(self._categories) + \
+            sum(sys.getsizeof(x) for x in self._categories)
+
+
+# The numpy type and the value that stands in for NULL for each kind of
+# column
+_DTYPES = {
+    'bool' : (bool, False),
+    'int' : (numpy.int64 if numpy else None, 0),
+    'float' : (numpy.float64 if numpy else None, 0.0),
+    'date' : ('datetime64[D]', datetime.date.min),
+    'datetime' : ('datetime64[us]', datetime.datetime.min)}
+
+
+def _objects(values):
+    ''' Returns a one dimensional object array, even if the values are
+    sequences themselves
+    '''
+    return numpy.array(list(values) + [None], dtype=object)[:-1]
+
+
+def _kind(values):
+    ''' Returns the kind of array that can hold a list of values '''
+    types = set(type(value) for value in values if value is not None)
+    if not types:
+        return 'null'
+    if types == {bool}:
+        return 'bool'
+    if types == {int}:
+        return 'int'
+    if types <= {int, float}:
+        return 'float'
+    if types == {datetime.date}:
+        return 'date'
+    if types == {datetime.datetime} and all(value is None or
+            value.tzinfo is None for value in values):
+        return 'datetime'
+    return 'object'
+
+
+def _array(kind, values):
+    ''' Returns the array and the NULL mask holding values as kind '''
+    if kind in ('object', 'null'):
+        return _objects(values), None
+    dtype, fill = _DTYPES[kind]
+    nulls = numpy.array([value is None for value in values], dtype=bool)
+    return numpy.array([fill if value is None else value
+        for value in values], dtype=dtype), nulls
+
+
+class _ColumnBuilder(object):
+    ''' Converts the values of a column batch by batch so that the python
+    objects of one batch only are alive at a time
+    '''
+    def __init__(self, type_string):
+        self._type = type_string
+        self._chunks = []
+        self._index = {}
+
+    def append(self, values):
+        if self._type == ATable.STRING:
+            index = self._index
+            codes = [-1 if value is None else index.setdefault(value,
+                len(index)) for value in values]
+            self._chunks.append(numpy.array(codes, dtype=numpy.int32))
+            return
+        kind = _kind(values)
+        try:
+            self._chunks.append((kind,) + _array(kind, values))
+        except OverflowError:
+            self._chunks.append(('object',) + _array('object', values))
+
+    def _final_kind(self):
+        kinds = set(kind for kind, _, _ in self._chunks)
+        kinds.discard('null')
+        if kinds == {'int', 'float'}:
+            return 'float'
+        if len(kinds) == 1:
+            return kinds.pop()
+        return 'object'
+
+    def build(self):
+        if self._type == ATable.STRING:
+            return self._build_categorical()
+        kind = self._final_kind()
+        values = []
+        nulls = []
+        for chunk_kind, chunk, chunk_nulls in self._chunks:
+            if chunk_kind != kind:
+                chunk, chunk_nulls = _array(kind,
+                    _Column(chunk, chunk_nulls).tolist(0, len(chunk)))
+            values.append(chunk)
+            if chunk_nulls is None:
+                chunk_nulls = numpy.zeros(len(chunk), dtype=bool)
+            nulls.append(chunk_nulls)
+        if not values:
+            return _Column(_objects([]))
+        if kind == 'object':
+            return _Column(numpy.concatenate(values))
+        return _Column(numpy.concatenate(values), numpy.concatenate(nulls))
+
+    def _build_categorical(self):
+        categories = list(self._index)
+        codes = numpy.concatenate(self._chunks) if self._chunks else \
+            numpy.array([], dtype=numpy.int32)
+        try:
+            order = sorted(range(len(categories)),
+                key=categories.__getitem__)
+        except TypeError:
+            return _CategoricalColumn(codes, categories, False)
+        # The extra last entry maps the code -1 of NULL onto itself
+        remap = numpy.empty(len(categories) + 1, dtype=numpy.int32)
+        remap[numpy.array(order, dtype=numpy.int64)] = numpy.arange(
+            len(categories), dtype=numpy.int32)
+        remap[-1] = -1
+        return _CategoricalColumn(remap[codes],
+            [categories[idx] for idx in order], True)
+
+
+class _Rows(_LazyRows):
+    ''' The rows of a columnar table '''
+    def __init__(self, columns, n_rows):
+        self._columns = columns
+        self._n_rows = n_rows
+
+    def __len__(self):
+        return self._n_rows
+
+    def _row(self, idx):
+        return [column.get(idx) for column in self._columns]
+
+    def _rows(self, start, stop):
+        return [list(row) for row in zip(*[column.tolist(start, stop)
+            for column in self._columns])]
+
+
+class AColumnarTable(_TypedTable, ATable):
+    """ A table that stores each column in a typed array.
+
+    Numbers are held in int64 or float64 numpy arrays, dates and times in
+    datetime64 arrays and strings as codes into the sorted list of their
+    distinct values. NULL entries are tracked by a mask. Columns of values
+    that have no compact representation, e.g. Decimal, are held in object
+    arrays.
+
+    The table keeps the interface of ATable. Rows are built as lists when
+    they are read, so filters written against ATable keep working, while
+    the sum, count, min and max of a column are computed on the arrays.
+
+    Note : The rows of a columnar table cannot be modified in place.
+    Assigning _data re-encodes the table.
+
+    Note : numpy is required.
+
+    Attributes:
+        nbytes : Memory held by the columns in bytes
+    """
+    _KIND = 'a columnar table'
+
+    def __init__(self):
+        if numpy is None:
+            raise AQueryError('numpy is required for columnar tables')
+        self._arrays = None
+        self._n_rows = 0
+        self._rows = None
+        super().__init__()
+
+    @classmethod
+    def builder(cls, columns, types):
+        """ Returns a builder that encodes the rows of a table batch by
+        batch. Call append with each batch of rows and build at the end.
+        """
+        return AColumnarTableBuilder(columns, types)
+
+    @classmethod
+    def from_rows(cls, columns, types, rows):
+        builder = cls.builder(columns, types)
+        builder.append(list(rows))
+        return builder.build()
+
+    @classmethod
+    def from_table(cls, table):
+        return cls.from_rows(table._columns, table._types, table._data or [])
+
+    @property
+    def _data(self):
+        if self._arrays is None:
+            return None
+        # The same view is returned until the table is re-encoded, so that
+        # indexes over the table stay valid
+        if self._rows is None:
+            self._rows = _Rows(self._arrays, self._n_rows)
+        return self._rows
+
+    @_data.setter
+    def _data(self, data):
+        self._rows = None
+        if data is None:
+            self._arrays = None
+            self._n_rows = 0
+            return
+        table = AColumnarTable.from_rows(self._columns, self._types, data)
+        self._arrays = table._arrays
+        self._n_rows = table._n_rows
+
+    @property
+    def nbytes(self):
+        return sum(column.nbytes for column in self._arrays or [])
+
+    def copy(self):
+        ''' Returns a new table that shares the columns of this one '''
+        table = AColumnarTable()
+        table._columns = list(self._columns)
+        table._types = list(self._types) if self._types else self._types
+        table._arrays = self._arrays
+        table._n_rows = self._n_rows
+        return table
+
+    def column(self, name):
+        ''' Returns the values of a column as a list '''
+        return self._arrays[self.index(name)].tolist(0, self._n_rows)
+
+    def groups(self, columns):
+        ''' Groups the rows by the values of columns. Returns the position
+        of the first row of each group, with the groups in the order in
+        which they occur, and the group of each row. NULL forms a group of
+        its own. Returns None if a column holds values that are not kept in
+        a typed array, e.g. Decimal.
+        '''
+        codes = []
+        for name in columns:
+            column = self._arrays[self.index(name)]
+            if isinstance(column, _CategoricalColumn):
+                codes.append((column._codes.astype(numpy.int64),
+                    len(column.categories)))
+                continue
+            if column._values.dtype == object:
+                return None
+            distinct, inverse = numpy.unique(column._values,
+                return_inverse=True)
+            inverse = inverse.reshape(-1)
+            if column._nulls is not None:
+                inverse = numpy.where(column._nulls, -1, inverse)
+            codes.append((inverse, len(distinct)))
+        if not codes or not self._n_rows:
+            return (numpy.zeros(min(self._n_rows, 1), dtype=numpy.int64),
+                numpy.zeros(self._n_rows, dtype=numpy.int64))
+        # The codes of the columns, NULL included, are combined into one
+        # number per row while they fit
+        keys = numpy.zeros(self._n_rows, dtype=numpy.int64)
+        size = 1
+        for column_codes, n_codes in codes:
+            size = size * (n_codes + 1)
+            if size >= 2 ** 62:
+                keys = numpy.stack([column_codes
+                    for column_codes, _ in codes], axis=1)
+                break
+            keys = keys * (n_codes + 1) + column_codes + 1
+        _, first, inverse = numpy.unique(keys, axis=0 if keys.ndim > 1
+            else None, return_index=True, return_inverse=True)
+        # Number the groups in the order of their first rows
+        order = numpy.argsort(first, kind='stable')
+        rank = numpy.empty(len(order), dtype=numpy.int64)
+        rank[order] = numpy.arange(len(order))
+        return first[order], rank[inverse.reshape(-1)]
+
+    def _grouped(self, column, groups):
+        ''' Returns the group of each value of a column that is not NULL
+        and those values
+        '''
+        _, inverse = groups
+        if isinstance(column, _CategoricalColumn):
+            mask = column._codes >= 0
+        elif column._values.dtype == object:
+            mask = numpy.array([value is not None
+                for value in column._values], dtype=bool)
+        elif column._nulls is not None:
+            mask = ~column._nulls
+        else:
+            return inverse, column._values
+        return inverse[mask], column.valid()
+
+    def count(self, name=None, groups=None):
+        ''' Returns the number of values of a column that are not NULL, or
+        the number of rows without a column. With the groups returned by
+        groups, returns the list of the counts of each group.
+        '''
+        if groups is None:
+            if name is None:
+                return self._n_rows
+            return int(len(self._arrays[self.index(name)].valid()))
+        first, inverse = groups
+        if name is not None:
+            inverse, _ = self._grouped(self._arrays[self.index(name)],
+                groups)
+        return numpy.bincount(inverse, minlength=len(first)).tolist()
+
+    def sum(self, name, groups=None):
+        ''' Returns the sum of the values of a numeric column. With the
+        groups returned by groups, returns the list of the sums of each
+        group, None for a group without values.
+        '''
+        column = self._arrays[self.index(name)]
+        if isinstance(column, _CategoricalColumn):
+            raise AQueryError('Cannot sum the text column ' + name)
+        if groups is None:
+            values = column.valid()
+            if values.dtype == object:
+                return sum(values.tolist())
+            return values.sum().item()
+        inverse, values = self._grouped(column, groups)
+        totals = [None] * len(groups[0])
+        if values.dtype == object:
+            for group, value in zip(inverse.tolist(), values.tolist()):
+                totals[group] = value if totals[group] is None else \
+                    totals[group] + value
+            return totals
+        if values.dtype == bool:
+            values = values.astype(numpy.int64)
+        sums = numpy.zeros(len(totals), dtype=values.dtype)
+        numpy.add.at(sums, inverse, values)
+        counts = numpy.bincount(inverse, minlength=len(totals))
+        return [total if count else None
+            for total, count in zip(sums.tolist(), counts.tolist())]
+
+    def min(self, name, groups=None):
+        ''' Returns the smallest value of a column or None if it has none.
+        With the groups returned by groups, returns the list of the
+        smallest values of each group.
+        '''
+        return self._extreme(name, min, groups)
+
+    def max(self, name, groups=None):
+        ''' Returns the largest value of a column or None if it has none.
+        With the groups returned by groups, returns the list of the largest
+        values of each group.
+        '''
+        return self._extreme(name, max, groups)
+
+    def _extreme(self, name, function, groups=None):
+        column = self._arrays[self.index(name)]
+        if groups is not None:
+            return self._group_extreme(column, function, groups)
+        values = column.valid()
+        if not len(values):
+            return None
+        if isinstance(column, _CategoricalColumn):
+            if not column.ordered:
+                return function(column.categories[code]
+                    for code in set(values.tolist()))
+            code = values.min() if function is min else values.max()
+            return column.categories[int(code)]
+        if values.dtype == object:
+            return function(values.tolist())
+        value = values.min() if function is min else values.max()
+        return value.tolist()
+
+    def _group_extreme(self, column, function, groups):
+        inverse, values = self._grouped(column, groups)
+        extremes = [None] * len(groups[0])
+        categorical = isinstance(column, _CategoricalColumn)
+        if values.dtype == object or (categorical and not column.ordered):
+            values = values.tolist()
+            if categorical:
+                values = [column.categories[code] for code in values]
+            for group, value in zip(inverse.tolist(), values):
+                extremes[group] = value if extremes[group] is None else \
+                    function(extremes[group], value)
+            return extremes
+        if not len(values):
+            return extremes
+        # Each group starts from one of its values
+        found = numpy.empty(len(extremes), dtype=values.dtype)
+        found[inverse] = values
+        (numpy.minimum if function is min else numpy.maximum).at(found,
+            inverse, values)
+        counts = numpy.bincount(inverse, minlength=len(extremes)).tolist()
+        for group, value in enumerate(found.tolist()):
+            if counts[group]:
+                extremes[group] = column.categories[value] if categorical \
+                    else value
+        return extremes
+
+
+class AColumnarTableBuilder(object):
+    """ Builds an AColumnarTable from batches of rows.
+
+    Attributes:
+        columns : The list containing the heading of each column
+        types   : The list containing the type of each column
+    """
+    def __init__(self, columns, types):
+        if numpy is None:
+            raise AQueryError('numpy is required for columnar tables')
+        self._columns = list(columns)
+        self._types = list(types) if types else [None] * len(columns)
+        self._builders = [_ColumnBuilder(type_string)
+            for type_string in self._types]
+        self._n_rows = 0
+
+    def append(self, rows):
+        ''' Encodes a batch of rows '''
+        if not rows:
+            return
+        for idx, builder in enumerate(self._builders):
+            builder.append([row[idx] for row in rows])
+        self._n_rows += len(rows)
+
+    def build(self):
+        table = AColumnarTable()
+        table._columns = self._columns
+        table._types = self._types
+        table._arrays = [builder.build() for builder in self._builders]
+        table._n_rows = self._n_rows
+        return table
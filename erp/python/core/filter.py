@@ -55,7 +55,7 @@ class AFilter(AQueryBase, metaclass=ABCMeta):
         
         Takes the results of a query and performs filter operation. 
         '''
-        if not self._query._table:
+        if self._query._table is None:
             raise RuntimeError('Query has not been executed')
         self._table = ATable()
         if self._reason:
@@ -67,6 +67,8 @@ class AFilter(AQueryBase, metaclass=ABCMeta):
             self._table._columns = self._query._table._columns
             self._table._types = self._query._table._types
         self._table._data = []
+        # Filtered rows keep the types of the rows of the query
+        self._table._trusted = self._query._table._trusted
         self._filter()
         self._table._validate()
     
@@ -0,0 +1,324 @@
+"""
+module: operators
+
+Relational operators on the rows of tables. Each operator returns a new
+table, so results of queries can be combined locally instead of on the
+server.
+"""
+from operator import itemgetter
+
+from .query import AQueryError
+from .table import ATable
+from .columnar_table import AColumnarTable
+
+JOINS = ('inner', 'left', 'anti')
+
+
+def _table(columns, types, data, trusted=False):
+    table = ATable()
+    table._columns = columns
+    table._types = types
+    table._data = data
+    table._trusted = trusted
+    return table
+
+
+def _types(table, positions):
+    types = table._types or [None] * len(table._columns)
+    return [types[idx] for idx in positions]
+
+
+def _getter(positions):
+    ''' Returns a function that picks the values at positions from a row as
+    a tuple
+    '''
+    if not positions:
+        return lambda row: ()
+    if len(positions) == 1:
+        position, = positions
+        return lambda row: (row[position],)
+    return itemgetter(*positions)
+
+
+def _positions(table, names):
+    if isinstance(names, str):
+        names = [names]
+    return [table.index(name) for name in names]
+
+
+def project(table, columns):
+    ''' Returns a table with the given columns of a table in that order '''
+    positions = _positions(table, columns)
+    getter = _getter(positions)
+    return _table([table._columns[idx] for idx in positions],
+        _types(table, positions),
+        [list(getter(row)) for row in table._data or []], table._trusted)
+
+
+def sort(table, columns, descending=False):
+    ''' Returns a table with the rows of a table sorted by columns.
+
+    NULL sorts first, as on the server. descending is either a flag for
+    all the columns or a list with a flag per column. The sort is stable.
+    '''
+    positions = _positions(table, columns)
+    if isinstance(descending, bool):
+        descending = [descending] * len(positions)
+    if len(descending) != len(positions):
+        raise AQueryError('A sort order is needed for each column')
+    data = list(table._data or [])
+    # Sorting by the last column first keeps the order of the earlier ones
+    for idx, reverse in reversed(list(zip(positions, descending))):
+        data.sort(key=lambda row: (row[idx] is not None, row[idx]),
+            reverse=reverse)
+    return _table(list(table._columns), table._types and list(table._types),
+        data, table._trusted)
+
+
+def join(left, right, on, right_on=None, how='inner'):
+    ''' Returns the hash join of two tables on key columns.
+
+    The rows of right are looked up by an index over its key columns. An
+    inner join returns the rows of left followed by the columns of right
+    that are not key columns, for each matching row of right. A left join
+    also returns the rows of left that match no row, with NULL for the
+    columns of right. An anti join returns the rows of left, with the
+    columns of left only, that match no row of right.
+
+    Note : Keys are compared as python values, so NULL matches NULL.
+
+    Note : A column of right with the name of a column of left is renamed
+    with the suffix _right.
+    '''
+    if how not in JOINS:
+        raise AQueryError('Undefined join ' + str(how))
+    if isinstance(on, str):
+        on = [on]
+    right_on = on if right_on is None else right_on
+    if isinstance(right_on, str):
+        right_on = [right_on]
+    if len(on) != len(right_on):
+        raise AQueryError('The joined tables need as many key columns')
+    key = _getter(_positions(left, on))
+    index = right.create_index(right_on)
+    if len(right_on) == 1:
+        lookup_key = lambda row: key(row)[0]
+    else:
+        lookup_key = key
+    left_data = left._data or []
+    if how == 'anti':
+        return _table(list(left._columns), left._types and list(left._types),
+            [list(row) for row in left_data
+                if not index.contains(lookup_key(row))], left._trusted)
+    keys = set(_positions(right, right_on))
+    kept = [idx for idx in range(len(right._columns)) if idx not in keys]
+    names = set(left._columns)
+    columns = list(left._columns) + [right._columns[idx] + '_right'
+        if right._columns[idx] in names else right._columns[idx]
+        for idx in kept]
+    types = _types(left, range(len(left._columns))) + _types(right, kept)
+    right_data = right._data
+    nulls = [None] * len(kept)
+    data = []
+    for row in left_data:
+        positions = index.positions(lookup_key(row))
+        for position in positions:
+            match = right_data[position]
+            data.append(list(row) + [match[idx] for idx in kept])
+        if not positions and how == 'left':
+            data.append(list(row) + nulls)
+    return _table(columns, types, data, left._trusted and right._trusted)
+
+
+def group_by(table, columns, aggregates):
+    ''' Returns a table with a row per distinct key of a table.
+
+    The row holds the key columns followed by an entry per aggregate. The
+    aggregates follow SQL, i.e. NULL values are ignored, a COUNT of a column
+    counts the values that are not NULL and a SUM, MIN, MAX or AVG of no
+    values is NULL. NULL keys form a group of their own. The groups are in
+    the order in which their keys first occur.
+
+    Note : Each group keeps a running value per aggregate, so the memory
+    used grows with the number of groups, not with the number of rows.
+    Only a DISTINCT aggregate keeps the set of the values of its group. The
+    groups and aggregates of an AColumnarTable are computed on its arrays.
+
+    Args :
+        table      : The grouped table
+        columns    : The names of the key columns
+        aggregates : A list of AAggregate objects
+    Returns :
+        An ATable
+    '''
+    positions = _positions(table, columns)
+    sources = [None if aggregate.column is None else
+        table.index(aggregate.column) for aggregate in aggregates]
+    data = None
+    if isinstance(table, AColumnarTable):
+        data = _group_columns(table, positions, aggregates)
+    if data is None:
+        data = _group_rows(table, positions, aggregates, sources)
+    types = _types(table, positions) + [ATable.NUMBER
+        if aggregate.function in ('COUNT', 'SUM', 'AVG')
+        else _types(table, [source])[0]
+        for aggregate, source in zip(aggregates, sources)]
+    return _table([table._columns[idx] for idx in positions] +
+        [aggregate.name for aggregate in aggregates], types, data)
+
+
+def _group_rows(table, positions, aggregates, sources):
+    key = _getter(positions)
+    groups = {}
+    for row in table._data or []:
+        group_key = key(row)
+        group = groups.get(group_key)
+        if group is None:
+            group = groups[group_key] = [_accumulator(aggregate)
+                for aggregate in aggregates]
+        for accumulator, source in zip(group, sources):
+            if source is None:
+                accumulator.add(1)
+            elif row[source] is not None:
+                accumulator.add(row[source])
+    return [list(group_key) + [accumulator.value() for accumulator in group]
+        for group_key, group in groups.items()]
+
+
+def _group_columns(table, positions, aggregates):
+    ''' Returns the rows of the groups of a columnar table, or None if its
+    key columns cannot be grouped on the arrays
+    '''
+    names = [table._columns[idx] for idx in positions]
+    groups = table.groups(names)
+    if groups is None:
+        return None
+    first, inverse = groups
+    data = table._data
+    results = [[data[idx][position] for position in positions]
+        for idx in first.tolist()]
+    for aggregate in aggregates:
+        name = aggregate.column
+        function = aggregate.function
+        if aggregate.distinct:
+            values = _group_values(table, name, inverse, len(results),
+                aggregate)
+        elif function == 'COUNT':
+            values = table.count(name, groups)
+        elif function == 'SUM':
+            values = table.sum(name, groups)
+        elif function == 'MIN':
+            values = table.min(name, groups)
+        elif function == 'MAX':
+            values = table.max(name, groups)
+        else:
+            values = [None if total is None else total / count
+                for total, count in zip(table.sum(name, groups),
+                    table.count(name, groups))]
+        for result, value in zip(results, values):
+            result.append(value)
+    return results
+
+
+def _group_values(table, name, inverse, n_groups, aggregate):
+    ''' Aggregates a column of a columnar table one value at a time '''
+    accumulators = [_accumulator(aggregate) for _ in range(n_groups)]
+    for group, value in zip(inverse.tolist(), table.column(name)):
+        if value is not None:
+            accumulators[group].add(value)
+    return [accumulator.value() for accumulator in accumulators]
+
+
+class _Count(object):
+    __slots__ = ('_count',)
+
+    def __init__(self):
+        self._count = 0
+
+    def add(self, value):
+        self._count += 1
+
+    def value(self):
+        return self._count
+
+
+class _Sum(object):
+    __slots__ = ('_total',)
+
+    def __init__(self):
+        self._total = None
+
+    def add(self, value):
+        self._total = value if self._total is None else self._total + value
+
+    def value(self):
+        return self._total
+
+
+class _Extreme(object):
+    __slots__ = ('_function', '_value')
+
+    def __init__(self, function):
+        self._function = function
+        self._value = None
+
+    def add(self, value):
+        self._value = value if self._value is None else \
+            self._function(self._value, value)
+
+    def value(self):
+        return self._value
+
+
+class _Average(object):
+    __slots__ = ('_total', '_count')
+
+    def __init__(self):
+        self._total = 0
+        self._count = 0
+
+    def add(self, value):
+        self._total += value
+        self._count += 1
+
+    def value(self):
+        return self._total / self._count if self._count else None
+
+
+class _Distinct(object):
+    ''' Keeps the distinct values of a group and aggregates them at the
+    end
+    '''
+    __slots__ = ('_function', '_values')
+
+    def __init__(self, function):
+        self._function = function
+        self._values = set()
+
+    def add(self, value):
+        self._values.add(value)
+
+    def value(self):
+        accumulator = _accumulator(self._function)
+        for value in self._values:
+            accumulator.add(value)
+        return accumulator.value()
+
+
+def _accumulator(aggregate):
+    ''' Returns the running value of an aggregate, or of a function '''
+    if isinstance(aggregate, str):
+        function, distinct = aggregate, False
+    else:
+        function, distinct = aggregate.function, aggregate.distinct
+    if distinct:
+        return _Distinct(function)
+    if function == 'COUNT':
+        return _Count()
+    if function == 'SUM':
+        return _Sum()
+    if function == 'MIN':
+        return _Extreme(min)
+    if function == 'MAX':
+        return _Extreme(max)
+    return _Average()
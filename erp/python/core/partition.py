@@ -0,0 +1,90 @@
+"""
+module: partition
+
+Splits a query into partitions that can be executed on separate connections
+"""
+from .query import AQuery
+from .query import AQueryError
+from .sqlutil import escape_percent
+from .sqlutil import strip_order_by
+
+
+class APartitionedQuery(AQuery):
+    """ Restricts a query to the rows whose partition key is one of a set
+    of values.
+
+    The query is wrapped as a derived table and filtered on its partition
+    key column. The server pushes the predicate down into the query.
+
+    Note : The ORDER BY clause of the query is dropped. When order_by is
+    given the partition is sorted by those result columns instead.
+
+    Note : IN never matches NULL. A None among the values selects the rows
+    whose partition key is NULL. A partition without values selects no
+    rows, but still returns the columns of the query.
+
+    Attributes:
+        base     : The partitioned query
+        values   : The values of the partition key in this partition
+        order_by : Result columns by which the partition is sorted
+    """
+    def __init__(self, base, values, order_by=()):
+        if base.partition_key is None:
+            raise AQueryError(type(base).__name__ + ' cannot be partitioned')
+        self._base = base
+        self._values = tuple(values)
+        self._order_by = tuple(order_by)
+        super().__init__()
+        self._requires = base.requires
+        self._intern_columns = base.intern_columns
+
+    @property
+    def base(self):
+        return self._base
+
+    @property
+    def values(self):
+        return self._values
+
+    @property
+    def order_by(self):
+        return self._order_by
+
+    def _init_query(self):
+        sql = strip_order_by(self._base.query)
+        key = 'part.' + self._base.partition_key
+        values = tuple(value for value in self._values if value is not None)
+        # A query without parameters is sent as it is, so its % characters
+        # are escaped only when the partition adds parameters
+        if values and not self._base.query_tuple:
+            sql = escape_percent(sql)
+        predicates = []
+        if values:
+            predicates.append('{} IN ({})'.format(key,
+                ', '.join(['%s'] * len(values))))
+        if len(values) < len(self._values):
+            predicates.append(key + ' IS NULL')
+        self._query = 'SELECT * FROM ({}\n) AS part WHERE {}'.format(sql,
+            ' OR '.join(predicates) or '1 = 0')
+        if self._order_by:
+            self._query += '\nORDER BY ' + ', '.join(
+                'part.' + column for column in self._order_by)
+        self._query_tuple = tuple(self._base.query_tuple) + values
+
+
+class APartitionValues(AQuery):
+    """ Returns the distinct values of the partition key of a query.
+
+    Attributes:
+        base : The partitioned query
+    """
+    def __init__(self, base):
+        if base.partition_values is None:
+            raise AQueryError(type(base).__name__ +
+                ' does not declare its partition values')
+        self._base = base
+        super().__init__()
+
+    def _init_query(self):
+        self._query = self._base.partition_values
+        self._query_tuple = ()
@@ -33,11 +33,27 @@ class AQuery(AQueryBase, metaclass=ABCMeta):
        query_tuple : A String representing the query tuple
        table : A list of lists that represents the result table. This can
                 only be read after the query has been exected.
+       requires : A tuple of ATempTable objects that the query references.
+                The engine materializes them before the query is executed.
+       partition_key : Name of the result column by which the query can be
+                split into partitions that run on separate connections, or
+                None if it cannot be split.
+       partition_values : SQL text of a query returning the distinct values
+                of the partition key, or None.
+       intern_columns : Names of the string columns whose values repeat.
+                The engine keeps a single copy of each distinct value of
+                these columns. None lets the engine do so for every string
+                column with few distinct values, and an empty tuple turns
+                it off.
     """
     def __init__(self):
         super().__init__()
         self._query = ""
         self._query_tuple = ()
+        self._requires = ()
+        self._partition_key = None
+        self._partition_values = None
+        self._intern_columns = None
         self._init_query()
         if not self._query:
             raise RuntimeError("Query not set")
@@ -54,6 +70,22 @@ class AQuery(AQueryBase, metaclass=ABCMeta):
     def query_tuple(self):
         return self._query_tuple
 
+    @property
+    def requires(self):
+        return self._requires
+
+    @property
+    def partition_key(self):
+        return self._partition_key
+
+    @property
+    def partition_values(self):
+        return self._partition_values
+
+    @property
+    def intern_columns(self):
+        return self._intern_columns
+
     @abstractmethod
     def _init_query(self):
         pass
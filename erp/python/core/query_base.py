@@ -28,12 +28,12 @@ class AQueryBase(object, metaclass=ABCMeta):
 
     @property
     def table(self):
-        if not self._table:
+        if self._table is None:
             raise RuntimeError("Cannot access un-initialized property")
         return self._table
     
     def has_run(self):
-        if not self._table:
+        if self._table is None:
             return False
         return True
 
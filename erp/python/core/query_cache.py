@@ -0,0 +1,248 @@
+"""
+module: query_cache
+
+Caches the result tables of executed queries
+"""
+from collections import OrderedDict
+import gzip
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+import zlib
+
+from .query import AQueryError
+from .table import ATable
+from .table import record_type
+from .columnar_table import AColumnarTable
+
+# Number of rows sampled to estimate the memory held by a table
+_SIZE_SAMPLE = 100
+
+
+class AQueryCache(object):
+    """ A cache for the results of queries.
+
+    Results are keyed on the SQL text of the query, its parameters, the
+    data base it was run against and the kind of table the engine builds. An entry expires ttl seconds after it was
+    stored. The in-memory tier is bounded by the number of entries and
+    optionally by an estimate of the memory held by the tables; the least
+    recently used entries are evicted first.
+
+    When a snapshot directory is given, every stored result is also written
+    there as a compressed snapshot. A result that has been evicted from
+    memory, or that was stored by another process, is then reloaded from
+    disk as long as it has not expired. Snapshots hold rows, so a columnar
+    table is reloaded as an ATable.
+
+    Note : Cached rows are shared between all the queries that hit the
+    same entry. Rows must not be modified in place.
+
+    Attributes:
+        ttl          : Time to live of an entry in seconds
+        max_entries  : Maximum number of tables held in memory
+        max_bytes    : Optional bound on the estimated memory of the tables
+        snapshot_dir : Optional directory for the on-disk tier
+    """
+    def __init__(self, ttl=3600, max_entries=32, max_bytes=None,
+            snapshot_dir=None):
+        if ttl <= 0:
+            raise AQueryError('Time to live must be positive')
+        if max_entries < 1:
+            raise AQueryError('Cache must hold at least one entry')
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._snapshot_dir = snapshot_dir
+        self._entries = OrderedDict()
+        self._n_bytes = 0
+        self._lock = threading.Lock()
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+    @property
+    def ttl(self):
+        return self._ttl
+
+    @ttl.setter
+    def ttl(self, ttl):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def snapshot_dir(self):
+        return self._snapshot_dir
+
+    @snapshot_dir.setter
+    def snapshot_dir(self, snapshot_dir):
+        raise RuntimeError('This is a read-only field')
+
+    def key(self, query, database, columnar=False, records=False):
+        ''' Returns the cache key of a query run against a data base by an
+        engine that builds columnar tables or rows of records
+        '''
+        return (query.query, tuple(query.query_tuple), database,
+            bool(columnar), bool(records))
+
+    def get(self, key):
+        ''' Returns a table for the key or None if there is no live entry.
+
+        The returned table is a new ATable that shares its rows with the
+        cached entry.
+        '''
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                expires, table, size = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return self._copy(table)
+                self._remove(key)
+        if not self._snapshot_dir:
+            return None
+        loaded = self._load_snapshot(key, now)
+        if not loaded:
+            return None
+        expires, table = loaded
+        with self._lock:
+            self._insert(key, expires, table)
+        return self._copy(table)
+
+    def put(self, key, table):
+        ''' Stores the result table of a query. The cache holds a copy, so
+        that the table stays owned by the query it was parked in.
+        '''
+        expires = time.time() + self._ttl
+        with self._lock:
+            self._insert(key, expires, self._copy(table))
+        if self._snapshot_dir:
+            self._store_snapshot(key, expires, table)
+
+    def invalidate(self, key):
+        ''' Drops the entry for a key from memory and from disk '''
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+        if self._snapshot_dir:
+            try:
+                os.remove(self._snapshot_path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        ''' Drops all the entries held in memory. Snapshots are kept. '''
+        with self._lock:
+            self._entries.clear()
+            self._n_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return bool(entry) and entry[0] > time.time()
+
+    def _copy(self, table):
+        if isinstance(table, AColumnarTable):
+            return table.copy()
+        copy = ATable()
+        copy._columns = list(table._columns)
+        copy._types = list(table._types) if table._types else table._types
+        copy._data = list(table._data)
+        copy._trusted = table._trusted
+        return copy
+
+    def _insert(self, key, expires, table):
+        if key in self._entries:
+            self._remove(key)
+        size = self._estimate_size(table)
+        self._entries[key] = (expires, table, size)
+        self._n_bytes += size
+        self._evict()
+
+    def _remove(self, key):
+        expires, table, size = self._entries.pop(key)
+        self._n_bytes -= size
+
+    def _evict(self):
+        ''' Evicts least recently used entries until the bounds hold. The
+        most recent entry is always kept.
+        '''
+        while len(self._entries) > 1 and (
+                len(self._entries) > self._max_entries or
+                (self._max_bytes and self._n_bytes > self._max_bytes)):
+            self._remove(next(iter(self._entries)))
+
+    def _estimate_size(self, table):
+        ''' Estimates the memory held by a table from a sample of rows '''
+        if isinstance(table, AColumnarTable):
+            return table.nbytes
+        data = table._data
+        if not data:
+            return 0
+        step = max(len(data) // _SIZE_SAMPLE, 1)
+        sample = data[::step][:_SIZE_SAMPLE]
+        sampled = sum(
+            sys.getsizeof(row) + sum(sys.getsizeof(x) for x in row)
+            for row in sample)
+        return sys.getsizeof(data) + sampled * len(data) // len(sample)
+
+    def _snapshot_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self._snapshot_dir, digest + '.pkl.gz')
+
+    def _store_snapshot(self, key, expires, table):
+        ''' Writes a compressed snapshot. The file is renamed into place so
+        that readers never observe a partial snapshot.
+        '''
+        path = self._snapshot_path(key)
+        # Processes sharing the directory write to files of their own
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(),
+            threading.get_ident())
+        data = table._data
+        # Named tuples are created at run time and cannot be pickled by
+        # name. They are stored as tuples and rebuilt when loaded.
+        records = bool(data) and hasattr(data[0], '_fields')
+        if records:
+            data = [tuple(row) for row in data]
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            pickle.dump((key, expires, table._columns, table._types,
+                list(data), records), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def _remove_snapshot(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _load_snapshot(self, key, now):
+        path = self._snapshot_path(key)
+        try:
+            with gzip.open(path, 'rb') as f:
+                stored_key, expires, columns, types, data, records = \
+                    pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, zlib.error,
+                pickle.UnpicklingError):
+            # A truncated or corrupt snapshot, or one of an older format,
+            # is a miss and is written again once the query has run
+            self._remove_snapshot(path)
+            return None
+        if stored_key != key:
+            return None
+        if expires <= now:
+            self._remove_snapshot(path)
+            return None
+        if records:
+            data = list(map(record_type(columns)._make, data))
+        table = ATable()
+        table._columns = columns
+        table._types = types
+        table._data = data
+        table._trusted = True
+        return expires, table
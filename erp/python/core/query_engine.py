@@ -3,13 +3,23 @@ module: query_engine
 
 Executes queries and returns th results in the query objevt
 """
-import pymssql
-from pymssql import _mssql
-import pprint
 from .query import AQuery
 from .query import AQueryError
 from .table import ATable
+from .table import record_type
+from .columnar_table import AColumnarTable
+from .backend import AMSSQLBackend
+from .result_stream import AResultStream
+from .query_stats import AQueryStats
+from .sqlutil import escape_percent
+from .aggregate import AAggregateQuery
+from .aggregate import ACountQuery
 import logging
+import threading
+import time
+
+# Number of rows fetched per round trip when results are streamed
+DEFAULT_BATCH_SIZE = 1000
 
 class AQueryEngine(object):
     """ Implements the query engine.
@@ -19,13 +29,31 @@ class AQueryEngine(object):
 
     Note : This is an abstraction of the algorithm used to execute queries
     against a data base. For now the algorithm used is first-come first-served
-    and blocking.
+    and blocking. Use AQueryEnginePool to execute independent queries
+    concurrently.
 
     Note : The connection object in DB API 2.0 has __del__ method that closes
     the connection. So we do not have to explicitly close the connection here
 
+    Note : The connection is opened on first use, so an engine that only
+    serves cached results never connects. Call prewarm to open it in the
+    background ahead of time. If the server drops the session, the engine
+    reconnects and runs the interrupted query once more.
+
     RAII: In python RAII has to be done using the with clause only.
 
+    Note : The data base driver is abstracted by a backend. The engine
+    connects to SQL Server through pymssql unless another backend, such as
+    ASQLiteBackend, is given.
+
+    Note : Every execution is timed. When the result has been consumed an
+    AQueryStats record is logged and handed to each listener, e.g. an
+    AJSONLinesSink. The SQL text is only logged at debug level.
+
+    Note : Strings that repeat in a column, e.g. the division or the
+    location, are shared instead of being held once per row. See
+    AQuery.intern_columns.
+
     Attributes:
         server   : string name of the SQL Server instance
         user     : string name of the user
@@ -33,105 +61,519 @@ class AQueryEngine(object):
         database : string name of the database to connect to
         port     : integer port over which the server is listening 
         conn     : A per QueryEngine connection object
+        cache    : Optional AQueryCache consulted before a query is sent
+                   to the server
+        backend  : Optional ABackend used instead of SQL Server. The
+                   connection arguments are ignored when it is given.
+        listeners : Callables that receive the AQueryStats of each
+                   execution
+        prewarm  : If True the connection is opened in the background
+                   right away
+        columnar : If True results are stored in AColumnarTable objects,
+                   which hold each column in a typed array
+        records  : If True rows are named tuples whose fields are the
+                   column names, e.g. row.UPC. Ignored for columnar results.
     """
-    def __init__(self, server, user, password, database, port):
-        self._server = server
-        self._user = user
-        self._password = password
-        self._database = database
-        self._port = port
+    # Number of distinct values up to which a column is interned when the
+    # query leaves it to the engine
+    INTERN_LIMIT = 4096
+    def __init__(self, server=None, user=None, password=None, database=None,
+            port=1433, cache=None, backend=None, listeners=None,
+            prewarm=False, columnar=False, records=False):
+        if backend is None:
+            backend = AMSSQLBackend(server, user, password, database, port)
+        self._backend = backend
+        self._database = backend.database
+        self._cache = cache
+        self._listeners = list(listeners or [])
+        self._columnar = columnar
+        self._records = records
         self._conn = None
-        self._init_conn()
+        self._closed = False
+        # Set once a statement has been cancelled
+        self._cancelled = False
+        self._warmer = None
+        self._stream = None
+        self._materialized = set()
+        if prewarm:
+            self.prewarm()
 
-    def _init_conn(self):
-        """ Initialize connection object
+    def prewarm(self):
+        """ Opens the connection in a background thread so that the first
+        query does not wait for the login. Errors are raised by the first
+        query instead.
+        """
+        if self._conn is None and self._warmer is None and not self._closed:
+            self._warmer = threading.Thread(target=self._warm,
+                name='AQueryEngine-prewarm', daemon=True)
+            self._warmer.start()
+
+    def _warm(self):
+        try:
+            self._conn = self._backend.connect()
+        except Exception as e:
+            logging.warning('Could not prewarm the connection : %s', e)
+
+    def _connection(self):
+        """ Returns the connection, opening it on first use
 
         Raises:
             A number of different connection errors
         """
-        if not self._conn:
-            self._conn = pymssql.connect(
-            server=self._server,
-            user=self._user,
-            password=self._password,
-            database=self._database,
-            timeout=0,
-            login_timeout=60,
-            charset='UTF-8',
-            as_dict=False,
-            host='',
-            appname=None,
-            port=self._port,
-            autocommit=False)
+        if self._warmer is not None:
+            self._warmer.join()
+            self._warmer = None
+        if self._closed:
+            raise AQueryError('Query engine has been closed')
+        if self._conn is None:
+            self._conn = self._backend.connect()
+        return self._conn
+
+    def _reconnect(self):
+        ''' Discards a dropped connection and the temporary tables that were
+        created on it
+        '''
+        conn = self._conn
+        self._conn = None
+        self._materialized = set()
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _retry(self, action):
+        ''' Runs an action and runs it once more on a new connection if the
+        connection was dropped. A statement that was cancelled is not run
+        again, even if the cancel looks like a dropped connection.
+        '''
+        try:
+            return action()
+        except Exception as e:
+            if self._stream or self._closed or self._cancelled or \
+                    not self._backend.is_disconnect(e):
+                raise
+            logging.warning('Connection lost, reconnecting : %s', e)
+            self._reconnect()
+            return action()
+
+    @property
+    def backend(self):
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def cache(self):
+        return self._cache
+
+    @cache.setter
+    def cache(self, cache):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def listeners(self):
+        return tuple(self._listeners)
+
+    @listeners.setter
+    def listeners(self, listeners):
+        raise RuntimeError('This is a read-only field')
+
+    def add_listener(self, listener):
+        """ Registers a callable that receives the AQueryStats of each
+        execution.
+        """
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def _emit(self, stats):
+        ''' Completes the statistics of an execution and publishes them.
+        A failing listener does not fail the query.
+        '''
+        stats.finish()
+        logging.info(str(stats))
+        for listener in self._listeners:
+            try:
+                listener(stats)
+            except Exception:
+                logging.exception('Query statistics listener failed')
+
+    def cancel(self):
+        """ Requests the server to cancel the statement that is currently
+        executing on the connection.
+
+        Note : This is meant to be called from a thread other than the one
+        blocked in execute. The engine should not be reused afterwards.
+        """
+        self._cancelled = True
+        if self._conn is not None:
+            self._backend.cancel(self._conn)
+
+    def close(self):
+        """ Closes the connection. The engine cannot be used afterwards. """
+        if self._stream:
+            self._stream.close()
+        if self._warmer is not None:
+            self._warmer.join()
+            self._warmer = None
+        self._closed = True
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _infer_types(self, types, rows):
+        ''' Fills in the column types the backend did not report from the
+        first non null value of each column. A column without values is
+        treated as a string column.
+        '''
+        types = list(types)
+        for idx, type_string in enumerate(types):
+            if type_string:
+                continue
+            types[idx] = ATable.STRING
+            for row in rows:
+                if row[idx] is not None:
+                    types[idx] = self._backend.infer_type(row[idx])
+                    break
+        return types
+
+    def _clean_row(self, row):
+        ''' Converts a fetched row into a list with all strings stripped '''
+        return [a.strip() if isinstance(a,str) else a for a in row]
+
+    def _row_cleaner(self, query, columns):
+        ''' Returns the function that converts the fetched rows of a result
+        of query with the given columns.
+
+        Equal strings of the columns the query interns are replaced by a
+        single shared string, which is kept in a dictionary per column. When
+        the query leaves it to the engine every column is interned until it
+        has more than INTERN_LIMIT distinct values. Columnar results encode
+        their strings themselves.
+        '''
+        if self._columnar:
+            return self._clean_row
+        interned = query.intern_columns
+        if interned is None:
+            limit = AQueryEngine.INTERN_LIMIT
+            pools = [{} for _ in columns]
         else:
-            raise AQueryError("Connection can only be made once")
-
-    def _translate_type_code(self, type_code):
-        ''' Given a type code returns a string description of the type.
-        
-        DB-API specifies a list of types for each column. This gives
-        a string representation that can be used by objects downstream
-        in the Data Pipeline without adding dependencies to DB-API.
+            limit = None
+            pools = [{} if name in interned else None for name in columns]
+        make = record_type(columns)._make if self._records else list
+        if not any(pool is not None for pool in pools):
+            if not self._records:
+                return self._clean_row
+            return lambda row: make(
+                a.strip() if isinstance(a,str) else a for a in row)
+        def clean_row(row):
+            values = []
+            for idx, a in enumerate(row):
+                if isinstance(a, str):
+                    a = a.strip()
+                    pool = pools[idx]
+                    if pool is not None:
+                        a = pool.setdefault(a, a)
+                        if limit and len(pool) > limit:
+                            # Too many distinct values to be worth sharing
+                            pools[idx] = None
+                values.append(a)
+            return make(values)
+        return clean_row
+
+    def _release_stream(self, stream):
+        if self._stream is stream:
+            self._stream = None
+        if stream.stats is not None:
+            self._emit(stream.stats)
+
+    def materialize(self, temp_table):
+        """ Creates a temporary table on the engine owned connection
+        unless it has already been created.
+
+        Args :
+            temp_table : An ATempTable object
+        """
+        if self._stream:
+            raise AQueryError('A result stream is still open on the engine')
+        if temp_table.name in self._materialized:
+            return
+        cursor = self._connection().cursor()
+        logging.info('Materializing #' + temp_table.name)
+        try:
+            cursor.execute(self._backend.materialize_sql(temp_table),
+                temp_table.query.query_tuple)
+        finally:
+            cursor.close()
+        self._materialized.add(temp_table.name)
+
+    def _prepare(self, query):
+        ''' Materializes the temporary tables required by the query '''
+        for temp_table in query.requires:
+            self.materialize(temp_table)
+
+    def execute_iter(self, query, batch_size=DEFAULT_BATCH_SIZE):
+        """ Executes a query and returns a stream over its results instead
+        of a table.
+
+        Rows are fetched from the server batch_size rows at a time as the
+        stream is consumed, so the complete result is never held in
+        memory. The column names and types are available on the returned
+        stream before the first row is fetched.
+
+        Note : Only one stream can be open per engine. It must be exhausted
+        or closed before the next query is executed.
+
+        Args :
+            query : A query object
+            batch_size : Number of rows fetched per round trip
+
+        Returns :
+            An AResultStream object
+        """
+        return self._retry(lambda: self._open_stream(query, batch_size))
+
+    def _open_stream(self, query, batch_size):
+        if self._stream:
+            raise AQueryError('A result stream is still open on the engine')
+        stats = AQueryStats(query, self._database)
+        cursor = None
+        try:
+            self._prepare(query)
+            stats.prepare_time = stats.elapsed()
+            logging.debug(query.query)
+            cursor = self._connection().cursor()
+            cursor.execute(self._backend.translate(query.query),
+                query.query_tuple)
+            stats.execute_time = stats.elapsed()
+        except Exception as e:
+            if cursor is not None:
+                cursor.close()
+            stats.error = '{}: {}'.format(type(e).__name__, e)
+            self._emit(stats)
+            raise
+        cols, types = self._backend.describe(cursor)
+        self._stream = AResultStream(cursor, cols, types, batch_size,
+            self._row_cleaner(query, cols), self._release_stream, stats=stats)
+        if None in types:
+            stream = self._stream
+            try:
+                stream._types = self._infer_types(types, stream.prefetch())
+            except Exception as e:
+                # The stream is released before any row is handed out
+                stats.error = '{}: {}'.format(type(e).__name__, e)
+                stream.close()
+                raise
+        return self._stream
+
+    def _cache_key(self, query):
+        return self._cache.key(query, self._database, self._columnar,
+            self._records)
+
+    def _from_cache(self, query):
+        ''' Parks a live cached result in the query. Returns False if
+        there is none.
         '''
-        if type_code == pymssql.STRING:
-            return 'string'
-        if type_code == pymssql.NUMBER:
-            return 'number'
-        if type_code == 5: # Handle Row ID as a Number
-            return 'number'
-        if type_code == pymssql.DATETIME:
-            return 'datetime'
-        if type_code == pymssql.BINARY:
-            return 'binary'
-        raise AQueryError('Undefined type_code ' + str(type_code)) 
-            
-        
+        if self._cache is None:
+            return False
+        cached = self._cache.get(self._cache_key(query))
+        if cached is None:
+            return False
+        stats = AQueryStats(query, self._database)
+        stats.cached = True
+        stats.rows = len(cached._data)
+        self._emit(stats)
+        query._table = cached
+        return True
+
+    def _park(self, query, columns, types, data):
+        ''' Parks a result table in the query and caches it '''
+        if isinstance(data, AColumnarTable):
+            results = data
+        elif self._columnar:
+            results = AColumnarTable.from_rows(columns, types, data)
+        else:
+            # We populate the private methods of the table
+            # We short circuit the property APIS
+            # TODO : What is the python way for friends
+            results = ATable()
+            results._columns = columns
+            results._types = types
+            results._data = data
+            results._trusted = True
+        # Park the table into the query objecty for further processing
+        query._table = results
+        if self._cache is not None:
+            self._cache.put(self._cache_key(query), results)
+
     def execute(self,query):
         """ Executes a query as specified by the query object. This
         query is executed against the AQueryEngine owned connection
         and is blocking.
 
         Note : Results of the entire query is returned in one shot -
-        client needs to ensure that the result is not very huge.
+        client needs to ensure that the result is not very huge. Use
+        execute_iter to consume large results incrementally.
 
-        Note: description attribute returns a lits of tuples where
-        each tuple describes the columns.
+        Note : When the engine has a cache, a live cached result is parked
+        in the query without contacting the server.
 
         Args :
             query : A query object
         """
-        cursor = self._conn.cursor()
-        logging.info(query._query)
-        cursor.execute(query.query, query.query_tuple)
-
-        desc = cursor.description
-        # Return it as list and not as tuples
-        # Note : This implies mutability that seems worng but is useful
-        # for minor data massaging without allocation.
-        cols = []
-        types = []
-        for col in desc:
-            cols.append(col[0])
-            types.append(self._translate_type_code(col[1]))
-        
-        # We populate the private methods of the table
-        # We short circuit the property APIS
-        # TODO : What is the python way for friends
-        results = ATable()
-        results._columns = cols
-        results._types = types
-        rows = cursor.fetchall()
-        data= []
-        for row in rows:
-            data.append(
-                [a.strip() if isinstance(a,str) else a for a in row])
-
-        results._data = data
-        # Park the table into the query objecty for further processing
-        query._table = results
+        if self._from_cache(query):
+            return
+        self._retry(lambda: self._execute(query))
 
+    def _execute(self, query):
+        # Rows are cleaned batch by batch so that the raw driver rows and
+        # the cleaned rows are never held in memory at the same time.
+        # A columnar table encodes each batch as it arrives.
+        data = []
+        with self._open_stream(query, DEFAULT_BATCH_SIZE) as stream:
+            if self._columnar:
+                builder = AColumnarTable.builder(stream.columns,
+                    stream.types)
+                for batch in stream.batches():
+                    builder.append(batch)
+                data = builder.build()
+            else:
+                for batch in stream.batches():
+                    data.extend(batch)
+        self._park(query, stream.columns, stream.types, data)
 
+    def count(self, query):
+        """ Returns the number of rows of a query. Only the count is
+        transferred from the server.
 
+        Args :
+            query : A query object
 
+        Returns :
+            The number of rows
+        """
+        count_query = ACountQuery(query)
+        self.execute(count_query)
+        return count_query.count
+
+    def aggregate(self, query, aggregates):
+        """ Computes aggregates over the rows of a query on the server.
+
+        Args :
+            query : A query object
+            aggregates : A list of AAggregate objects
+
+        Returns :
+            The list of aggregate values
+        """
+        aggregate_query = AAggregateQuery(query, aggregates)
+        self.execute(aggregate_query)
+        return aggregate_query.values
+
+    def _batch_sql(self, queries):
+        ''' Joins the queries into one batch of statements and their
+        parameters into one tuple.
+
+        Note : The driver interpolates parameters only when the tuple is
+        not empty. The % characters of the queries without parameters,
+        e.g. in LIKE patterns, are then escaped.
+        '''
+        params = []
+        for query in queries:
+            params.extend(query.query_tuple)
+        statements = []
+        for query in queries:
+            sql = self._backend.translate(query.query).strip().rstrip(';')
+            if params and not query.query_tuple:
+                sql = escape_percent(sql)
+            statements.append(sql)
+        return ';\n'.join(statements), tuple(params)
 
+    def _fetch_result(self, query, cursor, stats, batch_size):
+        ''' Fetches the result set of query the cursor is positioned on and
+        returns its columns, types and rows
+        '''
+        cols, types = self._backend.describe(cursor)
+        clean_row = self._row_cleaner(query, cols)
+        data = []
+        while True:
+            start = time.perf_counter()
+            rows = cursor.fetchmany(batch_size)
+            fetched = time.perf_counter()
+            batch = [clean_row(row) for row in rows]
+            stats.add_batch(batch, fetched - start,
+                time.perf_counter() - fetched)
+            if not batch:
+                break
+            data.extend(batch)
+        if None in types:
+            types = self._infer_types(types, data)
+        return cols, types, data
+
+    def execute_batch(self, queries, batch_size=DEFAULT_BATCH_SIZE):
+        """ Executes a number of queries in one round trip.
+
+        The queries are sent to the server as a single batch of statements.
+        Each query is populated from its own result set, which are read in
+        order with nextset. Cached results are parked without sending the
+        query.
+
+        Note : The backends that cannot return several result sets per
+        statement, such as ASQLiteBackend, execute the queries one after
+        another instead.
+
+        Note : Statistics of the batched queries are measured from the
+        moment the batch is sent, so they include the time spent reading
+        the result sets before their own.
+
+        Args :
+            queries : An iterable of query objects
+            batch_size : Number of rows fetched per round trip
+
+        Returns :
+            The list of query objects in the order they were given
+        """
+        if self._stream:
+            raise AQueryError('A result stream is still open on the engine')
+        queries = list(queries)
+        pending = [query for query in queries if not self._from_cache(query)]
+        if len(pending) < 2 or not self._backend.supports_batches:
+            for query in pending:
+                self.execute(query)
+            return queries
+        self._retry(lambda: self._execute_batch(pending, batch_size))
+        return queries
 
+    def _execute_batch(self, pending, batch_size):
+        stats = [AQueryStats(query, self._database) for query in pending]
+        cursor = None
+        done = 0
+        try:
+            for query in pending:
+                self._prepare(query)
+            sql, params = self._batch_sql(pending)
+            logging.debug(sql)
+            cursor = self._connection().cursor()
+            cursor.execute(sql, params)
+            for query_stats in stats:
+                query_stats.execute_time = query_stats.elapsed()
+            for query, query_stats in zip(pending, stats):
+                if done and not cursor.nextset():
+                    raise AQueryError('Batch returned {} result sets for '
+                        '{} queries'.format(done, len(pending)))
+                self._park(query, *self._fetch_result(query, cursor,
+                    query_stats, batch_size))
+                self._emit(query_stats)
+                done = done + 1
+        except Exception as e:
+            for query_stats in stats[done:]:
+                query_stats.error = '{}: {}'.format(type(e).__name__, e)
+                self._emit(query_stats)
+            raise
+        finally:
+            if cursor is not None:
+                cursor.close()
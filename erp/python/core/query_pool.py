@@ -0,0 +1,303 @@
+"""
+module: query_pool
+
+Executes queries concurrently over a pool of connections
+"""
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import queue
+
+from .query import AQueryError
+from .query_engine import AQueryEngine
+from .table import ATable
+from .columnar_table import AColumnarTable
+from .partition import APartitionedQuery
+from .partition import APartitionValues
+from .aggregate import AAggregateQuery
+from .aggregate import ACountQuery
+
+
+class AQueryEnginePool(object):
+    """ Implements a pool of query engines.
+
+    The pool owns a fixed number of AQueryEngine objects, each of which
+    holds its own connection to the data base. Queries are executed by a
+    thread pool of the same size so that independent queries are run
+    against the server at the same time.
+
+    Note : DB API 2.0 drivers such as pymssql do not allow a connection to
+    be shared between threads. A query checks out an engine for the
+    duration of its execution and returns it to the pool afterwards, so a
+    connection is never used by two threads at once.
+
+    RAII: In python RAII has to be done using the with clause only.
+
+    Attributes:
+        server   : string name of the SQL Server instance
+        user     : string name of the user
+        password : string name of the user
+        database : string name of the database to connect to
+        port     : integer port over which the server is listening
+        cache    : Optional AQueryCache shared by all the connections
+        backend  : Optional ABackend used instead of SQL Server
+        listeners : Callables that receive the AQueryStats of each
+                   execution on any of the connections
+        size     : number of connections in the pool
+        prewarm  : If True the connections are opened in the background
+                   right away. Otherwise each is opened on first use.
+        columnar : If True results are stored in AColumnarTable objects
+        records  : If True rows are named tuples of the column names
+    """
+    def __init__(self, server=None, user=None, password=None,
+            database=None, port=1433, size=4, cache=None, backend=None,
+            listeners=None, prewarm=False, columnar=False,
+            records=False):
+        if size < 1:
+            raise AQueryError('Pool size must be a positive integer')
+        self._server = server
+        self._user = user
+        self._password = password
+        self._database = database
+        self._port = port
+        self._size = size
+        self._cache = cache
+        self._backend = backend
+        self._listeners = listeners
+        self._columnar = columnar
+        self._records = records
+        self._prewarm = prewarm
+        self._engines = queue.Queue()
+        # Every engine of the pool, whether it is checked out or not
+        self._all_engines = []
+        self._executor = None
+        self._init_engines()
+
+    def _init_engines(self):
+        """ Creates one engine per pool slot. The engines connect on first
+        use unless the pool is prewarmed.
+        """
+        for _ in range(self._size):
+            engine = AQueryEngine(
+                server=self._server,
+                user=self._user,
+                password=self._password,
+                database=self._database,
+                port=self._port,
+                cache=self._cache,
+                backend=self._backend,
+                listeners=self._listeners,
+                columnar=self._columnar,
+                records=self._records,
+                prewarm=self._prewarm)
+            self._all_engines.append(engine)
+            self._engines.put(engine)
+        self._executor = ThreadPoolExecutor(max_workers=self._size,
+            thread_name_prefix='AQueryEnginePool')
+
+    @property
+    def size(self):
+        return self._size
+
+    @size.setter
+    def size(self, size):
+        raise RuntimeError('This is a read-only field')
+
+    def execute(self, query):
+        """ Executes a query on the first free engine of the pool. The
+        calling thread blocks until the results are parked in the query.
+
+        Args :
+            query : A query object
+
+        Returns :
+            The query object
+        """
+        engine = self._engines.get()
+        try:
+            engine.execute(query)
+        finally:
+            self._engines.put(engine)
+        return query
+
+    def count(self, query):
+        """ Returns the number of rows of a query. Only the count is
+        transferred from the server.
+
+        Args :
+            query : A query object
+
+        Returns :
+            The number of rows
+        """
+        count_query = ACountQuery(query)
+        self.execute(count_query)
+        return count_query.count
+
+    def aggregate(self, query, aggregates):
+        """ Computes aggregates over the rows of a query on the server.
+
+        Args :
+            query : A query object
+            aggregates : A list of AAggregate objects
+
+        Returns :
+            The list of aggregate values
+        """
+        aggregate_query = AAggregateQuery(query, aggregates)
+        self.execute(aggregate_query)
+        return aggregate_query.values
+
+    def submit(self, query):
+        """ Schedules a query for execution and returns immediately.
+
+        Args :
+            query : A query object
+
+        Returns :
+            A concurrent.futures.Future that resolves to the query object
+            once its results are available.
+        """
+        if not self._executor:
+            raise AQueryError('Query engine pool has been closed')
+        return self._executor.submit(self.execute, query)
+
+    def _execute_group(self, queries):
+        ''' Executes queries in one batch on the same engine '''
+        engine = self._engines.get()
+        try:
+            engine.execute_batch(queries)
+        finally:
+            self._engines.put(engine)
+        return queries
+
+    def _group(self, queries):
+        ''' Groups the queries that require a common temporary table.
+
+        A temporary table exists only on the connection that created it.
+        Queries sharing one are run on the same engine so that it is
+        materialized once instead of once per connection.
+        '''
+        groups = []
+        for query in queries:
+            members = []
+            tables = set(query.requires)
+            kept = []
+            for group_queries, group_tables in groups:
+                if tables & group_tables:
+                    members.extend(group_queries)
+                    tables |= group_tables
+                else:
+                    kept.append((group_queries, group_tables))
+            groups = kept + [(members + [query], tables)]
+        return [group_queries for group_queries, _ in groups]
+
+    def execute_many(self, queries):
+        """ Executes a number of independent queries concurrently and
+        blocks until all of them have completed.
+
+        Note : Queries that require a common temporary table are executed
+        in one batch on the same connection.
+
+        Note : If more than one query fails, the error of the first failing
+        query in the list is raised.
+
+        Args :
+            queries : An iterable of query objects
+
+        Returns :
+            The list of query objects in the order they were given
+        """
+        queries = list(queries)
+        if not self._executor:
+            raise AQueryError('Query engine pool has been closed')
+        futures = [self._executor.submit(self._execute_group, group)
+            for group in self._group(queries)]
+        for future in futures:
+            future.result()
+        return queries
+
+    def _partitions(self, query):
+        ''' Splits the distinct values of the partition key of a query into
+        one run of consecutive values per connection. NULL sorts first, as
+        on the server.
+        '''
+        values = self.execute(APartitionValues(query))._table._data
+        values = sorted((row[0] for row in values or []),
+            key=lambda value: (value is not None, value))
+        n_parts = min(self._size, len(values))
+        return [values[idx * len(values) // n_parts:
+            (idx + 1) * len(values) // n_parts] for idx in range(n_parts)]
+
+    def execute_partitioned(self, query, partitions=None, order_by=None):
+        """ Executes a query that declares a partition key as a number of
+        partitions on separate connections and merges the results into the
+        table of the query.
+
+        Note : Without order_by the rows of the partitions are concatenated
+        in the order of the partitions. With order_by each partition is
+        sorted by the server and the partitions are merged. The merge
+        compares Python values, so the columns should not depend on the
+        collation of the server, e.g. case insensitive strings.
+
+        Note : Each connection materializes the temporary tables the query
+        requires.
+
+        Args :
+            query : A query object with a partition key
+            partitions : A list of lists of partition key values. None
+                stands for NULL. By default the distinct values are split
+                evenly over the connections.
+            order_by : Optional list of result columns to sort by
+
+        Returns :
+            The query object
+        """
+        if query.partition_key is None:
+            raise AQueryError(type(query).__name__ + ' cannot be partitioned')
+        if partitions is None:
+            partitions = self._partitions(query)
+        parts = [APartitionedQuery(query, values, order_by or ())
+            for values in partitions]
+        if not parts:
+            # A partition without values returns the columns of the query
+            parts = [APartitionedQuery(query, (), order_by or ())]
+        futures = [self.submit(part) for part in parts]
+        tables = [future.result()._table for future in futures]
+        filled = [table for table in tables if table._data] or tables
+        columns = filled[0]._columns
+        if order_by:
+            keys = [columns.index(column) for column in order_by]
+            # NULL sorts first as on the server
+            data = list(heapq.merge(*[table._data for table in filled],
+                key=lambda row: [(row[idx] is not None, row[idx])
+                    for idx in keys]))
+        else:
+            data = [row for table in filled for row in table._data]
+        if self._columnar:
+            results = AColumnarTable.from_rows(columns, filled[0]._types,
+                data)
+        else:
+            results = ATable()
+            results._columns = columns
+            results._types = filled[0]._types
+            results._data = data
+            results._trusted = True
+        query._table = results
+        return query
+
+    def close(self):
+        """ Waits for pending queries, shuts down the worker threads and
+        closes the connections of the engines
+        """
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        for engine in self._all_engines:
+            engine.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,127 @@
+"""
+module: query_stats
+
+Records how long each stage of a query execution takes and how much data it
+returns
+"""
+import json
+import sys
+import threading
+import time
+
+
+class AQueryStats(object):
+    """ The timing and volume of one query execution.
+
+    All times are in seconds and are measured from the moment the query is
+    handed to the engine.
+
+    Attributes:
+        query          : Class name of the query
+        database       : Name of the data base the query ran against
+        started        : Wall clock time at which the execution started
+        prepare_time   : Time spent materializing temporary tables
+        execute_time   : Time until the server accepted the statement
+        first_row_time : Time until the first row was received
+        fetch_time     : Time spent waiting for rows
+        process_time   : Time spent converting rows after they were fetched
+        total_time     : Time until the result was closed
+        rows           : Number of rows returned
+        bytes          : Estimate of the memory held by the rows
+        cached         : True if the result came from the cache
+        error          : Description of the error that ended the execution
+    """
+    def __init__(self, query, database):
+        self.query = type(query).__name__
+        self.database = database
+        self.started = time.time()
+        self.prepare_time = 0.0
+        self.execute_time = None
+        self.first_row_time = None
+        self.fetch_time = 0.0
+        self.process_time = 0.0
+        self.total_time = None
+        self.rows = 0
+        self.bytes = 0
+        self.cached = False
+        self.error = None
+        self._origin = time.perf_counter()
+        self._row_size = None
+
+    def elapsed(self):
+        ''' Returns the time since the execution started '''
+        return time.perf_counter() - self._origin
+
+    def add_batch(self, batch, fetch_time, process_time):
+        ''' Accounts for a batch of rows. The size of a row is estimated
+        from the first batch.
+        '''
+        if batch and self.first_row_time is None:
+            self.first_row_time = self.elapsed() - process_time
+        self.fetch_time += fetch_time
+        self.process_time += process_time
+        if not batch:
+            return
+        if self._row_size is None:
+            self._row_size = sum(
+                sys.getsizeof(row) + sum(sys.getsizeof(x) for x in row)
+                for row in batch) / len(batch)
+        self.rows += len(batch)
+        self.bytes = int(self._row_size * self.rows)
+
+    def finish(self):
+        self.total_time = self.elapsed()
+
+    def as_dict(self):
+        return {
+            'query' : self.query,
+            'database' : self.database,
+            'started' : self.started,
+            'prepare_time' : self.prepare_time,
+            'execute_time' : self.execute_time,
+            'first_row_time' : self.first_row_time,
+            'fetch_time' : self.fetch_time,
+            'process_time' : self.process_time,
+            'total_time' : self.total_time,
+            'rows' : self.rows,
+            'bytes' : self.bytes,
+            'cached' : self.cached,
+            'error' : self.error}
+
+    def __str__(self):
+        if self.error:
+            return '{} failed after {:.3f}s : {}'.format(self.query,
+                self.total_time, self.error)
+        return '{} returned {} rows in {:.3f}s (execute {:.3f}s, ' \
+            'fetch {:.3f}s, process {:.3f}s{})'.format(self.query,
+            self.rows, self.total_time, self.execute_time or 0.0,
+            self.fetch_time, self.process_time,
+            ', cached' if self.cached else '')
+
+
+class AJSONLinesSink(object):
+    """ Appends query statistics to a file, one JSON object per line.
+
+    An AJSONLinesSink is a listener that can be registered with the query
+    engines. It may be shared between engines running on different threads.
+
+    Attributes:
+        path : Path of the file the records are appended to
+    """
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path
+
+    @path.setter
+    def path(self, path):
+        raise RuntimeError('This is a read-only field')
+
+    def __call__(self, stats):
+        line = json.dumps(stats.as_dict()) + '\n'
+        with self._lock:
+            with open(self._path, 'a') as f:
+                f.write(line)
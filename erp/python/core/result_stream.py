@@ -0,0 +1,143 @@
+"""
+module : result_stream
+
+Streams the results of a query in batches instead of materializing the
+complete result table.
+"""
+import time
+
+from .query import AQueryError
+
+
+class AResultStream(object):
+    """ Represents the rows of an executed query that are yet to be fetched.
+
+    A result stream owns an open cursor. Rows are pulled from the cursor in
+    batches using fetchmany so that only one batch is held in memory at a
+    time. The column names and types are known as soon as the query has
+    been executed and can be used to set up downstream consumers before the
+    first row arrives.
+
+    Note : The stream must be exhausted or closed before the owning engine
+    can execute another query. Use the with clause to guarantee that.
+
+    Note : When the stream is given an AQueryStats object it accounts the
+    time spent fetching and cleaning each batch in it.
+
+    Attributes:
+        columns    : The list containing the heading of each column
+        types      : The list containing the type of each column
+        batch_size : Number of rows fetched per round trip
+        stats      : Optional AQueryStats of the execution
+    """
+    def __init__(self, cursor, columns, types, batch_size, clean_row,
+            on_close=None, pending=None, stats=None):
+        if batch_size < 1:
+            raise AQueryError('Batch size must be a positive integer')
+        self._cursor = cursor
+        self._columns = columns
+        self._types = types
+        self._batch_size = batch_size
+        self._clean_row = clean_row
+        self._on_close = on_close
+        # Rows that were fetched ahead, e.g. to infer the column types
+        self._pending = pending
+        self._stats = stats
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @columns.setter
+    def columns(self, columns):
+        raise RuntimeError("This field represents a result of a query.")
+
+    @property
+    def types(self):
+        return self._types
+
+    @types.setter
+    def types(self, types):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    @batch_size.setter
+    def batch_size(self, batch_size):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def stats(self):
+        return self._stats
+
+    @stats.setter
+    def stats(self, stats):
+        raise RuntimeError('This is a read-only field')
+
+    def closed(self):
+        return self._cursor is None
+
+    def _fetch(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(self._batch_size)
+        fetched = time.perf_counter()
+        batch = [self._clean_row(row) for row in rows]
+        if self._stats is not None:
+            self._stats.add_batch(batch, fetched - start,
+                time.perf_counter() - fetched)
+        return batch
+
+    def prefetch(self):
+        ''' Fetches the first batch ahead of the consumer, e.g. to infer
+        the column types, and returns it. The batch is still yielded by
+        batches.
+        '''
+        if self._pending is None:
+            self._pending = self._fetch()
+        return self._pending
+
+    def batches(self):
+        ''' Yields the rows of the result as lists of at most batch_size
+        rows. The stream is closed once the last batch has been fetched.
+        '''
+        if self.closed():
+            raise AQueryError('Result stream has been closed')
+        try:
+            if self._pending:
+                pending = self._pending
+                self._pending = None
+                yield pending
+            while True:
+                batch = self._fetch()
+                if not batch:
+                    break
+                yield batch
+        finally:
+            self.close()
+
+    def __iter__(self):
+        for batch in self.batches():
+            for row in batch:
+                yield row
+
+    def close(self):
+        ''' Releases the cursor. Un-fetched rows are discarded. '''
+        if self._cursor is None:
+            return
+        cursor = self._cursor
+        self._cursor = None
+        self._pending = None
+        try:
+            cursor.close()
+        finally:
+            if self._on_close:
+                self._on_close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,243 @@
+"""
+module: rules
+
+Declarative checks on the rows of a query. The checks are compiled into the
+SQL text of the query so that only the rows that fail them are returned.
+"""
+from abc import ABCMeta,abstractmethod
+import re
+
+from .query import AQuery
+from .query import AQueryError
+from .filter import AFilter
+from .sqlutil import escape_percent
+from .sqlutil import like_to_regex
+from .sqlutil import strip_order_by
+
+
+class ARule(object, metaclass=ABCMeta):
+    """ A check on a row of a query result.
+
+    A rule describes a defect. A row fails the rule when the defect is
+    present, and is then reported with the reason of the rule. Rules refer
+    to the result columns of the checked query by name.
+
+    Attributes:
+        reason : A string explaining why a row fails the rule
+    """
+    def __init__(self, reason):
+        self._reason = reason
+
+    @property
+    def reason(self):
+        return self._reason
+
+    @reason.setter
+    def reason(self, reason):
+        raise RuntimeError('This is a read-only field')
+
+    def sql(self, alias):
+        ''' Returns the SQL predicate that is true for the failing rows of
+        the derived table alias and the tuple of its parameters, or None
+        if the rule cannot be evaluated by the server.
+        '''
+        return None
+
+    @abstractmethod
+    def bind(self, columns):
+        ''' Returns a function that takes a row with the given columns and
+        returns True if the row fails the rule.
+        '''
+        pass
+
+    def _positions(self, names, columns):
+        try:
+            return [columns.index(name) for name in names]
+        except ValueError:
+            raise AQueryError('{} refers to a missing column'.format(
+                type(self).__name__))
+
+
+class AIsEmpty(ARule):
+    """ Fails rows in which all the given columns are NULL or blank """
+    def __init__(self, columns, reason):
+        super().__init__(reason)
+        if isinstance(columns, str):
+            columns = [columns]
+        self._columns = list(columns)
+
+    def sql(self, alias):
+        return ' AND '.join("IsNull({}.{}, '') = ''".format(alias, column)
+            for column in self._columns), ()
+
+    def bind(self, columns):
+        positions = self._positions(self._columns, columns)
+        return lambda row: all(not row[idx] for idx in positions)
+
+
+class ALike(ARule):
+    """ Fails rows in which a column matches a T-SQL LIKE pattern, e.g.
+    '%[^a-zA-Z0-9]%' for a value with a character that is not alpha-numeric.
+    NULL never matches.
+
+    Note : The value is trimmed of leading and trailing blanks before it is
+    matched, since CHAR columns are padded with blanks on the server.
+    """
+    def __init__(self, column, pattern, reason):
+        super().__init__(reason)
+        self._column = column
+        self._pattern = pattern
+
+    def sql(self, alias):
+        return 'RTRIM(LTRIM({}.{})) LIKE %s'.format(alias, self._column), \
+            (self._pattern,)
+
+    def bind(self, columns):
+        idx, = self._positions([self._column], columns)
+        regex = like_to_regex(self._pattern)
+        return lambda row: row[idx] is not None and \
+            regex.fullmatch(row[idx].strip()) is not None
+
+
+class AMismatch(ARule):
+    """ Fails rows in which a column does not match a regular expression.
+    NULL is treated as the empty string.
+
+    Note : T-SQL has no regular expressions. The rule is evaluated in
+    python after the rows are fetched.
+    """
+    def __init__(self, column, regex, reason):
+        super().__init__(reason)
+        self._column = column
+        self._regex = re.compile(regex)
+
+    def bind(self, columns):
+        idx, = self._positions([self._column], columns)
+        return lambda row: self._regex.fullmatch(row[idx] or '') is None
+
+
+class AColumnsDiffer(ARule):
+    """ Fails rows in which two columns hold different values. NULL is
+    treated as the empty string.
+    """
+    def __init__(self, first, second, reason):
+        super().__init__(reason)
+        self._first = first
+        self._second = second
+
+    def sql(self, alias):
+        return "IsNull({0}.{1}, '') <> IsNull({0}.{2}, '')".format(alias,
+            self._first, self._second), ()
+
+    def bind(self, columns):
+        first, second = self._positions([self._first, self._second], columns)
+        return lambda row: (row[first] or '') != (row[second] or '')
+
+
+class ARuleQuery(AQuery):
+    """ Checks the rows of a query against a list of rules.
+
+    The result holds the columns of the checked query and a Reason column
+    with the reason of the first rule each row fails. The rules are
+    compiled into a CASE expression so that the server computes the reason
+    and returns the failing rows only.
+
+    Rules that cannot be evaluated by the server, and the rules that follow
+    them, are left to ARuleFilter. All the rows are then returned and the
+    Reason column is NULL for the rows the server did not find failing.
+
+    Note : The ORDER BY clause of the checked query is dropped. When
+    order_by is given the result is sorted by those columns instead.
+
+    Attributes:
+        base     : The checked query
+        rules    : The list of rules in order of precedence
+        pushed   : The rules evaluated by the server
+        fallback : The rules evaluated in python by ARuleFilter
+        order_by : Result columns by which the result is sorted
+    """
+    ALIAS = 'src'
+
+    def __init__(self, base, rules, order_by=()):
+        self._base = base
+        self._rules = list(rules)
+        self._order_by = tuple(order_by)
+        self._pushed = []
+        for rule in self._rules:
+            if rule.sql(self.ALIAS) is None:
+                break
+            self._pushed.append(rule)
+        self._fallback = self._rules[len(self._pushed):]
+        super().__init__()
+        self._requires = base.requires
+        if base.intern_columns is not None:
+            self._intern_columns = tuple(base.intern_columns) + ('Reason',)
+
+    @property
+    def base(self):
+        return self._base
+
+    @property
+    def rules(self):
+        return self._rules
+
+    @property
+    def pushed(self):
+        return self._pushed
+
+    @property
+    def fallback(self):
+        return self._fallback
+
+    @property
+    def order_by(self):
+        return self._order_by
+
+    def _init_query(self):
+        params = []
+        cases = []
+        for rule in self._pushed:
+            predicate, predicate_params = rule.sql(self.ALIAS)
+            cases.append('WHEN {} THEN %s'.format(predicate))
+            params.extend(predicate_params)
+            params.append(rule.reason)
+        reason = 'CASE {} END'.format(' '.join(cases)) if cases else 'NULL'
+        sql = strip_order_by(self._base.query)
+        if params and not self._base.query_tuple:
+            sql = escape_percent(sql)
+        params.extend(self._base.query_tuple)
+        self._query = '''SELECT * FROM (
+        SELECT {0}.*, {1} AS Reason FROM ({2}
+        ) AS {0}) AS checked'''.format(self.ALIAS, reason, sql)
+        if not self._fallback:
+            self._query += '\n        WHERE checked.Reason IS NOT NULL'
+        if self._order_by:
+            self._query += '\n        ORDER BY ' + ', '.join(
+                'checked.' + column for column in self._order_by)
+        self._query_tuple = tuple(params)
+
+
+class ARuleFilter(AFilter):
+    """ Completes the checks of an executed ARuleQuery.
+
+    The rules the server could not evaluate are applied to the rows it did
+    not find failing. Only the failing rows are kept.
+    """
+    def __init__(self, query):
+        super().__init__(query)
+
+    def _filter(self):
+        table = self._query._table
+        reason_idx = len(table._columns) - 1
+        checks = [(rule.bind(table._columns), rule.reason)
+            for rule in self._query.fallback]
+        for row in table._data:
+            if row[reason_idx] is None:
+                for check, reason in checks:
+                    if check(row):
+                        row = list(row)
+                        row[reason_idx] = reason
+                        break
+                else:
+                    continue
+            self._table._data.append(row)
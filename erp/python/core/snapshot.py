@@ -0,0 +1,185 @@
+"""
+module: snapshot
+
+Writes tables as Parquet or Arrow IPC files and maps them back into memory
+"""
+import json
+
+from .query import AQueryError
+from .table import ATable
+from .table import _LazyRows
+from .table import _TypedTable
+from .columnar_table import AColumnarTable
+from .columnar_table import _CategoricalColumn
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Key of the types of the columns in the metadata of the schema
+_TYPES = b'erp.types'
+# The first bytes of an Arrow IPC file
+_IPC_MAGIC = b'ARROW1'
+
+
+def _require():
+    if pyarrow is None:
+        raise AQueryError('pyarrow is required for snapshots')
+
+
+def _columnar_array(column):
+    ''' Returns an arrow array that shares the memory of a column of a
+    columnar table where it can
+    '''
+    if isinstance(column, _CategoricalColumn):
+        codes = column._codes
+        indices = pyarrow.array(codes, mask=codes < 0)
+        return pyarrow.DictionaryArray.from_arrays(indices,
+            pyarrow.array(column.categories, type=pyarrow.string()))
+    if column._values.dtype == object:
+        return pyarrow.array(column.tolist(0, len(column)))
+    return pyarrow.array(column._values, mask=column._nulls)
+
+
+def to_arrow(table):
+    ''' Returns the arrow table holding the rows of a table. The types of
+    the columns are kept in the metadata of the schema.
+    '''
+    _require()
+    if isinstance(table, AArrowTable):
+        return table.arrow
+    columns = table._columns
+    if isinstance(table, AColumnarTable):
+        arrays = [_columnar_array(column) for column in table._arrays or []]
+    else:
+        data = table._data or []
+        arrays = [pyarrow.array([row[idx] for row in data])
+            for idx in range(len(columns))]
+    types = table._types or [None] * len(columns)
+    return pyarrow.Table.from_arrays(arrays, names=list(columns),
+        metadata={_TYPES: json.dumps(list(types)).encode('utf-8')})
+
+
+def to_parquet(table, path, compression='zstd'):
+    ''' Writes a table to a Parquet file '''
+    pyarrow.parquet.write_table(to_arrow(table), path,
+        compression=compression)
+
+
+def to_arrow_ipc(table, path):
+    ''' Writes a table to an uncompressed Arrow IPC file, which can be
+    mapped into memory without copying
+    '''
+    arrow = to_arrow(table)
+    with pyarrow.OSFile(str(path), 'wb') as sink:
+        with pyarrow.ipc.new_file(sink, arrow.schema) as writer:
+            writer.write_table(arrow)
+
+
+def open_snapshot(path):
+    ''' Opens a Parquet or Arrow IPC file as an AArrowTable. An Arrow IPC
+    file is mapped into memory and its columns are not copied. A Parquet
+    file is mapped and decoded.
+    '''
+    _require()
+    with open(path, 'rb') as f:
+        magic = f.read(len(_IPC_MAGIC))
+    if magic == _IPC_MAGIC:
+        arrow = pyarrow.ipc.open_file(pyarrow.memory_map(str(path))).read_all()
+    else:
+        arrow = pyarrow.parquet.read_table(path, memory_map=True)
+    return AArrowTable.from_arrow(arrow)
+
+
+class _ArrowRows(_LazyRows):
+    ''' The rows of an arrow table '''
+    def __init__(self, arrow):
+        self._arrow = arrow
+
+    def __len__(self):
+        return self._arrow.num_rows
+
+    def _row(self, idx):
+        return [column[idx].as_py() for column in self._arrow.columns]
+
+    def _rows(self, start, stop):
+        part = self._arrow.slice(start, stop - start)
+        return [list(row) for row in zip(*[column.to_pylist()
+            for column in part.columns])]
+
+
+class AArrowTable(_TypedTable, ATable):
+    """ A table backed by an arrow table, e.g. a snapshot mapped into
+    memory.
+
+    The table keeps the interface of ATable. Rows are built as lists when
+    they are read, so a table mapped from a file holds little memory until
+    its rows are used.
+
+    Note : The rows of an arrow table cannot be modified in place.
+    Assigning _data converts the rows into a new arrow table.
+
+    Note : pyarrow is required.
+
+    Attributes:
+        arrow  : The arrow table
+        nbytes : Memory referenced by the arrow table in bytes
+    """
+    _KIND = 'an arrow table'
+
+    def __init__(self):
+        _require()
+        self._arrow = None
+        self._rows = None
+        super().__init__()
+
+    @classmethod
+    def from_arrow(cls, arrow):
+        table = cls()
+        types = None
+        metadata = arrow.schema.metadata or {}
+        if _TYPES in metadata:
+            types = json.loads(metadata[_TYPES].decode('utf-8'))
+        table._columns = list(arrow.column_names)
+        table._types = types or [None] * len(table._columns)
+        table._arrow = arrow
+        return table
+
+    @property
+    def arrow(self):
+        return self._arrow
+
+    @arrow.setter
+    def arrow(self, arrow):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def _data(self):
+        if self._arrow is None:
+            return None
+        if self._rows is None:
+            self._rows = _ArrowRows(self._arrow)
+        return self._rows
+
+    @_data.setter
+    def _data(self, data):
+        self._rows = None
+        if data is None:
+            self._arrow = None
+            return
+        table = ATable()
+        table._columns = self._columns
+        table._types = self._types
+        table._data = data
+        self._arrow = to_arrow(table)
+
+    @property
+    def nbytes(self):
+        return self._arrow.nbytes if self._arrow is not None else 0
+
+    def column(self, name):
+        ''' Returns the values of a column as a list '''
+        return self._arrow.column(self.index(name)).to_pylist()
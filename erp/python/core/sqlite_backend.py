@@ -0,0 +1,108 @@
+"""
+module: sqlite_backend
+
+A SQLite backend that stands in for the ERP data base when it is not
+available
+"""
+import functools
+import itertools
+import re
+import sqlite3
+
+from .backend import ABackend
+from .sqlutil import code_spans
+from .sqlutil import like_to_regex
+from .sqlutil import strip_order_by
+
+_ISNULL = re.compile(r'\bisnull\s*\(', re.I)
+_TEMP_TABLE = re.compile(r'#(\w+)')
+_PARAM = re.compile(r'%s')
+
+_memory_ids = itertools.count()
+
+_like_regex = functools.lru_cache(maxsize=256)(like_to_regex)
+
+def _like(pattern, value):
+    ''' Implements the T-SQL LIKE operator '''
+    if pattern is None or value is None:
+        return None
+    return _like_regex(pattern).fullmatch(str(value)) is not None
+
+
+class ASQLiteBackend(ABackend):
+    """ A backend for SQLite data bases.
+
+    Queries are written in T-SQL. The backend translates the constructs
+    used by the ERP queries that SQLite does not understand:
+        IsNull(a, b)       becomes IFNULL(a, b)
+        #name              becomes the temporary table name
+        %s parameters      become ? parameters
+    String literals and comments are left untouched. LIKE follows T-SQL and
+    supports character classes such as [^a-z].
+
+    SQLite does not report column types. The engine infers them from the
+    values of the first batch of rows.
+
+    Note : Each in-memory data base is private to its backend object. All
+    the connections opened by the backend share it.
+
+    Attributes:
+        path : Path of the data base file or ':memory:'
+    """
+    def __init__(self, path=':memory:'):
+        super().__init__(path)
+        self._keeper = None
+        if path == ':memory:':
+            # A named shared cache data base lives as long as one connection
+            # to it is open. The keeper connection holds it open.
+            self._uri = 'file:analytics_{}?mode=memory&cache=shared'.format(
+                next(_memory_ids))
+            self._keeper = self.connect()
+        else:
+            self._uri = None
+
+    def connect(self):
+        # Connections are handed between the worker threads of the pool and
+        # the async engine, but are never used by two threads at once.
+        if self._uri:
+            conn = sqlite3.connect(self._uri, uri=True,
+                check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self._database, check_same_thread=False)
+        conn.create_function('like', 2, _like, deterministic=True)
+        return conn
+
+    def translate(self, sql):
+        parts = []
+        end = 0
+        for start, stop in code_spans(sql):
+            # The literal or comment before the code is kept as it is
+            parts.append(sql[end:start])
+            code = _ISNULL.sub('IFNULL(', sql[start:stop])
+            code = _TEMP_TABLE.sub(r'\1', code)
+            parts.append(_PARAM.sub('?', code))
+            end = stop
+        return ''.join(parts)
+
+    def materialize_sql(self, temp_table):
+        return 'CREATE TEMP TABLE {} AS {}'.format(temp_table.name,
+            self.translate(strip_order_by(temp_table.query.query)))
+
+    def cancel(self, conn):
+        conn.interrupt()
+
+    def is_disconnect(self, error):
+        return isinstance(error, sqlite3.ProgrammingError) and \
+            'closed database' in str(error)
+
+    def translate_type_code(self, type_code):
+        return None
+
+    def executescript(self, script):
+        ''' Runs a script of SQLite statements, e.g. to create a schema '''
+        conn = self.connect()
+        try:
+            conn.executescript(script)
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,83 @@
+"""
+module: sqlutil
+
+Helpers to compose queries out of the SQL text of other queries
+"""
+import re
+
+from .query import AQueryError
+
+# Splits SQL text into string literals, comments and everything else
+_LITERALS = re.compile(r"('(?:[^']|'')*'|--[^\n]*|/\*.*?\*/)", re.S)
+_ORDER_BY = re.compile(r'\border\s+by\b', re.I)
+
+
+def code_spans(sql):
+    ''' Yields the (start, end) offsets of the parts of the SQL text that
+    are neither string literals nor comments
+    '''
+    start = 0
+    for match in _LITERALS.finditer(sql):
+        yield start, match.start()
+        start = match.end()
+    yield start, len(sql)
+
+
+def strip_order_by(sql):
+    ''' Returns the SQL text of a query without its outermost ORDER BY
+    clause.
+
+    T-SQL does not allow ORDER BY in a derived table. It is removed before
+    the query is wrapped by another one.
+    '''
+    depth = 0
+    found = None
+    for start, end in code_spans(sql):
+        code = sql[start:end]
+        for match in re.finditer(r'[()]|\border\s+by\b', code, re.I):
+            depth = depth + (match.group() == '(') - (match.group() == ')')
+            if depth == 0 and _ORDER_BY.match(match.group()):
+                found = start + match.start()
+    if depth != 0:
+        raise AQueryError('Unbalanced parentheses in query')
+    if found is None:
+        return sql
+    return sql[:found].rstrip()
+
+
+def escape_percent(sql):
+    ''' Escapes the % characters of a query that has no parameters, so
+    that it can be combined with parameters of another statement.
+    '''
+    return sql.replace('%', '%%')
+
+
+def like_to_regex(pattern):
+    ''' Translates a T-SQL LIKE pattern into a compiled regular expression
+    that matches the same strings, ignoring case as the default collation
+    of the ERP data base does.
+
+    Supports the % and _ wildcards and the [abc], [a-z] and [^abc]
+    character classes.
+    '''
+    regex = []
+    idx = 0
+    while idx < len(pattern):
+        char = pattern[idx]
+        end = pattern.find(']', idx + 2) if char == '[' else -1
+        if char == '%':
+            regex.append('.*')
+        elif char == '_':
+            regex.append('.')
+        elif end > 0:
+            chars = pattern[idx + 1:end]
+            negate = chars.startswith('^')
+            if negate:
+                chars = chars[1:]
+            regex.append('[' + ('^' if negate else '') +
+                chars.replace('\\', '\\\\').replace('[', '\\[') + ']')
+            idx = end
+        else:
+            regex.append(re.escape(char))
+        idx = idx + 1
+    return re.compile(''.join(regex), re.I | re.S)
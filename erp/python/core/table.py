@@ -5,6 +5,89 @@ description : This module models a table that is represented by a
 list of lists.
 
 """
+from collections import namedtuple
+from functools import lru_cache
+
+from .table_index import ATableIndex
+
+
+@lru_cache(maxsize=128)
+def _record_type(columns):
+    return namedtuple('ARecord', columns, rename=True)
+
+def record_type(columns):
+    ''' Returns a named tuple type whose fields are the given column names.
+    Names that are not valid identifiers are replaced by _<position>.
+    '''
+    return _record_type(tuple(columns))
+
+
+# Number of rows converted into python lists at a time by lazy rows
+_CHUNK = 4096
+
+
+class _LazyRows(object):
+    ''' A read-only sequence of rows that are built as lists when they are
+    accessed. Subclasses implement __len__ and _row, and _rows where a run
+    of rows can be built at once.
+    '''
+    def __len__(self):
+        raise NotImplementedError
+
+    def _row(self, idx):
+        raise NotImplementedError
+
+    def _rows(self, start, stop):
+        return [self._row(idx) for idx in range(start, stop)]
+
+    def __getitem__(self, idx):
+        n_rows = len(self)
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(n_rows)
+            if step == 1:
+                return self._rows(start, max(stop, start))
+            return [self._row(pos) for pos in range(start, stop, step)]
+        if idx < 0:
+            idx = idx + n_rows
+        if not 0 <= idx < n_rows:
+            raise IndexError('Row index out of range')
+        return self._row(idx)
+
+    def __iter__(self):
+        n_rows = len(self)
+        for start in range(0, n_rows, _CHUNK):
+            yield from self._rows(start, min(start + _CHUNK, n_rows))
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+
+class _TypedTable(object):
+    ''' Overrides of ATable for a table whose columns hold values of a
+    single type by construction and whose rows cannot be modified in place.
+    Mix in before ATable.
+    '''
+    _KIND = 'this table'
+
+    def _validate(self):
+        return True
+
+    @property
+    def validated(self):
+        return True
+
+    @validated.setter
+    def validated(self, validated):
+        raise RuntimeError('This is a read-only field')
+
+    def extend(self, rows):
+        raise RuntimeError('The rows of {} cannot be modified'.format(
+            self._KIND))
+
+
 class ATable(object):
     """ Represens a table.
 
@@ -19,16 +102,55 @@ class ATable(object):
         _columns : The list containing the heading of each column
         _types : This is an optional attribute that specifies the
         type of each column
+        _trusted : If True the rows come from a source that keeps the
+            types of the columns, and only a sample of them is validated
+        validated : True if all the rows have been validated
+        sampled : True if some of the rows have been validated on a sample
+            only, in which case validated is False
+
+    Note : The position of each column name is computed once and kept until
+    the columns change, so index does not scan the columns.
+
+    Note : Indexes created over the key columns with create_index are kept
+    with the table, so that rows can be looked up by key.
+
+    Note : project, sort, join and group_by return a new table and leave
+    the table unchanged.
+
+    Note : rows, select, where and overlay return an ATableView, which
+    shares the rows of the table instead of copying them.
+
+    Note : A table can be written to Parquet or Arrow IPC files and opened
+    again with open_snapshot. pyarrow is required.
+
+    Note : A table is validated once. Rows added later with append or
+    extend are checked on their own.
     """
     STRING = 'string'
     NUMBER = 'number'
     DATETIME = 'datetime'
     ROWID = 'rowid'
     BINARY = 'binary'
+    # Number of rows of a trusted table that are checked by _validate
+    SAMPLE_SIZE = 100
+    # Number of rows whose columns are checked at a time
+    CHUNK_SIZE = 10000
     def __init__(self):
         self._columns = None
         self._types = None
         self._data = None
+        self._positions = None
+        # The column list the positions were computed from and its length
+        self._positions_of = (None, 0)
+        # The rows that were validated, how many of them and the type of
+        # each column found so far
+        self._validated_of = None
+        self._n_validated = 0
+        self._row_types = []
+        self._sampled = False
+        self._trusted = False
+        # The indexes created over the table by key columns
+        self._indexes = {}
 
     def __len__(self):
         if not self._data:
@@ -73,42 +195,242 @@ class ATable(object):
         number of elements of each row of the data. The type of each row
         of the data is consistent across all rows. A None type will match
         with any other type.
-        
+
+        Note : Only the rows added since the last validation are checked,
+        a column at a time. The rows of a trusted table, e.g. the rows
+        fetched by the engine, are checked on a sample.
         """
-        num_cols = len(self.columns)
-        if not len(self.data):
+        data = self._data
+        if data is None:
             return True # An empty table is valid
-        type_list = [type(x) for x in self.data[0]]
-        for row in self.data[1:]:
-            for idx,x in enumerate(zip(type_list,row)):
-                if x[1] == None:
-                    continue
-                if x[0] == type(None):
-                    type_list[idx] = type(x[1])
-                    continue
-                if x[0] != type(x[1]):
-                    raise RuntimeError("Type error in row " + idx)
+        if self._validated_of is not data:
+            self._validated_of = data
+            self._n_validated = 0
+            self._row_types = []
+            self._sampled = False
+        start = self._n_validated
+        n_rows = len(data)
+        step = 1
+        if self._trusted:
+            step = max((n_rows - start) // ATable.SAMPLE_SIZE, 1)
+            self._sampled = self._sampled or step > 1
+        for chunk in range(start, n_rows, ATable.CHUNK_SIZE * step):
+            stop = min(chunk + ATable.CHUNK_SIZE * step, n_rows)
+            self._check_rows(data[chunk:stop:step], chunk, step)
+        self._n_validated = n_rows
         return True # Data base is consistent
-    
+
+    def _check_rows(self, rows, first, step):
+        ''' Checks the types of the rows a column at a time. The first row
+        is row first of the table and the rows are step rows apart.
+        '''
+        row_types = self._row_types
+        for idx, column in enumerate(zip(*rows)):
+            if idx == len(row_types):
+                row_types.append(None)
+            kinds = set(map(type, column))
+            kinds.discard(type(None))
+            if row_types[idx] is not None:
+                kinds.add(row_types[idx])
+            if len(kinds) > 1:
+                expected = row_types[idx] or next(type(x) for x in column
+                    if x is not None)
+                for pos, x in enumerate(column):
+                    if x is not None and type(x) is not expected:
+                        break
+                name = self._columns[idx] if idx < len(self._columns) \
+                    else idx
+                raise RuntimeError('Type error in row {} column {}'.format(
+                    first + pos * step, name))
+            if kinds:
+                row_types[idx] = kinds.pop()
+
+    @property
+    def validated(self):
+        ''' True if all the rows of the table have been validated. Rows
+        checked on a sample only are not validated, see sampled.
+        '''
+        return self._data is None or (self._validated_of is self._data and
+            self._n_validated == len(self._data) and not self._sampled)
+
+    @validated.setter
+    def validated(self, validated):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def sampled(self):
+        ''' True if rows of the table were checked on a sample only '''
+        return self._validated_of is self._data and self._sampled
+
+    @sampled.setter
+    def sampled(self, sampled):
+        raise RuntimeError('This is a read-only field')
+
+    def append(self, row):
+        ''' Appends a row and validates it '''
+        self.extend([row])
+
+    def extend(self, rows):
+        ''' Appends rows and validates the new rows only '''
+        if self._data is None:
+            self._data = []
+        self._data.extend(rows)
+        self._validate()
+
+    def _column_positions(self):
+        ''' Returns the map of the column names to their positions '''
+        columns = self.columns
+        computed, length = self._positions_of
+        if computed is not columns or length != len(columns):
+            positions = {}
+            for idx, name in enumerate(columns):
+                positions.setdefault(name, idx)
+            self._positions = positions
+            self._positions_of = (columns, len(columns))
+        return self._positions
+
     def index(self, name):
         ''' Returns the column index provided the name.
         
         Returns the index of the column provided the name. If 
         name does not exist, raies an exception.
         '''
-        if name in self.columns:
-            return self.columns.index(name)
-        raise RuntimeError('Column with name "{}" does not exist')
+        try:
+            return self._column_positions()[name]
+        except KeyError:
+            raise RuntimeError(
+                'Column with name "{}" does not exist'.format(name))
+
+    def create_index(self, columns, unique=False):
+        ''' Returns a hash index over one or more key columns.
+
+        The index is created once and kept with the table. It is built
+        when it is first used.
+
+        Args :
+            columns : The name of the key column or a list of names
+            unique  : If True a key must identify a single row
+        Returns :
+            An ATableIndex
+        '''
+        if isinstance(columns, str):
+            columns = [columns]
+        key = (tuple(columns), unique)
+        index = self._indexes.get(key)
+        if index is None:
+            index = ATableIndex(self, columns, unique)
+            self._indexes[key] = index
+        return index
+
+    def project(self, columns):
+        ''' Returns a new table with the given columns in that order '''
+        from . import operators
+        return operators.project(self, columns)
+
+    def sort(self, columns, descending=False):
+        ''' Returns a new table with the rows sorted by columns. NULL sorts
+        first. descending is a flag for all the columns or a list with a
+        flag per column.
+        '''
+        from . import operators
+        return operators.sort(self, columns, descending)
+
+    def join(self, other, on, right_on=None, how='inner'):
+        ''' Returns a new table with the hash join of this table and other.
+
+        Args :
+            other    : The table whose rows are looked up
+            on       : The names of the key columns of this table
+            right_on : The names of the key columns of other, if they are
+                       named differently
+            how      : One of 'inner', 'left' and 'anti'
+        Returns :
+            An ATable
+        '''
+        from . import operators
+        return operators.join(self, other, on, right_on, how)
+
+    def group_by(self, columns, aggregates):
+        ''' Returns a new table with a row per distinct value of the key
+        columns and an entry per AAggregate, e.g. AAggregate('SUM', 'Qty')
+        or AAggregate('COUNT', 'Style', distinct=True).
+        '''
+        from . import operators
+        return operators.group_by(self, columns, aggregates)
+
+    @property
+    def rows(self):
+        ''' The rows of the table. A slice of the rows, e.g.
+        table.rows[100:200], is an ATableView that shares them.
+        '''
+        from .table_view import ATableView, _RowSlicer
+        return _RowSlicer(ATableView.of(self))
+
+    def select(self, columns):
+        ''' Returns an ATableView of the given columns in that order '''
+        from .table_view import ATableView
+        return ATableView.of(self).select(columns)
+
+    def where(self, mask):
+        ''' Returns an ATableView of the rows selected by mask, either a
+        sequence with a truth value per row or a function of a row
+        '''
+        from .table_view import ATableView
+        return ATableView.of(self).where(mask)
+
+    def overlay(self, name, values, type_string=None):
+        ''' Returns an ATableView with an extra column holding values, one
+        per row, e.g. the reason a row was rejected
+        '''
+        from .table_view import ATableView
+        return ATableView.of(self).overlay(name, values, type_string)
+
+    def to_arrow(self):
+        ''' Returns the rows of the table as a pyarrow table '''
+        from . import snapshot
+        return snapshot.to_arrow(self)
+
+    def to_parquet(self, path, compression='zstd'):
+        ''' Writes the table to a Parquet file '''
+        from . import snapshot
+        snapshot.to_parquet(self, path, compression)
+
+    def to_arrow_ipc(self, path):
+        ''' Writes the table to an Arrow IPC file that open_snapshot maps
+        into memory without copying the columns
+        '''
+        from . import snapshot
+        snapshot.to_arrow_ipc(self, path)
+
+    @staticmethod
+    def open_snapshot(path):
+        ''' Opens a table written by to_parquet or to_arrow_ipc.
+
+        Args :
+            path : The path of the Parquet or Arrow IPC file
+        Returns :
+            An AArrowTable
+        '''
+        from . import snapshot
+        return snapshot.open_snapshot(path)
+
+    def record_type(self):
+        ''' Returns the named tuple type of the rows of the table '''
+        return record_type(self.columns)
+
+    def records(self):
+        ''' Yields the rows of the table as named tuples, so that the value
+        of a column can be read as row.UPC
+        '''
+        record = self.record_type()
+        for row in self._data or []:
+            yield row if type(row) is record else record._make(row)
         
     def __iter__(self):
-        self._index = 0
-        return self
-    
-    def __next__(self):
-        if self._index < len(self._data):
-            self._index = self._index + 1
-            return self._data[self._index-1]
-        raise StopIteration()
+        ''' Returns an iterator over the rows. Each call returns a new
+        iterator, so a table can be iterated in nested loops.
+        '''
+        return iter(self._data or [])
 
 
 
@@ -0,0 +1,161 @@
+"""
+module: table_index
+
+A hash index over the key columns of a table
+"""
+import bisect
+
+
+class ATableIndex(object):
+    """ Maps the values of one or more key columns to the rows of a table.
+
+    The key of a row is the value of its key column, or the tuple of the
+    values of its key columns when there are several. The index is built
+    the first time it is used. Rows appended to the table later are added
+    to the index when it is next used, and the index is rebuilt if the rows
+    of the table are replaced.
+
+    Note : Rows modified in place are not reindexed.
+
+    Note : Range iteration sorts the keys once. Keys holding NULL are left
+    out of ranges, as a NULL is not comparable.
+
+    Attributes:
+        table   : The indexed table
+        columns : The names of the key columns
+        unique  : If True a key must identify a single row
+    """
+    def __init__(self, table, columns, unique=False):
+        if isinstance(columns, str):
+            columns = [columns]
+        self._table = table
+        self._columns = tuple(columns)
+        self._unique = unique
+        self._keys = None
+        self._sorted = None
+        # The rows the index was built from and how many of them
+        self._indexed_of = None
+        self._n_indexed = 0
+
+    @property
+    def table(self):
+        return self._table
+
+    @table.setter
+    def table(self, table):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def columns(self):
+        return self._columns
+
+    @columns.setter
+    def columns(self, columns):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def unique(self):
+        return self._unique
+
+    @unique.setter
+    def unique(self, unique):
+        raise RuntimeError('This is a read-only field')
+
+    def key(self, row):
+        ''' Returns the key of a row of the table '''
+        return self._key_function()(row)
+
+    def _key_function(self):
+        positions = [self._table.index(name) for name in self._columns]
+        if len(positions) == 1:
+            position, = positions
+            return lambda row: row[position]
+        return lambda row: tuple([row[idx] for idx in positions])
+
+    def _update(self):
+        ''' Builds the index or adds the rows appended since it was built '''
+        data = self._table._data
+        if data is None:
+            data = []
+        if self._indexed_of is not data or self._n_indexed > len(data):
+            self._keys = {}
+            self._indexed_of = data
+            self._n_indexed = 0
+        if self._n_indexed == len(data):
+            return self._keys
+        key = self._key_function()
+        keys = self._keys
+        # The keys of the new rows are merged only once all of them have
+        # been checked, so a duplicate leaves the index as it was
+        added = {}
+        for position in range(self._n_indexed, len(data)):
+            row_key = key(data[position])
+            if self._unique:
+                found = keys.get(row_key, added.get(row_key))
+                if found is not None:
+                    raise RuntimeError('Duplicate key {!r} in rows {} and {}'
+                        .format(row_key, found, position))
+                added[row_key] = position
+            else:
+                added.setdefault(row_key, []).append(position)
+        if self._unique:
+            keys.update(added)
+        else:
+            for row_key, positions in added.items():
+                keys.setdefault(row_key, []).extend(positions)
+        self._n_indexed = len(data)
+        self._sorted = None
+        return keys
+
+    def positions(self, key):
+        ''' Returns the list of the positions of the rows with a key '''
+        found = self._update().get(key)
+        if found is None:
+            return []
+        return [found] if self._unique else found
+
+    def lookup(self, key):
+        ''' Returns the row with a key, or None, if the index is unique.
+        Otherwise returns the list of the rows with the key.
+        '''
+        data = self._table._data
+        if self._unique:
+            position = self._update().get(key)
+            return None if position is None else data[position]
+        return [data[position] for position in self.positions(key)]
+
+    def contains(self, key):
+        ''' Returns True if a row has the key '''
+        return key in self._update()
+
+    def __contains__(self, key):
+        return self.contains(key)
+
+    def __len__(self):
+        ''' Returns the number of distinct keys '''
+        return len(self._update())
+
+    def keys(self):
+        ''' Returns the distinct keys '''
+        return self._update().keys()
+
+    def range(self, low=None, high=None):
+        ''' Yields the rows whose key lies between low, included, and high,
+        excluded, in the order of their keys. A bound of None is open.
+        '''
+        keys = self._update()
+        if self._sorted is None:
+            self._sorted = sorted(key for key in keys if not _has_null(key))
+        start = 0 if low is None else bisect.bisect_left(self._sorted, low)
+        stop = len(self._sorted) if high is None else \
+            bisect.bisect_left(self._sorted, high)
+        data = self._table._data
+        for key in self._sorted[start:stop]:
+            for position in self.positions(key):
+                yield data[position]
+
+
+def _has_null(key):
+    if isinstance(key, tuple):
+        return any(value is None for value in key)
+    return key is None
@@ -0,0 +1,170 @@
+"""
+module: table_view
+
+Views that select rows and columns of a table without copying them
+"""
+from .query import AQueryError
+from .table import ATable
+from .table import _LazyRows
+
+
+class _ViewRows(_LazyRows):
+    ''' A read-only sequence of the rows of a view. Rows are built as lists
+    when they are accessed, unless the view keeps all the columns of its
+    table, in which case the rows of the table are returned as they are.
+    '''
+    def __init__(self, data, positions, sources, shared):
+        self._data = data
+        self._row_positions = positions
+        self._sources = sources
+        self._shared = shared
+
+    def __len__(self):
+        return len(self._row_positions)
+
+    def _row(self, idx):
+        row = self._data[self._row_positions[idx]]
+        if self._shared:
+            return row
+        return [row[source] if type(source) is int else source[idx]
+            for source in self._sources]
+
+
+class ATableView(ATable):
+    """ A view of some of the rows and columns of a table.
+
+    A view holds the positions of its rows in the table and, for each of
+    its columns, the position of the column in the table. It can add
+    columns of its own, such as a Reason, whose values are held by the
+    view. Creating a view only allocates the positions; the rows of the
+    table are not copied. A view of a view refers to the underlying table
+    directly.
+
+    Note : A view follows the rows of its table, which must not be removed
+    or reordered while the view is in use.
+
+    Attributes:
+        base : The table the rows are taken from
+    """
+    def __init__(self, table, positions=None, sources=None, types=None,
+            columns=None):
+        self._rows = None
+        super().__init__()
+        self._base = table
+        if positions is None:
+            positions = range(len(table._data or []))
+        self._row_positions = positions
+        if sources is None:
+            sources = list(range(len(table._columns)))
+        self._sources = sources
+        self._columns = list(table._columns) if columns is None else columns
+        if types is None:
+            types = table._types and list(table._types)
+        self._types = types
+        self._trusted = table._trusted
+
+    @classmethod
+    def of(cls, table):
+        ''' Returns a view of all the rows and columns of a table '''
+        if isinstance(table, ATableView):
+            return table
+        return cls(table)
+
+    @property
+    def base(self):
+        return self._base
+
+    @base.setter
+    def base(self, base):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def _data(self):
+        if self._columns is None:
+            return None
+        data = self._base._data
+        if self._rows is None or self._rows._data is not data:
+            shared = self._sources == list(range(len(self._base._columns)))
+            self._rows = _ViewRows(data or [], self._row_positions,
+                self._sources, shared)
+        return self._rows
+
+    @_data.setter
+    def _data(self, data):
+        if data is not None:
+            raise RuntimeError('The rows of a view cannot be assigned')
+
+    def extend(self, rows):
+        raise RuntimeError('Rows cannot be added to a view')
+
+    def _types_of(self, indices):
+        if not self._types:
+            return None
+        return [self._types[idx] for idx in indices]
+
+    def slice(self, start, stop, step=1):
+        ''' Returns a view of a range of the rows '''
+        keep = range(len(self._row_positions))[start:stop:step]
+        return ATableView(self._base, self._row_positions[start:stop:step],
+            [source if type(source) is int else [source[idx] for idx in keep]
+                for source in self._sources], self._types,
+            list(self._columns))
+
+    def select(self, columns):
+        ''' Returns a view of the given columns in that order '''
+        if isinstance(columns, str):
+            columns = [columns]
+        indices = [self.index(name) for name in columns]
+        return ATableView(self._base, self._row_positions,
+            [self._sources[idx] for idx in indices], self._types_of(indices),
+            list(columns))
+
+    def where(self, mask):
+        ''' Returns a view of the rows selected by mask. mask is either a
+        sequence with a truth value per row or a function that takes a row
+        and returns a truth value.
+        '''
+        if callable(mask):
+            keep = [idx for idx, row in enumerate(self._data or [])
+                if mask(row)]
+        else:
+            mask = list(mask)
+            if len(mask) != len(self._row_positions):
+                raise AQueryError('The mask needs a value per row')
+            keep = [idx for idx, selected in enumerate(mask) if selected]
+        positions = self._row_positions
+        return ATableView(self._base, [positions[idx] for idx in keep],
+            [source if type(source) is int else [source[idx] for idx in keep]
+                for source in self._sources], self._types,
+            list(self._columns))
+
+    def overlay(self, name, values, type_string=None):
+        ''' Returns a view with an extra column that holds values, one per
+        row of the view
+        '''
+        values = list(values)
+        if len(values) != len(self._row_positions):
+            raise AQueryError('The column {} needs a value per row'.format(
+                name))
+        types = self._types_of(range(len(self._columns)))
+        if types is not None:
+            types.append(type_string)
+        return ATableView(self._base, self._row_positions,
+            self._sources + [values], types, self._columns + [name])
+
+
+class _RowSlicer(object):
+    ''' The rows of a table, where a slice is a view '''
+    def __init__(self, view):
+        self._view = view
+
+    def __len__(self):
+        return len(self._view._row_positions)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self._view.slice(idx.start, idx.stop, idx.step)
+        return self._view._data[idx]
+
+    def __iter__(self):
+        return iter(self._view)
@@ -0,0 +1,64 @@
+"""
+module: temp_table
+
+Defines session scoped temporary tables that queries can be built on
+"""
+from .query import AQueryError
+from .sqlutil import strip_order_by
+
+
+class ATempTable(object):
+    """ A temporary table materialized from the results of a query.
+
+    Several queries often embed the same expensive subquery. Such a
+    subquery can instead be declared once as a temporary table which the
+    queries list in their requirements and reference as #name. The engine
+    materializes a temporary table the first time a query that requires it
+    is executed and reuses it for every later query on the same session.
+
+    Note : SQL Server drops a temporary table when the session that created
+    it is closed. A temporary table is therefore materialized once per
+    connection.
+
+    Attributes:
+        name  : Name of the table as referenced in SQL without the leading #
+        query : The AQuery whose results populate the table
+    """
+    def __init__(self, name, query):
+        if not name.isidentifier():
+            raise AQueryError('Invalid temporary table name ' + name)
+        self._name = name
+        self._query = query
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        raise RuntimeError('Property not writable')
+
+    @property
+    def query(self):
+        return self._query
+
+    @query.setter
+    def query(self, query):
+        raise RuntimeError('Property not writable')
+
+    def create_sql(self):
+        ''' Returns the statement that materializes the table. The ORDER BY
+        clause of the query is dropped, as T-SQL does not allow it in a
+        derived table.
+        '''
+        return 'SELECT * INTO #{0} FROM ({1}\n) AS {0}_src'.format(
+            self._name, strip_order_by(self._query.query))
+
+    def __eq__(self, other):
+        return isinstance(other, ATempTable) and self._name == other._name
+
+    def __hash__(self):
+        return hash(self._name)
+
+    def __repr__(self):
+        return '#' + self._name
@@ -3,88 +3,350 @@ module : write_table
 
 Exports a table as a readable excel sheet in xlsx format
 """
+from copy import copy
+import datetime
+import itertools
+import os
+
+from .query import AQueryError
 from .table import ATable
+from .writer import AWriter
 from openpyxl import Workbook
 from openpyxl import load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
 from openpyxl.styles import PatternFill, Border, Side, Font, Color, colors
+from openpyxl.styles import NamedStyle
 from openpyxl.utils import get_column_letter
 import logging
 
+# Values that set the number format of their cell
+_DATE_TYPES = (datetime.date, datetime.time, datetime.timedelta)
+
 
-class AWriteTable(object):
+class AWriteTable(AWriter):
     """ Writes the table out in xlsx format.
 
     This class implements the translation of a table into
-    xlsx format. It assumes that the table is valid.
+    xlsx format. It assumes that the table is valid. A result stream can
+    be written instead of a table.
+
+    Note : The sheet is written in a single pass with a write-only
+    workbook. The column widths are computed from the first batch of rows
+    before the first row is written, and each row is styled as it is
+    emitted, so the rows go to disk without a worksheet being held in
+    memory. A longer value further down may overflow its column.
+
+    Note : The cells share a few named styles. Text columns have the text
+    number format and the rows are banded by a conditional format.
+
+    Note : A sheet holds at most MAX_ROWS rows, the header included. The
+    rows beyond are continued on further sheets, named Sheet (2), Sheet (3)
+    and so on, or with split set to FILES in further files, named e.g.
+    report-2.xlsx. Each part repeats the header and the styles. With split
+    set to None a table that does not fit is rejected before a row is
+    written. The number of rows of a result stream is not known up front;
+    it can be given as n_rows, e.g. from AQueryEngine.count, to check the
+    size before the query is streamed and to route a report that does not
+    fit to a columnar format instead.
 
     Attributes:
-        table : A reference to the ATable object
-        file  : Either name of the file to be writen out or a file object
+        table    : A reference to the ATable object
+        file     : Either name of the file to be writen out or a file object
+        split    : SHEETS, FILES or None
+        n_rows   : The number of rows that will be written, if known
+        n_parts  : The number of sheets or files the rows take, if known
+        files    : The names of the files written by execute
     """
-    def __init__(self, table, file):
-        self._file = file
+    # Minimum width of a column in characters
+    MIN_WIDTH = 10
+    # Font width fudge factor
+    WIDTH_FACTOR = 1.25
+    # Names of the styles registered with the workbook
+    HEADER = 'Table Header'
+    CELL = 'Table Cell'
+    TEXT = 'Table Text'
+    # A value of each type that sets a number format of its own
+    DATE_SAMPLES = (datetime.datetime(2000, 1, 1), datetime.date(2000, 1, 1),
+        datetime.time(), datetime.timedelta())
+    # Rows of an Excel sheet, the header included
+    MAX_ROWS = 1048576
+    TITLE = 'Sheet'
+    # Where the rows beyond a full sheet go
+    SHEETS = 'sheets'
+    FILES = 'files'
+
+    def __init__(self, table, file, split=SHEETS, n_rows=None,
+            max_rows=MAX_ROWS):
+        super().__init__(table, file)
+        if split not in (self.SHEETS, self.FILES, None):
+            raise AQueryError('Undefined split ' + str(split))
+        if split == self.FILES and not isinstance(file, (str, os.PathLike)):
+            raise AQueryError('Only a file name can be split into files')
+        if max_rows < 2:
+            raise AQueryError('A sheet needs room for a header and a row')
         self._table = table
-        # Additional validation - Maybe superfluous
-        self._table._validate()
+        self._split = split
+        self._n_rows = n_rows
+        self._max_rows = max_rows
+        self._files = []
         # Cache Workbook
-        _wb = None
+        self._wb = None
+
+    @property
+    def split(self):
+        return self._split
+
+    @split.setter
+    def split(self, split):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def n_rows(self):
+        if isinstance(self._table, ATable):
+            return len(self._table._data or [])
+        return self._n_rows
+
+    @n_rows.setter
+    def n_rows(self, n_rows):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def n_parts(self):
+        n_rows = self.n_rows
+        if n_rows is None:
+            return None
+        return self.parts(n_rows, self._max_rows)
+
+    @n_parts.setter
+    def n_parts(self, n_parts):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def files(self):
+        return self._files
+
+    @files.setter
+    def files(self, files):
+        raise RuntimeError('This is a read-only field')
+
+    @classmethod
+    def parts(cls, n_rows, max_rows=MAX_ROWS):
+        """ Returns the number of sheets that n_rows rows take """
+        return max(-(-n_rows // (max_rows - 1)), 1)
+
+    @classmethod
+    def fits(cls, n_rows, max_rows=MAX_ROWS):
+        """ Returns True when n_rows rows fit in a single sheet """
+        return n_rows < max_rows
 
     def execute(self):
         """ Engine method that transforms the table to xlsx format 
         Raises:
             PermissionError
+            AQueryError when the rows do not fit and split is None
         """
+        n_parts = self.n_parts
+        if self._split is None and n_parts is not None and n_parts > 1:
+            raise AQueryError('{} rows do not fit in a sheet'.format(
+                self.n_rows))
+        return super().execute()
+
+    def _write(self, columns, types, batches):
+        translate = self._translators(types)
+        sample, batches = self._sample(batches)
+        widths = self._widths(columns, sample)
+        rows = itertools.chain.from_iterable(batches)
+        self._files = []
+        n_rows = 0
+        part = 0
         # Open a work book with optimized_write
-        self._wb = Workbook()
-        ws = self._wb.active
-        #hfill = PatternFill(fill_type='solid',
-        #        fgColor = Color('00777777'),
-        #        bgColor = Color('00777777'))
-        hfont = Font(color=colors.BLACK, bold=True)
+        self._wb = None
+        while True:
+            if self._wb is None:
+                self._wb = Workbook(write_only=True)
+                ws = self._wb.create_sheet(self.TITLE)
+                styles = self._register(ws)
+            else:
+                ws = self._wb.create_sheet('{} ({})'.format(self.TITLE,
+                    part + 1))
+            n_rows = n_rows + self._fill(ws, columns, translate, widths,
+                styles, itertools.islice(rows, self._max_rows - 1))
+            part = part + 1
+            # Rows beyond the sheet go to the next part
+            row = next(rows, None)
+            if row is None:
+                break
+            if self._split is None:
+                self._discard()
+                raise AQueryError('The rows do not fit in a sheet')
+            rows = itertools.chain([row], rows)
+            if self._split == self.FILES:
+                self._save(self._part_file(part - 1))
+                self._wb = None
+        self._save(self._part_file(part - 1) if self._split == self.FILES
+            else self._file)
+        return n_rows
 
-        # The Column Heading Row
-        for idx,value in enumerate(self._table.columns):
-            cell = ws[get_column_letter(idx+1) + '1']
-            cell.font = hfont
-            #cell.fill = hfill
-            #cell.border = hborder
-            cell.value = value
-        # Pushing data
-        for row in self._table._data:
-            ws.append(row)
-       
-        self._widen_cols()
-        self._colorize_rows()
-        self._data_type_cols()
-        
+    def _save(self, file):
         try:
-            self._wb.save(self._file)
+            self._wb.save(file)
         except PermissionError:
             logging.info('''Failed to create an Excel file. Probably opened.''')
             raise
-    
-    
+        if isinstance(file, (str, os.PathLike)):
+            self._files.append(file)
+
+    def _discard(self):
+        ''' Closes the sheets of a workbook that is not saved '''
+        for ws in self._wb.worksheets:
+            ws.close()
+        self._wb = None
+
+    def _part_file(self, part):
+        ''' Returns the name of the file of a part, the file itself for the
+        first part
+        '''
+        if part == 0:
+            return self._file
+        root, ext = os.path.splitext(os.fspath(self._file))
+        return '{}-{}{}'.format(root, part + 1, ext)
+
+    def _sample(self, batches):
+        ''' Returns the first batch, which the column widths are computed
+        from, and the batches, which still yield it
+        '''
+        sample = next(batches, [])
+        return sample, itertools.chain([sample], batches)
+
+    def _write_sheet(self, ws, columns, types, batches):
+        ''' Writes the rows to a write only sheet and returns their number
+        '''
+        sample, batches = self._sample(batches)
+        return self._fill(ws, columns, self._translators(types),
+            self._widths(columns, sample), self._register(ws),
+            itertools.chain.from_iterable(batches))
+
+    def _fill(self, ws, columns, translate, widths, styles, rows):
+        ''' Writes the header and the rows to a write only sheet and
+        returns the number of rows
+        '''
+        self._widen_cols(ws, widths)
+        ws.append([self._cell(ws, value, styles[self.HEADER])
+            for value in columns])
+        column_styles = [styles[self.TEXT] if convert == self._as_string
+            else styles[self.CELL] for convert in translate]
+        # Pushing data
+        n_rows = 0
+        for row in rows:
+            ws.append([self._cell(ws, convert(value), style)
+                for convert, value, style in zip(translate, row,
+                column_styles)])
+            n_rows = n_rows + 1
+        self._band_rows(ws, len(columns), n_rows)
+        return n_rows
+
+    def _register(self, ws):
+        ''' Registers the named styles with the workbook once and returns
+        the style array of each, by name, for the cells to share.
+
+        The cell formats of the styles, including those of the dates they
+        may hold, are registered up front in a fixed order. Every workbook
+        written by AWriteTable thus has the same style sheet, whatever its
+        rows, so that sheets of separate workbooks can be combined.
+        '''
+        styles = {}
+        for style in self._styles():
+            ws.parent.add_named_style(style)
+            cell = WriteOnlyCell(ws)
+            cell.style = style.name
+            styles[style.name] = cell._style
+            # Reading the style id registers the cell format
+            cell.style_id
+            if style.name != self.HEADER:
+                for value in self.DATE_SAMPLES:
+                    self._cell(ws, value, cell._style).style_id
+        return styles
+
+    def _cell(self, ws, value, style):
+        ''' Creates a write only cell that shares a registered style. Dates
+        set the number format of the cell when they are bound, so a cell
+        holding one gets a style of its own.
+        '''
+        cell = WriteOnlyCell(ws)
+        if isinstance(value, _DATE_TYPES):
+            cell._style = copy(style)
+        else:
+            cell._style = style
+        cell.value = value
+        return cell
+
+    def _styles(self):
+        ''' Returns the named styles of the title row, of the data cells and
+        of the text cells of the sheet.
+        
+        Colors are specified in XXRRGGBB format. The Hex colors can be 
+        obtained from - http://www.color-hex.com/color-names.html 
+        '''
+        # Define style constants
+        deep_blue = Color('0087CEEB')
+        dark_sky_blue = Color('008CBED6')
+        side = Side(border_style='thin', color=dark_sky_blue)
+        hborder = Border(left=side, right=side, top=side, bottom=side)
+        # Title Row should look different
+        title_row_fill = PatternFill(fill_type='solid', 
+                fgColor = deep_blue,
+                bgColor = deep_blue)
+        hfont = Font(color=colors.BLACK, bold=True)
+        return [NamedStyle(name=self.HEADER, font=hfont, fill=title_row_fill,
+                border=hborder),
+            NamedStyle(name=self.CELL, border=hborder),
+            # Text keeps numeric strings, e.g. UPCs, as they are
+            NamedStyle(name=self.TEXT, border=hborder, number_format='@')]
+
+    def _band_rows(self, ws, n_cols, n_rows):
+        ''' Colors every other data row with one conditional format over
+        the sheet instead of a fill per cell. The format is added to an
+        empty sheet too, so that every style sheet holds it.
+        '''
+        sky_blue = Color('00CDE2ED')
+        odd_row_fill = PatternFill(fill_type='solid', 
+                fgColor = sky_blue,
+                bgColor = sky_blue)
+        ws.conditional_formatting.add('A2:{}{}'.format(
+            get_column_letter(n_cols), max(n_rows, 1) + 1),
+            FormulaRule(formula=['MOD(ROW(),2)=1'], fill=odd_row_fill))
+
+    def _translators(self, types):
+        ''' Returns a function per column that translates a value to the
+        value of its cell according to the type of the column
+        '''
+        return [self._translator(type_string) for type_string in types]
 
-    def _translate_type(self, cell_obj, type_string):
+    def _translator(self, type_string):
         ''' Translates the type code to a valid cell type '''
         if type_string == ATable.STRING:
-            if cell_obj.value: 
-                if cell_obj.value.isnumeric():
-                    cell_obj.value = '=("' + cell_obj.value +'")'
-            return
+            return self._as_string
         if type_string == ATable.NUMBER:
-            #cell_obj.set_explicit_value(cell_obj.value, 'n')
-            return
+            return self._as_is
         if type_string == ATable.BINARY:
             raise RuntimeError('Unhandled format Binary')
-            return
         if type_string == ATable.DATETIME:
-            #cell_obj._bind_value(cell_obj.value)
-            return
+            return self._as_is
         if type_string == ATable.ROWID:
             raise RuntimeError('Unhandled format ROWID')
-            return
+        if type_string is None:
+            return self._as_is
         raise RuntimeError('Unknown format : ' + type_string)
+
+    def _as_is(self, value):
+        return value
+
+    def _as_string(self, value):
+        ''' Strings are written as they are. Their cells have the text
+        number format, so that leading zeros are not lost
+        '''
+        return value
     
     def _as_text(self, value):
         ''' Converts to string. Treats None as empty string '''
@@ -93,86 +355,27 @@ class AWriteTable(object):
         else:
             return str(value)
             
-    def _widen_cols(self):
-        ''' Sets the columns to a width size that is easily 
-        readable 
-        
+    def _widths(self, columns, rows):
+        ''' Returns a width per column that is easily readable
+
         Entries in different fields of a column will require
         different column budget so that it can be easily readable.
-        This is based on an an estimate only.
-        
-        This must be run before _translate_type is called.
-        '''
-        ws = self._wb.active
-        # Initialize the column width to be 10
-        min_width = 10
-        # Font width fudge factor
-        ff = 1.25
-        # Iterate over columns
-        for col_cells in ws.columns:
-            length = max(
-                max(
-                len(self._as_text(cell.value))*ff for cell in col_cells),
-                min_width)
-            ws.column_dimensions[col_cells[0].column].width = length
-        
-    def _colorize_rows(self):
-        ''' Colors the rows of the sheet.
-        
-        Colors are specified in XXRRGGBB format. The Hex colors can be 
-        obtained from - http://www.color-hex.com/color-names.html 
+        This is based on an an estimate only. The widths are computed
+        from the values of the rows, not from the translated cell values.
         '''
-        ws = self._wb.active
-        # Define style constants
-        sky_blue = Color('00CDE2ED')
-        deep_blue = Color('0087CEEB')
-        white = Color('FFFFFFFF')
-        dark_sky_blue = Color('008CBED6')
-        odd_row_fill = PatternFill(fill_type='solid', 
-                fgColor = sky_blue,
-                bgColor = sky_blue)
-        even_row_fill =  PatternFill(fill_type='solid', 
-                fgColor = white,
-                bgColor = white)
-        side = Side(border_style='thin', color=dark_sky_blue)
-        hborder = Border(left=side, right=side, top=side, bottom=side)
-        # Title Row should look different
-        title_row_fill = PatternFill(fill_type='solid', 
-                fgColor = deep_blue,
-                bgColor = deep_blue)
-        for row in ws.iter_rows(min_row=1,max_row=1):
-            for cell in row:
-                cell.fill = title_row_fill
-                cell.border = hborder
-                
-               
-        cell_fills = [even_row_fill, odd_row_fill]
-        ridx = 0
-        for row in ws.iter_rows(min_row=2, max_col=len(self._table.columns),
-                max_row = len(self._table.data)+1):
-            for cell in row:
-                cell.fill = cell_fills[ridx%2]
-                cell.border = hborder
-            ridx = ridx+1
-    
-    def _data_type_cols(self):
-        ''' Set the data type on the columns if it is known in the table
+        widths = [len(self._as_text(value)) for value in columns]
+        for row in rows:
+            widths = [max(width, len(value) if type(value) is str else
+                len(self._as_text(value))) for width, value in zip(widths, row)]
+        return widths
+
+    def _widen_cols(self, ws, widths):
+        ''' Sets the columns to a width size that is easily 
+        readable 
         
-        Each column has a data type associated with the entries. These 
-        data types are useful to enable the spread sheet tools to interpret
-        the data correctly.
+        The widths of a write only sheet must be set before its first row
+        is written.
         '''
-        ws = self._wb.active
-        if not self._table.types:
-            return
-        for row in ws.iter_rows(min_row=1, max_col=len(self._table.columns),
-            max_row = len(self._table.data)+1):
-            col_idx = 0
-            for cell in row:
-                self._translate_type(cell, self._table.types[col_idx])
-                col_idx = col_idx+1
-
-
-
-
-
+        for idx, width in enumerate(widths):
+            ws.column_dimensions[get_column_letter(idx+1)].width = max(
+                width * self.WIDTH_FACTOR, self.MIN_WIDTH)
@@ -0,0 +1,205 @@
+"""
+module : write_workbook
+
+Exports several tables as the sheets of one xlsx workbook
+"""
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+
+from openpyxl import Workbook
+
+from .query import AQueryError
+from .table import ATable
+from .table_view import ATableView
+from .write_table import AWriteTable
+
+# Characters that Excel does not allow in the name of a sheet
+_INVALID_TITLE = re.compile(r'[\[\]:*?/\\]')
+# Part of the first sheet of a workbook written by AWriteTable
+_SHEET = 'xl/worksheets/sheet1.xml'
+_STYLES = 'xl/styles.xml'
+
+
+def _render_sheet(table, path, max_rows):
+    ''' Writes a table to a workbook of its own and returns the number of
+    rows. This runs in a worker process.
+    '''
+    return AWriteTable(table, path, split=None, max_rows=max_rows).execute()
+
+
+def _payload(table):
+    ''' Returns the table sent to a worker. A view would be pickled with
+    all the rows of its base table, so its own rows are copied instead.
+    '''
+    if not isinstance(table, ATableView):
+        return table
+    part = ATable()
+    part._columns = list(table._columns)
+    part._types = table._types and list(table._types)
+    part._data = list(table._data)
+    part._trusted = table._trusted
+    return part
+
+
+class AWriteWorkbook(object):
+    """ Writes several tables to one workbook, a sheet per table, after a
+    Summary sheet that lists the sheets with their number of rows and
+    columns.
+
+    Every sheet is written to a workbook of its own by AWriteTable in a
+    worker process. The sheets are then copied into a single workbook.
+    All the workbooks written by AWriteTable share the same style sheet,
+    so a sheet can be copied as it is.
+
+    Note : A table with more rows than fit in a sheet is continued on
+    further sheets, e.g. Stock (2), each a view of a range of its rows.
+
+    Note : The tables are pickled to the worker processes. A part of a
+    table is copied into a table of its own before it is sent, so that a
+    worker receives the rows of its sheet only, and no more parts are
+    copied than there are workers to write them. With processes set to 1
+    the sheets are written in this process.
+
+    Attributes:
+        tables    : A list of (name, table) pairs, or a dict, in the order of
+                    the sheets
+        file      : Either name of the file to be writen out or a file object
+        processes : The maximum number of worker processes, by default one
+                    per CPU
+        max_rows  : The number of rows of a sheet, the header included
+    """
+    SUMMARY = 'Summary'
+
+    def __init__(self, tables, file, processes=None,
+            max_rows=AWriteTable.MAX_ROWS):
+        if isinstance(tables, dict):
+            tables = list(tables.items())
+        self._max_rows = max_rows
+        self._tables = [part for name, table in tables
+            for part in self._split(self._check_title(name), table)]
+        names = [name.lower() for name, _ in self._tables]
+        if len(set(names)) != len(names) or self.SUMMARY.lower() in names:
+            raise AQueryError('The names of the sheets must be unique')
+        self._file = file
+        self._processes = processes
+
+    @property
+    def tables(self):
+        return self._tables
+
+    @tables.setter
+    def tables(self, tables):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def file(self):
+        return self._file
+
+    @file.setter
+    def file(self, file):
+        raise RuntimeError('This is a read-only field')
+
+    def _check_title(self, name):
+        if not name or len(name) > 31 or _INVALID_TITLE.search(name):
+            raise AQueryError('Invalid sheet name ' + repr(name))
+        return name
+
+    def _split(self, name, table):
+        ''' Returns the sheets of a table as (name, table) pairs '''
+        n_rows = len(table._data or [])
+        n_parts = AWriteTable.parts(n_rows, self._max_rows)
+        if n_parts == 1:
+            return [(name, table)]
+        size = self._max_rows - 1
+        parts = [(name, table.rows[:size])]
+        for part in range(1, n_parts):
+            suffix = ' ({})'.format(part + 1)
+            parts.append((name[:31 - len(suffix)] + suffix,
+                table.rows[part * size:(part + 1) * size]))
+        return parts
+
+    def summary(self):
+        ''' Returns the table of the Summary sheet '''
+        table = ATable()
+        table._columns = ['Sheet', 'Rows', 'Columns']
+        table._types = [ATable.STRING, ATable.NUMBER, ATable.NUMBER]
+        table._data = [[name, len(t._data or []), len(t._columns)]
+            for name, t in self._tables]
+        return table
+
+    def execute(self):
+        """ Writes the workbook and returns the total number of rows """
+        tmp = tempfile.mkdtemp()
+        try:
+            paths = [os.path.join(tmp, '{}.xlsx'.format(idx))
+                for idx in range(len(self._tables))]
+            n_rows = self._render(paths)
+            skeleton = os.path.join(tmp, 'workbook.xlsx')
+            self._write_skeleton(skeleton)
+            self._assemble(skeleton, paths)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return n_rows
+
+    def _render(self, paths):
+        ''' Writes each table to a workbook of its own '''
+        tables = [table for _, table in self._tables]
+        processes = self._processes or os.cpu_count() or 1
+        processes = min(processes, len(tables))
+        if processes <= 1:
+            return sum(_render_sheet(table, path, self._max_rows)
+                for table, path in zip(tables, paths))
+        n_rows = 0
+        pending = set()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for table, path in zip(tables, paths):
+                if len(pending) >= processes:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    n_rows = n_rows + sum(future.result() for future in done)
+                pending.add(executor.submit(_render_sheet, _payload(table),
+                    path, self._max_rows))
+            return n_rows + sum(future.result() for future in pending)
+
+    def _write_skeleton(self, path):
+        ''' Writes the workbook with the Summary sheet and an empty sheet
+        for each table
+        '''
+        wb = Workbook(write_only=True)
+        summary = self.summary()
+        ws = wb.create_sheet(self.SUMMARY)
+        # The summary of no tables holds the header only
+        AWriteTable(summary, None)._write_sheet(ws, summary.columns,
+            summary.types, iter([summary._data]))
+        for name, _ in self._tables:
+            wb.create_sheet(name)
+        wb.save(path)
+
+    def _assemble(self, skeleton, paths):
+        ''' Copies the workbook with the sheets of the tables in place of
+        the empty ones
+        '''
+        sheets = {'xl/worksheets/sheet{}.xml'.format(idx + 2) : path
+            for idx, path in enumerate(paths)}
+        with zipfile.ZipFile(skeleton) as source, \
+                zipfile.ZipFile(self._file, 'w', zipfile.ZIP_DEFLATED) as out:
+            styles = source.read(_STYLES)
+            for info in source.infolist():
+                path = sheets.get(info.filename)
+                if path is None:
+                    with source.open(info) as part, \
+                            out.open(info.filename, 'w') as dest:
+                        shutil.copyfileobj(part, dest)
+                    continue
+                with zipfile.ZipFile(path) as sheet:
+                    if sheet.read(_STYLES) != styles:
+                        raise AQueryError('The style sheet of a sheet differs'
+                            ' from the style sheet of the workbook')
+                    with sheet.open(_SHEET) as part, \
+                            out.open(info.filename, 'w') as dest:
+                        shutil.copyfileobj(part, dest)
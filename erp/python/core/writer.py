@@ -0,0 +1,249 @@
+"""
+module : writer
+
+Exports the rows of a table or of a result stream to a file
+"""
+from abc import ABCMeta,abstractmethod
+import csv
+import datetime
+import decimal
+import json
+import os
+
+from .query import AQueryError
+from .table import ATable
+from .snapshot import _TYPES
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Number of rows of a table written at a time
+DEFAULT_BATCH_SIZE = 10000
+
+
+class AWriter(object, metaclass=ABCMeta):
+    """ Writes the rows of a table, or of a result stream, to a file.
+
+    The rows are written batch by batch. A result stream returned by
+    AQueryEngine.execute_iter is written while its rows are fetched, so the
+    complete result is never held in memory.
+
+    Attributes:
+        source : The ATable or the AResultStream that is written
+        file   : Either name of the file to be writen out or a file object
+    """
+    def __init__(self, source, file):
+        self._source = source
+        self._file = file
+        if isinstance(source, ATable):
+            # Only the rows that have not been validated yet are checked
+            source._validate()
+
+    @property
+    def source(self):
+        return self._source
+
+    @source.setter
+    def source(self, source):
+        raise RuntimeError('This is a read-only field')
+
+    @property
+    def file(self):
+        return self._file
+
+    @file.setter
+    def file(self, file):
+        raise RuntimeError('This is a read-only field')
+
+    def _batches(self):
+        ''' Yields the rows of the source in lists '''
+        if not isinstance(self._source, ATable):
+            yield from self._source.batches()
+            return
+        data = self._source._data or []
+        for start in range(0, len(data), DEFAULT_BATCH_SIZE):
+            yield data[start:start + DEFAULT_BATCH_SIZE]
+
+    def _open(self, mode, **kwargs):
+        ''' Opens the file, unless it is a file object already '''
+        if isinstance(self._file, (str, os.PathLike)):
+            return open(self._file, mode, **kwargs)
+        return _Borrowed(self._file)
+
+    def execute(self):
+        """ Writes the rows of the source and returns their number """
+        columns = list(self._source.columns)
+        types = self._source.types or [None] * len(columns)
+        return self._write(columns, types, self._batches())
+
+    @abstractmethod
+    def _write(self, columns, types, batches):
+        ''' Writes batches of rows with the given columns and types and
+        returns the number of rows written
+        '''
+        pass
+
+
+class _Borrowed(object):
+    ''' A file object given by the caller, which is not closed '''
+    def __init__(self, f):
+        self._f = f
+
+    def __enter__(self):
+        return self._f
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class ACSVWriter(AWriter):
+    """ Writes rows as comma separated values with a header line.
+
+    NULL is written as an empty field.
+
+    Attributes:
+        dialect : The csv dialect, e.g. 'excel' or 'excel-tab'
+    """
+    def __init__(self, source, file, dialect='excel'):
+        super().__init__(source, file)
+        self._dialect = dialect
+
+    @property
+    def dialect(self):
+        return self._dialect
+
+    @dialect.setter
+    def dialect(self, dialect):
+        raise RuntimeError('This is a read-only field')
+
+    def _write(self, columns, types, batches):
+        n_rows = 0
+        with self._open('w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, dialect=self._dialect)
+            writer.writerow(columns)
+            for batch in batches:
+                writer.writerows(batch)
+                n_rows = n_rows + len(batch)
+        return n_rows
+
+
+def _json_value(value):
+    ''' Converts the values json does not know about '''
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        # Integral values stay integers
+        return int(value) if value == value.to_integral_value() else \
+            float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    raise TypeError('Cannot write {} as JSON'.format(type(value).__name__))
+
+
+class AJSONLinesWriter(AWriter):
+    """ Writes rows as JSON objects keyed by the column names, one per
+    line. Dates and times are written in ISO format.
+    """
+    def _write(self, columns, types, batches):
+        n_rows = 0
+        encoder = json.JSONEncoder(default=_json_value)
+        with self._open('w', encoding='utf-8') as f:
+            for batch in batches:
+                f.writelines(encoder.encode(dict(zip(columns, row))) + '\n'
+                    for row in batch)
+                n_rows = n_rows + len(batch)
+        return n_rows
+
+
+# The arrow type of a column whose first batch holds NULL only
+_ARROW_TYPES = {
+    ATable.STRING : 'string',
+    ATable.NUMBER : 'float64',
+    ATable.DATETIME : 'timestamp[us]',
+    ATable.BINARY : 'binary'}
+# Decimal columns are written with the widest precision and at least this
+# scale, since the values of later batches may need more digits than those
+# of the first
+_DECIMAL_PRECISION = 38
+_DECIMAL_SCALE = 10
+
+
+class AParquetWriter(AWriter):
+    """ Writes rows to a Parquet file, a row group per batch.
+
+    The schema is taken from the first batch. A column that holds NULL only
+    in the first batch is given a type from the type of the column. A
+    decimal column is widened to 38 digits with a scale of at least 10, so
+    that the decimals of later batches fit. The file can be opened with
+    ATable.open_snapshot.
+
+    Note : pyarrow is required.
+
+    Attributes:
+        compression : The compression codec, e.g. 'zstd' or 'snappy'
+    """
+    def __init__(self, source, file, compression='zstd'):
+        if pyarrow is None:
+            raise AQueryError('pyarrow is required for Parquet files')
+        super().__init__(source, file)
+        self._compression = compression
+
+    @property
+    def compression(self):
+        return self._compression
+
+    @compression.setter
+    def compression(self, compression):
+        raise RuntimeError('This is a read-only field')
+
+    def _schema(self, columns, types, arrays):
+        fields = []
+        for name, type_string, array in zip(columns, types, arrays):
+            arrow_type = array.type
+            if pyarrow.types.is_null(arrow_type) and \
+                    type_string in _ARROW_TYPES:
+                arrow_type = pyarrow.type_for_alias(
+                    _ARROW_TYPES[type_string])
+            elif pyarrow.types.is_decimal(arrow_type):
+                arrow_type = pyarrow.decimal128(_DECIMAL_PRECISION,
+                    max(arrow_type.scale, _DECIMAL_SCALE))
+            fields.append(pyarrow.field(name, arrow_type))
+        # The types are kept as in snapshots, see ATable.open_snapshot
+        return pyarrow.schema(fields, metadata={
+            _TYPES: json.dumps(list(types)).encode('utf-8')})
+
+    def _cast(self, array, field):
+        ''' Casts the values of a batch to the type of their column '''
+        try:
+            return array.cast(field.type)
+        except pyarrow.ArrowInvalid as e:
+            raise AQueryError('The values of column {} do not fit {}: {}'
+                .format(field.name, field.type, e))
+
+    def _write(self, columns, types, batches):
+        n_rows = 0
+        writer = None
+        try:
+            for batch in batches:
+                arrays = [pyarrow.array([row[idx] for row in batch])
+                    for idx in range(len(columns))]
+                if writer is None:
+                    schema = self._schema(columns, types, arrays)
+                    writer = pyarrow.parquet.ParquetWriter(self._file,
+                        schema, compression=self._compression)
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [self._cast(array, field) for array, field in
+                        zip(arrays, schema)], schema=schema))
+                n_rows = n_rows + len(batch)
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(self._file,
+                    self._schema(columns, types,
+                        [pyarrow.array([])] * len(columns)),
+                    compression=self._compression)
+        finally:
+            if writer is not None:
+                writer.close()
+        return n_rows
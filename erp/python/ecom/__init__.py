@@ -4,6 +4,10 @@ from .check_upc import ACheckUPCFilter
 from .check_images import ACheckImages
 from .check_stores import AStores
 from .check_stores import ACheckStores
+from .check_stores import AInvalidStores
+from .check_stores import STORE_RULES
 from .all_ecom_stock import AAllEComStock
 from .all_sku import AAllSKU
 from .all_sku import AAllSKUImages
+from .inventory import AInventorySummary
+from .inventory import INVENTORY_SUMMARY
@@ -74,6 +74,8 @@ class AAllSKUImages(AQuery):
             OR (imgh.stor_file LIKE '%.TIFF')
         '''
         self._query_tuple = ()
+        self._partition_key = 'Division'
+        self._partition_values = 'SELECT DISTINCT division FROM zzxscolr'
 
 
     
@@ -4,15 +4,14 @@ module: check_stores
 Checks that store names and addresses are clean
 
 '''
-# Imports from standard library
-import re
-from   copy import copy
-
 #imports from the application library
 from   core import AQuery
 from   core import AQueryError
 from   core import AFilter
 from   core import ATable
+from   core import AIsEmpty
+from   core import ALike
+from   core import ARuleQuery
 
 class AStores(AQuery):
     ''' A query to check if the store information in BlueCherry is clean.
@@ -48,76 +47,56 @@ class AStores(AQuery):
         '''
         self._query_tuple = ()
  
+# Checks of the store information in order of precedence. The first failing
+# check gives the reason a store is reported.
+STORE_RULES = [
+    AIsEmpty(['ADDRESS_LINE1', 'ADDRESS_LINE2', 'ADDRESS_LINE3',
+        'ADDRESS_LINE4'], 'All address lines are empty'),
+    AIsEmpty('ZIPCODE', 'Zip Code is not Specified'),
+    AIsEmpty('COUNTRY', 'Country is not specified'),
+    AIsEmpty('STATE1', 'State is not specified'),
+    AIsEmpty('STORE', 'Store name should ONLY include Alpha-Numerics'),
+    ALike('STORE', '%[^a-zA-Z0-9]%',
+        'Store name should ONLY include Alpha-Numerics'),
+    #AColumnsDiffer('STORE', 'EDI_STORE', 'EDI Store does not match Store'),
+    ]
+
+
+class AInvalidStores(ARuleQuery):
+    ''' A query that returns only the invalid customer stores.
+
+    The store checks are evaluated by the server. The result holds the
+    columns of AStores and the Reason the store is invalid.
+    '''
+    def __init__(self):
+        super().__init__(AStores(), STORE_RULES, order_by=['STORE'])
+
+
 class ACheckStores(AFilter):
-    ''' Filters only invalid customer stores '''
-    _CHECKERS = {#Call backs for updating the artwork object with file info
-        "_check_address", 
-        "_check_zip_code", 
-        "_check_country", 
-        "_check_state", 
-        "_check_store"}
-        
+    ''' Filters only invalid customer stores
+
+    Note : This fetches all active stores and checks them in python. Prefer
+    AInvalidStores, which only fetches the invalid ones.
+    '''
     def __init__(self, query):
         super().__init__(query,True)
-    
+
     def _filter(self):
-        ''' Implements a filter that locates invaid addresses and 
+        ''' Implements a filter that locates invaid addresses and
         uses them for error correction.
-        '''
-        self._table._data = []
-        for entry in self._query._table._data:
-            for checker in ACheckStores._CHECKERS:
-                dispatch = type(self).__dict__[checker].__get__(self, type(self))
-                res,reason = dispatch(entry)
-                if res:
-                    new_entry = copy(entry)
-                    new_entry.append(reason)
-                    self._table._data.append(new_entry)
-                    break
-    
-    def _check_address(self, entry):
-        ''' Checks that atleast one of the address lines is not empty '''
-        address_line1 = entry[7]
-        address_line2 = entry[8]
-        address_line3 = entry[9]
-        address_line4 = entry[10]
-        if ((not address_line1) and 
-            (not address_line2) and
-            (not address_line3) and
-            (not address_line4)):
-            return (True, 'All address lines are empty')
-        return (False, '')
-    
-    def _check_zip_code(self, entry):
-        if not entry[13]:
-            return (True, 'Zip Code is not Specified')
-        return (False, '')
-            
-    def _check_state(self, entry):
-        if not entry[12]:
-            return (True, 'State is not specified')
-        return (False, '')
-    
-    def _check_country(self, entry):
-        if not entry[14]:
-            return (True, 'Country is not specified')
-        return (False, '')
-    
-    def _check_store(self, entry):
-        ''' Checks that the store names are conformant '''
-        #if (not (entry[4] == entry[5])):
-        #    return (True, 'EDI Store does not match Store')
-        STORE = re.compile(r'[a-zA-Z0-9]+')
-        if not re.fullmatch(STORE,entry[4]):
-            return (True, 'Store name should ONLY include Alpha-Numerics')
-        return (False, '')
-        
-            
-        
-    
-    
-    
-        
-
-
 
+        The result is a view of the invalid stores with the Reason as an
+        extra column, so the rows of the stores are not copied.
+        '''
+        checks = [(rule.bind(self._query._table._columns), rule.reason)
+            for rule in STORE_RULES]
+        reasons = []
+        def invalid(entry):
+            for check, reason in checks:
+                if check(entry):
+                    reasons.append(reason)
+                    return True
+            return False
+        invalid_stores = self._query._table.where(invalid)
+        self._table = invalid_stores.overlay('Reason', reasons,
+            ATable.STRING)
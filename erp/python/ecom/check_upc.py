@@ -10,54 +10,11 @@ label associated with them. An EDI control file is created to drop the label
 from a sales order to extract UPC.
 '''
 from core import AQuery
+from .inventory import INVENTORY_SUMMARY
 from core import AFilter
+from core import ATable
 
 
-class AUPCSet(object):
-    ''' Creates UPC sets to verify that a UPC has been assigned for a given
-    SKU.
-    
-    For eCommerce site to function, a UPC needs to be assigned to each SKU.
-    This class provides a set interface to check if SKU has a UPC assigned
-    or not.
-    
-    Note : In BlueCherry Implementation, for every SKU, first a non labeled
-    SKU MUST be created to which a UPC needs to be assigned. Strictly
-    speaking, labeled SKUs should not have UPC assigned. An EDI Control 
-    header is created in which on detecting a labeled SKU the label is dropped
-    and then the UPC is matched.
-    
-    Attributes:
-        _g_set : Set of SKUs that have no Label and have a UPC assigned
-        _l_upc : Set of SKUs that have a label and UPC assigned.
-    '''
-    def __init__(self, query):
-        self._g_set = set()
-        self._l_set = set()
-        self._create(query)
-    
-    def _create(self, query):
-        ''' Populates the _g_set and _l_set. '''
-        if not query.has_run():
-            raise RuntimeError('Query has not been Run')
-        for entry in query.table:
-            if not entry[query.table.index('UPC')]:
-                continue
-            else:
-                if not entry[query.table.index('Lbl_code')]:
-                    self._g_set.add(tuple(entry[:query.table.index('UPC')]))
-                else:
-                    self._l_set.add(tuple(entry[:query.table.index('UPC')]))
-    
-    def __contains__(self, item):
-        ''' Implements the contains in for this set '''
-        item = tuple(item)
-        if item in self._g_set:
-            return True
-        if item in self._l_set:
-            return True
-        return False
-        
 class ACheckUPC(AQuery):
     ''' A query for inventory information.
 
@@ -105,9 +62,9 @@ class ACheckUPC(AQuery):
         OTS             = SA + RT + R1 + R2 - IN - CM - PK - RS - OP - DM
         OTS_SHIP_TO_WIP = SA + RT + R1 + R2 - IN - PK - OP - CM - RS - DM + ST + RV - RI - RP - RO 
 
-    The query below performs the aggregation over the types of transaction described above.
-    ZZXBUCKT is used to creating the sum by using cross product to split each of the quantities
-    associated with a different type of tranaction using cross join.
+    The aggregation over the types of transaction described above is shared
+    with other stock queries through the #inventory_summary temporary table.
+    See AInventorySummary.
 
     '''
     def __init__(self, ots = 50):
@@ -129,70 +86,7 @@ class ACheckUPC(AQuery):
             -- (ss.qfuin) AS Invoice, 
             -- (ss.size_bk) AS Size_Bk, 
             (U.UPC) AS UPC
-            from (
-                select d.division, 
-                    d.style, 
-                    d.color_code, 
-                    d.lbl_code, 
-                    d.dimension,
-                    d.location,
-                    d.lot, size_num AS Size_Bk, 
-                    sum(case Rec_Type when 'CC' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUCC,
-                    sum(case Rec_Type when 'CH' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUCH,
-                    sum(case Rec_Type when 'CM' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUCM,
-                    sum(case Rec_Type when 'DM' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUDM,
-                    sum(case Rec_Type when 'IN' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUIN,
-                    sum(case Rec_Type when 'OP' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUOP,
-                    sum(case Rec_Type when 'PK' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUPK,
-                    sum(case Rec_Type when 'R1' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUR1,
-                    sum(case Rec_Type when 'R2' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUR2,
-                    sum(case Rec_Type when 'RI' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFURI,
-                    sum(case Rec_Type when 'RO' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFURO,
-                    sum(case Rec_Type when 'RP' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFURP,
-                    sum(case Rec_Type when 'RS' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFURS,
-                    sum(case Rec_Type when 'RT' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFURT,
-                    sum(case Rec_Type when 'RV' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFURV,
-                    sum(case Rec_Type when 'SA' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUSA,
-                    sum(case Rec_Type when 'ST' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUST,
-                    sum(case Rec_Type when 'WP' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUWP,
-                    sum(case Rec_Type when 'NW' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUNW,
-                    sum(case Rec_Type when 'NS' then  Size01_Qty*sz01+  Size02_Qty*sz02+  Size03_Qty*sz03+  Size04_Qty*sz04+  Size05_Qty*sz05+  Size06_Qty*sz06+  Size07_Qty*sz07+  Size08_Qty*sz08+  Size09_Qty*sz09+  Size10_Qty*sz10+  Size11_Qty*sz11+  Size12_Qty*sz12+  Size13_Qty*sz13+  Size14_Qty*sz14+  Size15_Qty*sz15+  Size16_Qty*sz16+  Size17_Qty*sz17+  Size18_Qty*sz18+  Size19_Qty*sz19+  Size20_Qty*sz20+  Size21_Qty*sz21+  Size22_Qty*sz22+  Size23_Qty*sz23+  Size24_Qty*sz24 else 0 end) as QFUNS
-                FROM zzxssumh d
-                CROSS JOIN ZZXBUCKT b
-                JOIN ZZXSCOLR c 
-                    ON c.style = d.style
-                    AND c.color_code = d.color_code
-                    AND c.lbl_code = d.lbl_code
-                    AND c.dimension = d.dimension
-                    AND c.division = d.division
-                WHERE 
-                    CASE SIZE_NUM  
-                        WHEN 01 THEN Call01 
-                        WHEN 02 THEN Call02 
-                        WHEN 03 THEN Call03 
-                        WHEN 04 THEN Call04 
-                        WHEN 05 THEN Call05 
-                        WHEN 06 THEN Call06 
-                        WHEN 07 THEN Call07 
-                        WHEN 08 THEN Call08 
-                        WHEN 09 THEN Call09 
-                        WHEN 10 THEN Call10 
-                        WHEN 11 THEN Call11 
-                        WHEN 12 THEN Call12 
-                        WHEN 13 THEN Call13 
-                        WHEN 14 THEN Call14 
-                        WHEN 15 THEN Call15 
-                        WHEN 16 THEN Call16 
-                        WHEN 17 THEN Call17 
-                        WHEN 18 THEN Call18 
-                        WHEN 19 THEN Call19 
-                        WHEN 20 THEN Call20 
-                        WHEN 21 THEN Call21 
-                        WHEN 22 THEN Call22 
-                        WHEN 23 THEN Call23 
-                        WHEN 24 THEN Call24 
-                    END = 'Y'
-                GROUP BY d.division, d.style, d.color_code, d.lbl_code, d.dimension, d.location, d.lot, size_num) ss
+            from #inventory_summary ss
             LEFT JOIN zzxscolr c
             ON c.division = ss.division
                 AND c.style = ss.style
@@ -245,21 +139,46 @@ class ACheckUPC(AQuery):
                 ss.lbl_code
         '''
         self._query_tuple = (self._ots,)
+        self._requires = (INVENTORY_SUMMARY,)
+        # These columns repeat a handful of values across all the SKUs
+        self._intern_columns = ('Division', 'Color_Code', 'Dimension',
+            'Lbl_code', 'Location')
 
 class ACheckUPCFilter(AFilter):
     ''' Implements a UPC Filter
     
     Sometimes an SKU can have an unassigned UPC which it borrows from some other
     SKU. In those cases we should exclude those SKUs from Unassigned UPC list.
+
+    Note : In BlueCherry Implementation, for every SKU, first a non labeled
+    SKU MUST be created to which a UPC needs to be assigned. Strictly
+    speaking, labeled SKUs should not have UPC assigned. An EDI Control 
+    header is created in which on detecting a labeled SKU the label is dropped
+    and then the UPC is matched.
+
+    Note : The rows of the filtered query are anti-joined with the non
+    labeled SKUs that have a UPC on the SKU columns other than the label,
+    so a labeled SKU that borrows the UPC of its non labeled SKU is left
+    out. The Reason column is left empty.
     '''
+    GENERIC_SKU = ['Style_Number', 'Division', 'Color_Code', 'Dimension']
+
     def __init__(self, filter_query, upc_set_query):
         super().__init__(filter_query, True)
-        self.upc_set = AUPCSet(upc_set_query)
+        if not upc_set_query.has_run():
+            raise RuntimeError('Query has not been Run')
+        self._upc_set_query = upc_set_query
     
     def _filter(self):
-        self._table._data = []
-        for entry in self._query._table:
-            if entry in self.upc_set:
-                continue
-            new_entry = entry
-            self._table._data.append(new_entry)
\ No newline at end of file
+        skus = self._upc_set_query._table
+        upc = skus.index('UPC')
+        label = skus.index('Lbl_code')
+        generic = ATable()
+        generic._columns = skus._columns
+        generic._types = skus._types
+        generic._data = [entry for entry in skus._data or []
+            if entry[upc] and not entry[label]]
+        unassigned = self._query._table.join(generic, self.GENERIC_SKU,
+            how='anti')
+        self._table._data = [entry + [None]
+            for entry in unassigned._data]
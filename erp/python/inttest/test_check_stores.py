@@ -9,12 +9,12 @@ from datetime import date
 from os       import path
 
 # Application Libraries
-from ecom        import AStores
-from ecom        import ACheckStores
+from ecom        import AInvalidStores
 from core        import AQuery
 from core        import ATable
 from core        import AWriteTable
 from core        import AQueryEngine
+from core        import ARuleFilter
 from credentials import ACredentials
 from mailer      import AMailer
 
@@ -36,11 +36,11 @@ class TestCheckStores(unittest.TestCase):
             port = 1433)
         # Create a predefined Query Object to check the status of the UPC
         # data
-        query = AStores()
-        # Run Query to get the results
+        query = AInvalidStores()
+        # Run Query to get the invalid stores
         qengine.execute(query)
-        # Run filter
-        results = ACheckStores(query)
+        # Run the checks that could not be done by the server
+        results = ARuleFilter(query)
         results.filter()
         # Generate the table name
         table_name = path.join(self.get_test_dir(),
@@ -6,7 +6,7 @@ This module defines miscellaneous classes of queries generally useful
 in inventory management
 
 """
-from query import AQuery
+from core import AQuery
 
 class AAllSKU(AQuery):
     """ Defines a query to return All SKUs 
@@ -140,6 +140,8 @@ class AStockSales(AQuery):
             and (zzoordrd.LOCATION !='FOB')
             and (zzoordrd.LOCATION != '')'''
         self._query_tuple = ()
+        self._partition_key = 'Division'
+        self._partition_values = 'SELECT DISTINCT division FROM zzoordrd'
 
 class AStockCustomers(AQuery):
     """ Creates a query that returns all the customers of stock
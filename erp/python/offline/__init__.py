@@ -0,0 +1,2 @@
+from .bluecherry import ABlueCherrySample
+from .bluecherry import SCHEMA
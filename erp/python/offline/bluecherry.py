@@ -0,0 +1,300 @@
+'''
+module : bluecherry
+
+A synthetic Blue Cherry data base. It reproduces the subset of the Blue
+Cherry schema that the ERP queries read and fills it with generated data, so
+that the pipeline can be run and measured without the ERP server.
+'''
+import random
+
+from core import ASQLiteBackend
+
+# Number of size buckets in Blue Cherry
+N_SIZES = 24
+
+def _size_columns(fmt, sql_type):
+    return ',\n    '.join(
+        fmt.format(idx) + ' ' + sql_type for idx in range(1, N_SIZES + 1))
+
+SCHEMA = '''
+CREATE TABLE zzxstylr (
+    pkey INTEGER PRIMARY KEY,
+    division CHAR(3),
+    style CHAR(12),
+    active_ok CHAR(1));
+CREATE TABLE zzxscolr (
+    pkey INTEGER PRIMARY KEY,
+    fkey INTEGER,
+    division CHAR(3),
+    style CHAR(12),
+    color_code CHAR(6),
+    lbl_code CHAR(6),
+    dimension CHAR(4),
+    group_code1 CHAR(8),
+    {calls});
+CREATE TABLE zzxssumh (
+    division CHAR(3),
+    style CHAR(12),
+    color_code CHAR(6),
+    lbl_code CHAR(6),
+    dimension CHAR(4),
+    location CHAR(4),
+    lot CHAR(6),
+    rec_type CHAR(2),
+    {quantities});
+CREATE TABLE ZZXBUCKT (
+    size_num INTEGER,
+    {buckets});
+CREATE TABLE ZZEUPCNR (
+    division CHAR(3),
+    style CHAR(12),
+    color_code CHAR(6),
+    lbl_code CHAR(6),
+    dimension CHAR(4),
+    upc CHAR(12));
+CREATE TABLE zvstimgp (
+    division CHAR(3),
+    style CHAR(12),
+    color_code CHAR(6),
+    lbl_code CHAR(6),
+    dimension CHAR(4),
+    contextid CHAR(8),
+    prime_image CHAR(1),
+    stor_file VARCHAR(128));
+CREATE TABLE zzxstorr (
+    pkey INTEGER PRIMARY KEY,
+    customer CHAR(8),
+    active_ok CHAR(1),
+    store_name VARCHAR(40),
+    store CHAR(10),
+    edi_store CHAR(10),
+    old_store CHAR(10),
+    address1 VARCHAR(40),
+    address2 VARCHAR(40),
+    address3 VARCHAR(40),
+    address4 VARCHAR(40),
+    city VARCHAR(20),
+    state CHAR(2),
+    zipcode CHAR(10),
+    country CHAR(3));
+CREATE TABLE zzoordrh (
+    pkey INTEGER PRIMARY KEY,
+    ord_num INTEGER,
+    ord_status CHAR(2),
+    customer CHAR(8),
+    department CHAR(8));
+CREATE TABLE zzoordrd (
+    fkey INTEGER,
+    ord_num INTEGER,
+    division CHAR(3),
+    style CHAR(12),
+    color_code CHAR(6),
+    lbl_code CHAR(6),
+    dimension CHAR(4),
+    location CHAR(4),
+    total_qty INTEGER);
+CREATE TABLE zzcordrd (
+    division CHAR(3),
+    style CHAR(12),
+    color_code CHAR(6),
+    lbl_code CHAR(6),
+    dimension CHAR(4),
+    location CHAR(4),
+    stage CHAR(4),
+    total_qty INTEGER);
+CREATE INDEX zzxscolr_sku ON zzxscolr
+    (style, color_code, lbl_code, dimension, division);
+CREATE INDEX zzxscolr_fkey ON zzxscolr (fkey);
+CREATE INDEX zzxssumh_sku ON zzxssumh
+    (style, color_code, lbl_code, dimension, division);
+CREATE INDEX zzeupcnr_sku ON ZZEUPCNR
+    (style, color_code, lbl_code, dimension, division);
+CREATE INDEX zvstimgp_sku ON zvstimgp (style, division, contextid);
+CREATE INDEX zzoordrd_fkey ON zzoordrd (fkey);
+'''.format(
+    calls=_size_columns('call{:02d}', 'CHAR(1)'),
+    quantities=_size_columns('size{:02d}_qty', 'INTEGER'),
+    buckets=_size_columns('sz{:02d}', 'INTEGER'))
+
+DIVISIONS = ['EV', 'EK', 'EM']
+COLORS = ['BLK', 'WHT', 'RED', 'NVY', 'GRY', 'BLU', 'PNK', 'GRN']
+LABELS = ['', '', '', 'MACY', 'TJX']
+DIMENSIONS = ['', '', 'TALL']
+CATEGORIES = ['TOPS', 'BOTTOMS', 'DRESSES', 'SLEEP']
+LOCATIONS = ['NJ', 'NY', 'CA', 'FOB', 'POE', '']
+STATES = ['NJ', 'NY', 'CA', 'TX', '']
+COUNTRIES = ['USA', 'USA', 'USA', 'CAN', '']
+# Transaction types and the weight with which they are generated. Receipts
+# dominate so that most SKUs end up with stock to sell.
+REC_TYPES = [('R1', 6), ('R2', 1), ('RT', 1), ('SA', 1), ('IN', 2),
+    ('OP', 2), ('PK', 1), ('CM', 1), ('RS', 1), ('DM', 1), ('CC', 1),
+    ('CH', 1), ('WP', 1), ('RV', 1), ('RI', 1), ('ST', 1)]
+_RECEIPTS = {'R1', 'R2', 'RT', 'SA', 'WP', 'RV', 'ST'}
+
+
+class ABlueCherrySample(object):
+    ''' Generates a synthetic Blue Cherry data base.
+
+    The data is generated from a seeded random number generator so that the
+    same arguments always produce the same data base.
+
+    Note : Blue Cherry pads CHAR columns with blanks and SQL Server ignores
+    trailing blanks in comparisons. SQLite does not, so the generated values
+    are not padded.
+
+    Attributes:
+        n_styles : Number of styles
+        colors_per_style : Number of SKUs of each style
+        transactions_per_sku : Number of ZZXSSUMH entries per SKU and
+            location
+        n_stores : Number of stores
+        n_orders : Number of sales orders
+        seed : Seed of the random number generator
+    '''
+    def __init__(self, n_styles=500, colors_per_style=3,
+            transactions_per_sku=8, n_stores=200, n_orders=1000, seed=0):
+        self._n_styles = n_styles
+        self._colors_per_style = colors_per_style
+        self._transactions_per_sku = transactions_per_sku
+        self._n_stores = n_stores
+        self._n_orders = n_orders
+        self._seed = seed
+
+    def create(self, path=':memory:'):
+        ''' Creates and populates a data base and returns its backend '''
+        backend = ASQLiteBackend(path)
+        self.populate(backend)
+        return backend
+
+    def populate(self, backend):
+        ''' Creates the schema on a SQLite backend and fills it '''
+        backend.executescript(SCHEMA)
+        rand = random.Random(self._seed)
+        conn = backend.connect()
+        try:
+            skus = self._populate_styles(conn, rand)
+            self._populate_buckets(conn)
+            self._populate_transactions(conn, rand, skus)
+            self._populate_upcs(conn, rand, skus)
+            self._populate_images(conn, rand, skus)
+            self._populate_stores(conn, rand)
+            self._populate_orders(conn, rand, skus)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _insert(self, conn, table, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        conn.executemany('INSERT INTO {} VALUES ({})'.format(
+            table, ', '.join('?' * len(rows[0]))), rows)
+
+    def _populate_styles(self, conn, rand):
+        styles = []
+        colors = []
+        skus = []
+        for pkey in range(1, self._n_styles + 1):
+            division = rand.choice(DIVISIONS)
+            style = 'S{:06d}'.format(pkey)
+            active = 'Y' if rand.random() < 0.9 else 'N'
+            styles.append((pkey, division, style, active))
+            n_sizes = rand.randint(4, 8)
+            calls = ['Y'] * n_sizes + ['N'] * (N_SIZES - n_sizes)
+            category = rand.choice(CATEGORIES)
+            for color in rand.sample(COLORS, self._colors_per_style):
+                sku = (division, style, color, rand.choice(LABELS),
+                    rand.choice(DIMENSIONS))
+                skus.append((sku, n_sizes))
+                colors.append([len(colors) + 1, pkey] + list(sku) +
+                    [category] + calls)
+        self._insert(conn, 'zzxstylr', styles)
+        self._insert(conn, 'zzxscolr', colors)
+        return skus
+
+    def _populate_buckets(self, conn):
+        self._insert(conn, 'ZZXBUCKT',
+            [[size_num] + [int(idx == size_num)
+                for idx in range(1, N_SIZES + 1)]
+            for size_num in range(1, N_SIZES + 1)])
+
+    def _populate_transactions(self, conn, rand, skus):
+        rec_types = [rec for rec, weight in REC_TYPES for _ in range(weight)]
+        rows = []
+        for (division, style, color, label, dimension), n_sizes in skus:
+            for location in rand.sample(LOCATIONS, 2):
+                lot = 'L{:02d}'.format(rand.randint(1, 5))
+                for _ in range(self._transactions_per_sku):
+                    rec_type = rand.choice(rec_types)
+                    scale = 60 if rec_type in _RECEIPTS else 10
+                    quantities = [rand.randint(0, scale)
+                        for _ in range(n_sizes)]
+                    quantities += [0] * (N_SIZES - n_sizes)
+                    rows.append([division, style, color, label,
+                        dimension, location, lot, rec_type] + quantities)
+        self._insert(conn, 'zzxssumh', rows)
+
+    def _populate_upcs(self, conn, rand, skus):
+        rows = []
+        for idx, ((division, style, color, label, dimension), n_sizes) in \
+                enumerate(skus):
+            if rand.random() < 0.8:
+                rows.append((division, style, color, label, dimension,
+                    '{:012d}'.format(700000000000 + idx)))
+        self._insert(conn, 'ZZEUPCNR', rows)
+
+    def _populate_images(self, conn, rand, skus):
+        rows = []
+        seen_styles = set()
+        for (division, style, color, label, dimension), n_sizes in skus:
+            if rand.random() < 0.7:
+                rows.append((division, style, color, label, dimension,
+                    'ZZXSCOLR', 'Y', '{}_{}.{}'.format(style, color,
+                        rand.choice(['jpg', 'tif', 'TIFF']))))
+            if style not in seen_styles and rand.random() < 0.5:
+                seen_styles.add(style)
+                rows.append((division, style, '', '', '', 'ZZXSTYLR', 'Y',
+                    '{}.tif'.format(style)))
+        self._insert(conn, 'zvstimgp', rows)
+
+    def _populate_stores(self, conn, rand):
+        rows = []
+        for pkey in range(1, self._n_stores + 1):
+            store = 'ST{:05d}'.format(pkey)
+            if rand.random() < 0.05:
+                store = store[:3] + '-' + store[4:]
+            address = ['{} Main St'.format(pkey), '', '', '']
+            if rand.random() < 0.05:
+                address[0] = ''
+            zipcode = '{:05d}'.format(rand.randint(1000, 99999))
+            if rand.random() < 0.05:
+                zipcode = ''
+            rows.append([pkey, 'C{:04d}'.format(pkey % 50),
+                'Y' if rand.random() < 0.9 else 'N',
+                'Store {}'.format(pkey), store, store, ''] + address +
+                ['City', rand.choice(STATES), zipcode,
+                rand.choice(COUNTRIES)])
+        self._insert(conn, 'zzxstorr', rows)
+
+    def _populate_orders(self, conn, rand, skus):
+        headers = []
+        details = []
+        receipts = []
+        for pkey in range(1, self._n_orders + 1):
+            headers.append((pkey, 100000 + pkey,
+                rand.choice(['OP', 'PK', 'IN', 'CL']),
+                'C{:04d}'.format(rand.randint(0, 49)),
+                rand.choice(['WOMEN', 'KIDS', 'MEN'])))
+            for _ in range(rand.randint(1, 5)):
+                (division, style, color, label, dimension), n_sizes = \
+                    rand.choice(skus)
+                details.append((pkey, 100000 + pkey, division, style,
+                    color, label, dimension, rand.choice(LOCATIONS),
+                    rand.randint(1, 120)))
+        for (division, style, color, label, dimension), n_sizes in skus:
+            receipts.append((division, style, color, label, dimension,
+                rand.choice(LOCATIONS), rand.choice(['recv', 'open']),
+                rand.randint(10, 500)))
+        self._insert(conn, 'zzoordrh', headers)
+        self._insert(conn, 'zzoordrd', details)
+        self._insert(conn, 'zzcordrd', receipts)
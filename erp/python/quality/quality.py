@@ -21,8 +21,9 @@ from ecom        import ACheckUPCFilter
 
 from core        import AQuery
 from core        import ATable
-from core        import AWriteTable
-from core        import AQueryEngine
+from core        import AWriteWorkbook
+from core        import AQueryEnginePool
+from core        import ACountQuery
 from credentials import ACredentials
 from mailer      import AMailer
 
@@ -44,47 +45,56 @@ class AEComQualityMonitor:
     def __init__(self):
         self._qengine = None
         self._attachments = []
+        self._sheets = []
         self._init_qengine()
-        self._init_n_skus()
     
     def _init_qengine(self):
         creds = ACredentials('.bccreds')
-        self._qengine = AQueryEngine(server='ENVOGUE-BCDB', 
+        self._qengine = AQueryEnginePool(server='ENVOGUE-BCDB', 
             user = creds.login,
             password = creds.passwd,
             database = 'dataEVPR',
-            port = 1433)
+            port = 1433,
+            size = 4,
+            prewarm = True)
     
-    def _init_n_skus(self):
-        all_ecom_stock_query = AAllEComStock()
-        self._qengine.execute(all_ecom_stock_query)
-        self._n_skus = len(all_ecom_stock_query)
+    def _init_n_skus(self, n_skus_query):
+        self._n_skus = n_skus_query.count
     
-    def _collect_upc_quality(self):
-        q_all_skus = AAllSKU()
-        self._qengine.execute(q_all_skus)
-        q_upc = ACheckUPC()
-        self._qengine.execute(q_upc)
+    def _collect_upc_quality(self, q_all_skus, q_upc):
         q_upc = ACheckUPCFilter(q_upc, q_all_skus)
         q_upc.filter()
         self._n_wo_upc = len(q_upc)     
-        ss_upc = path.join(target_dir(),
-            'UPC-Quality-' + str(date.today()) + '.xlsx')        
-        AWriteTable(q_upc.table, ss_upc).execute()
-        self._attachments.append(ss_upc)
+        self._sheets.append(('UPC-Quality', q_upc.table))
     
-    def _collect_image_quality(self):
-        q_images = ACheckImages()
-        self._qengine.execute(q_images)
+    def _collect_image_quality(self, q_images):
         self._n_wo_images = len(q_images)
-        ss_images = path.join(target_dir(),
-            'Images-Quality-' + str(date.today()) + '.xlsx')
-        AWriteTable(q_images.table, ss_images).execute()
-        self._attachments.append(ss_images)
+        self._sheets.append(('Images-Quality', q_images.table))
+    
+    def _write_quality(self):
+        # A sheet per check in one workbook. The sheets are written in
+        # worker processes.
+        ss_quality = path.join(target_dir(),
+            'Quality-' + str(date.today()) + '.xlsx')
+        AWriteWorkbook(self._sheets, ss_quality).execute()
+        self._attachments.append(ss_quality)
     
     def _collect_quality(self):
-        self._collect_image_quality()
-        self._collect_upc_quality()
+        # The queries are independent of each other and are run against
+        # the server at the same time. The stock queries share the
+        # #inventory_summary aggregate and are run on one connection so
+        # that it is computed only once. Only the number of eCom SKUs is
+        # needed, so they are counted by the server.
+        q_n_skus = ACountQuery(AAllEComStock())
+        q_images = ACheckImages()
+        q_all_skus = AAllSKU()
+        q_upc = ACheckUPC()
+        self._qengine.execute_many(
+            [q_n_skus, q_images, q_all_skus, q_upc])
+        self._init_n_skus(q_n_skus)
+        self._collect_image_quality(q_images)
+        self._collect_upc_quality(q_all_skus, q_upc)
+        self._write_quality()
     
     def _send_email(self):
          # Formatted Results message
@@ -105,8 +115,8 @@ class AEComQualityMonitor:
             Total SKUs without Images - {:d}
             Quality - {:.2f}%
             
-        More details on each of the tables can be found in the attached spread 
-        sheets of the same name. Please note, the spread sheets should be 
+        More details on each of the tables can be found in the sheets of the
+        same name in the attached spread sheet. Please note, the spread sheets should be 
         downloaded and opened using Microsoft Excel. Opening the spread sheets
         using Google Viewer or OpenOffice will not display the data correctly.
     
@@ -161,7 +171,8 @@ class AEComQualityMonitor:
             remove(attachment)
     
     def run(self):
-        self._collect_quality()
+        with self._qengine:
+            self._collect_quality()
         self._send_email() 
         self._clean()
 
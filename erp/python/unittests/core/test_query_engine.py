@@ -0,0 +1,621 @@
+""" This file implements the unit tests for the query engine.
+
+The tests run the ERP queries against a synthetic Blue Cherry data base.
+"""
+import asyncio
+import gc
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+from core import AQuery
+from core import AQueryError
+from core import AQueryCache
+from core import AQueryEngine
+from core import AQueryEnginePool
+from core import AAsyncQueryEngine
+from core import AJSONLinesSink
+from core import AResultStream
+from core import AAggregate
+from core import AColumnarTable
+from core import APartitionedQuery
+from core import ATempTable
+from core.sqlutil import strip_order_by
+from core import ASQLiteBackend
+from ecom import AAllSKU
+from ecom import AAllSKUImages
+from ecom import AAllEComStock
+from ecom import ACheckUPC
+from ecom import ACheckUPCFilter
+from ecom import ACheckImages
+from ecom import INVENTORY_SUMMARY
+from misc.queries import AStockSales
+from offline import ABlueCherrySample
+
+class ACountSKU(AQuery):
+    """ Counts the SKUs of a division """
+    def __init__(self, division):
+        self._division = division
+        super().__init__()
+
+    def _init_query(self):
+        self._query = '''SELECT COUNT(*) AS N FROM zzxscolr
+        WHERE division = %s'''
+        self._query_tuple = (self._division,)
+
+class ABroken(AQuery):
+    """ Reads a table that does not exist """
+    def _init_query(self):
+        self._query = 'SELECT * FROM no_such_table'
+
+class ASlowCount(AQuery):
+    """ Counts for long enough to be cancelled """
+    def _init_query(self):
+        self._query = '''WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL
+            SELECT x + 1 FROM c WHERE x < 100000000) SELECT COUNT(*) FROM c'''
+
+class ASorted(AQuery):
+    """ Reads the SKUs of a division in order """
+    def _init_query(self):
+        self._query = '''SELECT style, color_code FROM zzxscolr
+            WHERE division = 'EV' ORDER BY style, color_code'''
+
+class AInline(AQuery):
+    """ Runs a query with the inventory summary as a derived table instead
+    of the temporary table """
+    def __init__(self, query):
+        self._base = query
+        super().__init__()
+
+    def _init_query(self):
+        self._query = self._base.query.replace('#inventory_summary',
+            '(' + INVENTORY_SUMMARY.query.query + ')')
+        self._query_tuple = self._base.query_tuple
+
+class ABatchCursor(object):
+    """ A cursor that runs a batch of statements one result set at a time
+    to emulate a driver that returns several result sets """
+    def __init__(self, conn):
+        self._conn = conn
+        self._statements = []
+        self._cursor = None
+
+    def execute(self, sql, params=()):
+        self._statements = sql.split(';\n')
+        self._params = list(params)
+        self.nextset()
+
+    def nextset(self):
+        if not self._statements:
+            return None
+        sql = self._statements.pop(0)
+        n_params = sql.count('?')
+        params = self._params[:n_params]
+        self._params = self._params[n_params:]
+        self._cursor = self._conn.execute(sql.replace('%%', '%'), params)
+        return True
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def close(self):
+        self._cursor.close()
+
+class ABatchConnection(object):
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return ABatchCursor(self._conn)
+
+    def close(self):
+        self._conn.close()
+
+class TestSQLiteBackend(unittest.TestCase):
+    """ Tests the translation of T-SQL to SQLite """
+    def test_translate(self):
+        backend = ASQLiteBackend()
+        sql = backend.translate(
+            "SELECT IsNull(a,0) FROM #t WHERE b = %s AND c LIKE '%s#x'")
+        self.assertEqual(sql,
+            "SELECT IFNULL(a,0) FROM t WHERE b = ? AND c LIKE '%s#x'")
+
+    def test_comments_untouched(self):
+        backend = ASQLiteBackend()
+        sql = backend.translate("SELECT a -- IsNull(it's %s)\nFROM #t")
+        self.assertEqual(sql, "SELECT a -- IsNull(it's %s)\nFROM t")
+
+class TestSQLUtil(unittest.TestCase):
+    """ Tests the helpers that compose queries """
+    def test_strip_order_by(self):
+        sql = '''SELECT a FROM (SELECT TOP 5 a FROM t ORDER BY a) AS s
+        WHERE b = 'ORDER BY' -- ORDER BY
+        ORDER BY a, b'''
+        self.assertEqual(strip_order_by(sql), sql[:sql.rindex('ORDER')]
+            .rstrip())
+        self.assertEqual(strip_order_by('SELECT a FROM t'), 'SELECT a FROM t')
+
+class TestQueryEngine(unittest.TestCase):
+    """ Tests the query engine against a synthetic data base """
+    @classmethod
+    def setUpClass(cls):
+        cls.backend = ABlueCherrySample(n_styles=50).create()
+
+    def test_execute(self):
+        engine = AQueryEngine(backend=self.backend)
+        query = AAllSKU()
+        engine.execute(query)
+        self.assertEqual(query.table.columns, ['Style_Number', 'Division',
+            'Color_Code', 'Dimension', 'Lbl_code', 'UPC'])
+        self.assertEqual(query.table.types[0], 'string')
+        self.assertTrue(len(query.table) > 0)
+
+    def test_parameters(self):
+        engine = AQueryEngine(backend=self.backend)
+        total = 0
+        for division in ['EV', 'EK', 'EM']:
+            query = ACountSKU(division)
+            engine.execute(query)
+            self.assertEqual(query.table.types, ['number'])
+            total = total + query.table.data[0][0]
+        self.assertEqual(total, 150)
+
+    def test_execute_iter(self):
+        engine = AQueryEngine(backend=self.backend)
+        query = AAllSKU()
+        engine.execute(query)
+        with engine.execute_iter(AAllSKU(), batch_size=7) as stream:
+            self.assertEqual(stream.columns, query.table.columns)
+            batches = list(stream.batches())
+        self.assertTrue(all(len(batch) <= 7 for batch in batches))
+        rows = [row for batch in batches for row in batch]
+        self.assertEqual(rows, query.table.data)
+
+    def test_temp_table(self):
+        engine = AQueryEngine(backend=self.backend)
+        engine.execute(AAllEComStock())
+        self.assertIn(INVENTORY_SUMMARY.name, engine._materialized)
+        query = ACheckUPC()
+        engine.execute(query)
+        self.assertTrue(all(row[-1] is None for row in query.table))
+
+    def test_temp_table_sql(self):
+        sql = ATempTable('sorted', ASorted()).create_sql()
+        self.assertTrue(sql.startswith('SELECT * INTO #sorted FROM ('))
+        self.assertTrue(sql.endswith(') AS sorted_src'))
+        self.assertNotIn('ORDER BY', sql)
+        engine = AQueryEngine(backend=self.backend)
+        engine.materialize(ATempTable('sorted', ASorted()))
+        self.assertIn('sorted', engine._materialized)
+
+    def test_temp_table_inline(self):
+        engine = AQueryEngine(backend=self.backend)
+        for query in (AAllEComStock(ots=-1000), ACheckUPC(ots=-1000),
+                ACheckImages(ots=-1000)):
+            inline = AInline(query)
+            self.assertNotIn('#', inline.query)
+            engine.execute(query)
+            engine.execute(inline)
+            self.assertTrue(query.table._data)
+            self.assertEqual(query.table.columns, inline.table.columns)
+            self.assertEqual(sorted(query.table.data, key=repr),
+                sorted(inline.table.data, key=repr))
+
+    def test_group_temp_tables(self):
+        queries = [AAllSKU(), AAllEComStock(), ACountSKU('EV'), ACheckUPC(),
+            ACheckImages()]
+        with AQueryEnginePool(backend=self.backend, size=2) as pool:
+            groups = pool._group(queries)
+            pool.execute_many(queries)
+            materialized = [INVENTORY_SUMMARY.name in engine._materialized
+                for engine in pool._all_engines]
+        self.assertEqual(groups, [[queries[0]], [queries[2]],
+            [queries[1], queries[3], queries[4]]])
+        self.assertEqual(materialized.count(True), 1)
+        self.assertTrue(all(query.has_run() for query in queries))
+
+    def test_cache(self):
+        engine = AQueryEngine(backend=self.backend, cache=AQueryCache())
+        first = AAllSKU()
+        engine.execute(first)
+        # A cached result does not need the connection
+        engine.close()
+        second = AAllSKU()
+        engine.execute(second)
+        self.assertEqual(first.table.data, second.table.data)
+
+    def test_cache_owned(self):
+        cache = AQueryCache()
+        engine = AQueryEngine(backend=self.backend, cache=cache)
+        first = AAllSKU()
+        engine.execute(first)
+        rows = list(first.table.data)
+        # Changing the table of a query does not change the cached result
+        first.table._data.append(list(rows[0]))
+        first.table._columns[0] = 'Style'
+        second = AAllSKU()
+        engine.execute(second)
+        self.assertIsNot(second.table, first.table)
+        self.assertEqual(second.table.data, rows)
+        self.assertEqual(second.table.columns[0], 'Style_Number')
+        # Engines that build other kinds of tables do not share entries
+        for options in ({'records': True}, {'columnar': True}):
+            stats = []
+            other = AQueryEngine(backend=self.backend, cache=cache,
+                listeners=[stats.append], **options)
+            third = AAllSKU()
+            other.execute(third)
+            self.assertFalse(stats[0].cached)
+            self.assertEqual([list(row) for row in third.table], rows)
+        self.assertTrue(hasattr(third.table, 'nbytes'))
+        self.assertEqual(len(cache), 3)
+
+    def test_cache_records(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = AQueryEngine(backend=self.backend, records=True,
+                cache=AQueryCache(snapshot_dir=tmp))
+            first = AAllSKU()
+            engine.execute(first)
+            # Another process reloads the result from the snapshot
+            engine = AQueryEngine(backend=self.backend, records=True,
+                cache=AQueryCache(snapshot_dir=tmp))
+            engine.close()
+            second = AAllSKU()
+            engine.execute(second)
+        self.assertEqual(first.table.data, second.table.data)
+        record = second.table.data[0]
+        self.assertEqual(record.Division,
+            record[second.table.index('Division')])
+
+    def test_cache_corrupt(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = AQueryEngine(backend=self.backend,
+                cache=AQueryCache(snapshot_dir=tmp))
+            first = AAllSKU()
+            engine.execute(first)
+            path, = [os.path.join(tmp, name) for name in os.listdir(tmp)]
+            with open(path, 'r+b') as f:
+                f.truncate(os.path.getsize(path) // 2)
+            # A truncated snapshot is a miss and the query runs again
+            engine = AQueryEngine(backend=self.backend,
+                cache=AQueryCache(snapshot_dir=tmp))
+            second = AAllSKU()
+            engine.execute(second)
+            self.assertEqual(os.listdir(tmp), [os.path.basename(path)])
+            with open(path, 'wb') as f:
+                f.write(b'not a snapshot')
+            engine = AQueryEngine(backend=self.backend,
+                cache=AQueryCache(snapshot_dir=tmp))
+            third = AAllSKU()
+            engine.execute(third)
+        self.assertEqual(first.table.data, second.table.data)
+        self.assertEqual(first.table.data, third.table.data)
+
+    def test_pool(self):
+        with AQueryEnginePool(backend=self.backend, size=2) as pool:
+            queries = pool.execute_many(
+                [AAllSKU(), AAllEComStock(), ACheckUPC()])
+        for query in queries:
+            self.assertTrue(query.has_run())
+
+    def test_disconnect_retry_once(self):
+        connect = self.backend.connect
+        opened = []
+        def dropped():
+            conn = connect()
+            conn.close()
+            opened.append(conn)
+            return conn
+        self.backend.connect = dropped
+        try:
+            engine = AQueryEngine(backend=self.backend)
+            with self.assertRaisesRegex(sqlite3.ProgrammingError, 'closed'):
+                engine.execute(AAllSKU())
+        finally:
+            del self.backend.connect
+        # The first connection and one more
+        self.assertEqual(len(opened), 2)
+        query = AAllSKU()
+        engine.execute(query)
+        self.assertTrue(query.has_run())
+
+    def test_stream_no_retry(self):
+        engine = AQueryEngine(backend=self.backend)
+        def broken(types, batch):
+            raise ValueError('Unknown type')
+        # A stream that fails before its first row is released
+        engine._infer_types = broken
+        with self.assertRaises(ValueError):
+            engine.execute_iter(AAllSKU())
+        del engine._infer_types
+        reconnects = []
+        engine._reconnect = lambda: reconnects.append(True)
+        with engine.execute_iter(AAllSKU()) as stream:
+            self.backend.is_disconnect = lambda error: True
+            try:
+                with self.assertRaises(AQueryError):
+                    engine.execute(AAllSKU())
+            finally:
+                del self.backend.is_disconnect
+            self.assertTrue(list(stream))
+        self.assertEqual(reconnects, [])
+
+    def test_cancel_no_retry(self):
+        engine = AQueryEngine(backend=self.backend)
+        engine.execute(AAllSKU())
+        reconnects = []
+        engine._reconnect = lambda: reconnects.append(True)
+        self.backend.is_disconnect = lambda error: True
+        try:
+            engine.cancel()
+            with self.assertRaises(Exception):
+                engine.execute(ABroken())
+        finally:
+            del self.backend.is_disconnect
+        self.assertEqual(reconnects, [])
+
+    def test_async_timeout(self):
+        engine = AAsyncQueryEngine(backend=self.backend, size=1)
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await engine.execute(ASlowCount(), timeout=0.1)
+            # The abandoned engine gives its slot back once it returns
+            return await engine.execute(ACountSKU('EV'), timeout=30)
+        with self.assertNoLogs('asyncio', level='ERROR'):
+            query = asyncio.run(run())
+            gc.collect()
+        self.assertTrue(query.has_run())
+
+    def test_async_iterate_close(self):
+        engine = AAsyncQueryEngine(backend=self.backend, size=1)
+        threads = []
+        close = AResultStream.close
+        def record(stream):
+            threads.append(threading.current_thread())
+            close(stream)
+        async def run():
+            rows = engine.iterate(AAllSKU(), batch_size=7)
+            async for row in rows:
+                break
+            await rows.aclose()
+            # The engine is back in the pool
+            return await engine.execute(ACountSKU('EV'), timeout=30)
+        AResultStream.close = record
+        try:
+            query = asyncio.run(run())
+        finally:
+            AResultStream.close = close
+        self.assertTrue(query.has_run())
+        self.assertTrue(threads)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_pool_close(self):
+        pool = AQueryEnginePool(backend=self.backend, size=2)
+        pool.execute_many([AAllSKU(), AAllEComStock(), ACheckUPC()])
+        self.assertTrue(any(engine._conn is not None
+            for engine in pool._all_engines))
+        pool.close()
+        self.assertTrue(all(engine._conn is None
+            for engine in pool._all_engines))
+
+    def test_stats(self):
+        records = []
+        engine = AQueryEngine(backend=self.backend,
+            listeners=[records.append])
+        query = AAllSKU()
+        engine.execute(query)
+        self.assertEqual(len(records), 1)
+        stats = records[0]
+        self.assertEqual(stats.query, 'AAllSKU')
+        self.assertEqual(stats.rows, len(query.table))
+        self.assertTrue(stats.bytes > 0)
+        self.assertTrue(stats.execute_time <= stats.first_row_time
+            <= stats.total_time)
+        self.assertIsNone(stats.error)
+
+    def test_stats_sink(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'stats.jsonl')
+            engine = AQueryEngine(backend=self.backend,
+                listeners=[AJSONLinesSink(path)])
+            engine.execute(AAllSKU())
+            with self.assertRaises(Exception):
+                engine.execute(ABroken())
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+        self.assertEqual([r['query'] for r in records],
+            ['AAllSKU', 'ABroken'])
+        self.assertIsNotNone(records[1]['error'])
+
+    def test_execute_batch(self):
+        backend = self.backend
+        connect = backend.connect
+        backend.supports_batches = True
+        backend.connect = lambda: ABatchConnection(connect())
+        try:
+            engine = AQueryEngine(backend=backend)
+            batch = engine.execute_batch([ACountSKU('EV'), AAllSKU(),
+                ACountSKU('EK'), AAllSKUImages()])
+        finally:
+            del backend.supports_batches
+            del backend.connect
+        engine = AQueryEngine(backend=self.backend)
+        for query, expected in zip(batch, [ACountSKU('EV'), AAllSKU(),
+                ACountSKU('EK'), AAllSKUImages()]):
+            engine.execute(expected)
+            self.assertEqual(query.table.columns, expected.table.columns)
+            self.assertEqual(query.table.data, expected.table.data)
+
+    def test_partitioned(self):
+        engine = AQueryEngine(backend=self.backend)
+        query = AStockSales()
+        engine.execute(query)
+        columns = ['Style_Number', 'Order_Number']
+        with AQueryEnginePool(backend=self.backend, size=2) as pool:
+            merged = pool.execute_partitioned(AStockSales())
+            ordered = pool.execute_partitioned(AStockSales(),
+                partitions=[['EV'], ['EK', 'EM']], order_by=columns)
+        self.assertEqual(sorted(merged.table.data), sorted(query.table.data))
+        keys = [[row[2], row[0]] for row in ordered.table]
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(len(keys), len(query.table))
+
+    def test_partitioned_null(self):
+        backend = ABlueCherrySample(n_styles=5).create()
+        backend.executescript(
+            'UPDATE zzoordrd SET division = NULL WHERE ord_num % 3 = 0')
+        engine = AQueryEngine(backend=backend)
+        query = AStockSales()
+        engine.execute(query)
+        self.assertTrue(any(row[3] is None for row in query.table))
+        with AQueryEnginePool(backend=backend, size=2) as pool:
+            merged = pool.execute_partitioned(AStockSales())
+        self.assertEqual(sorted(merged.table.data, key=repr),
+            sorted(query.table.data, key=repr))
+
+    def test_partitioned_percent(self):
+        base = AAllSKUImages()
+        self.assertIn("LIKE '%.tif'", base.query)
+        nulls = APartitionedQuery(base, [None])
+        self.assertEqual(nulls.query_tuple, ())
+        self.assertIn("LIKE '%.tif'", nulls.query)
+        mixed = APartitionedQuery(base, [None, 'EV'])
+        self.assertEqual(mixed.query_tuple, ('EV',))
+        self.assertIn("LIKE '%%.tif'", mixed.query)
+
+    def test_partitioned_empty(self):
+        backend = ABlueCherrySample(n_styles=5).create()
+        backend.executescript('DELETE FROM zzoordrd')
+        engine = AQueryEngine(backend=backend)
+        query = AStockSales()
+        engine.execute(query)
+        with AQueryEnginePool(backend=backend, size=2) as pool:
+            merged = pool.execute_partitioned(AStockSales())
+        self.assertEqual(merged.table.columns, query.table.columns)
+        self.assertFalse(merged.table._data)
+
+    def test_aggregate(self):
+        engine = AQueryEngine(backend=self.backend)
+        query = AAllEComStock()
+        engine.execute(query)
+        self.assertEqual(engine.count(AAllEComStock()), len(query.table))
+        styles = set(row[0] for row in query.table)
+        total = sum(row[-2] for row in query.table)
+        values = engine.aggregate(AAllEComStock(), [
+            AAggregate('COUNT', 'Style_Number', distinct=True),
+            AAggregate('SUM', 'Total_QOH')])
+        self.assertEqual(values, [len(styles), total])
+
+    def test_columnar(self):
+        engine = AQueryEngine(backend=self.backend)
+        query = AAllEComStock()
+        engine.execute(query)
+        engine = AQueryEngine(backend=self.backend, columnar=True)
+        columnar = AAllEComStock()
+        engine.execute(columnar)
+        table = columnar.table
+        self.assertIsInstance(table, AColumnarTable)
+        self.assertEqual(table.data, query.table.data)
+        self.assertEqual([row for row in table], query.table.data)
+        self.assertEqual(table.sum('Total_QOH'),
+            sum(row[-2] for row in query.table))
+        self.assertEqual(table.count('Style_Number'), len(query.table))
+        styles = [row[0] for row in query.table]
+        self.assertEqual(table.min('Style_Number'), min(styles))
+        self.assertEqual(table.max('Style_Number'), max(styles))
+
+    def test_records(self):
+        engine = AQueryEngine(backend=self.backend)
+        query = ACheckUPC()
+        engine.execute(query)
+        engine = AQueryEngine(backend=self.backend, records=True)
+        records = ACheckUPC()
+        engine.execute(records)
+        self.assertEqual([list(record) for record in records.table],
+            query.table.data)
+        upc = query.table.index('UPC')
+        for row, record in zip(query.table, query.table.records()):
+            self.assertEqual(record.UPC, row[upc])
+        for record in records.table:
+            self.assertEqual(record.Lbl_code,
+                record[records.table.index('Lbl_code')])
+        with self.assertRaises(RuntimeError):
+            query.table.index('NoSuchColumn')
+
+    def test_check_upc_filter(self):
+        engine = AQueryEngine(backend=self.backend)
+        skus = AAllSKU()
+        engine.execute(skus)
+        query = ACheckUPC()
+        engine.execute(query)
+        upc = skus.table.index('UPC')
+        label = skus.table.index('Lbl_code')
+        generic = set(tuple(row[:4]) for row in skus.table
+            if row[upc] and not row[label])
+        # A labeled SKU without a UPC borrows the UPC of its non labeled
+        # SKU
+        borrowed = next(row for row in query.table if row[4])
+        skus.table._data.append(borrowed[:4] + ['', '000000000000'])
+        results = ACheckUPCFilter(query, skus)
+        results.filter()
+        self.assertEqual(results.table.columns[-1], 'Reason')
+        expected = [row + [None] for row in query.table
+            if tuple(row[:4]) not in generic and row[:4] != borrowed[:4]]
+        self.assertEqual(results.table.data, expected)
+        self.assertTrue(len(expected) < len(query.table))
+        self.assertNotIn(borrowed + [None], results.table.data)
+
+    def test_intern(self):
+        engine = AQueryEngine(backend=self.backend)
+        query = AStockSales()
+        engine.execute(query)
+        plain = AStockSales()
+        plain._intern_columns = ()
+        engine.execute(plain)
+        self.assertEqual(query.table.data, plain.table.data)
+        location = query.table.index('Location')
+        values = [row[location] for row in query.table]
+        self.assertEqual(len(set(map(id, values))), len(set(values)))
+        values = [row[location] for row in plain.table]
+        self.assertTrue(len(set(map(id, values))) > len(set(values)))
+        query = ACheckUPC()
+        engine.execute_batch([query, AAllSKU()])
+        division = query.table.index('Division')
+        self.assertEqual(len(set(id(row[division]) for row in query.table)),
+            len(set(row[division] for row in query.table)))
+
+    def test_lazy_connect(self):
+        backend = ABlueCherrySample(n_styles=5).create()
+        connect = backend.connect
+        opened = []
+        backend.connect = lambda: opened.append(1) or connect()
+        engine = AQueryEngine(backend=backend, cache=AQueryCache())
+        self.assertEqual(opened, [])
+        engine.execute(AAllSKU())
+        self.assertEqual(opened, [1])
+        # A cached result does not open a connection
+        engine.close()
+        engine.execute(AAllSKU())
+        self.assertEqual(opened, [1])
+
+    def test_reconnect(self):
+        engine = AQueryEngine(backend=self.backend, prewarm=True)
+        engine.execute(AAllEComStock())
+        # The session is dropped together with its temporary tables
+        engine._conn.close()
+        query = ACheckUPC()
+        engine.execute(query)
+        self.assertTrue(query.has_run())
+        self.assertIn(INVENTORY_SUMMARY.name, engine._materialized)
+        engine.close()
+        with self.assertRaises(AQueryError):
+            engine.execute(AAllSKU())
+
+if __name__ == '__main__':
+    unittest.main()
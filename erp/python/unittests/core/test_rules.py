@@ -0,0 +1,88 @@
+""" This file implements the unit tests for the rules compiled to SQL.
+
+The checks evaluated by the server are compared with the same checks
+evaluated in python.
+"""
+import unittest
+from core import AQueryEngine
+from core import AIsEmpty
+from core import AMismatch
+from core import ARuleQuery
+from core import ARuleFilter
+from core.sqlutil import like_to_regex
+from ecom import AStores
+from ecom import ACheckStores
+from ecom import AInvalidStores
+from offline import ABlueCherrySample
+
+class TestLike(unittest.TestCase):
+    """ Tests the translation of LIKE patterns """
+    def test_like(self):
+        self.assertTrue(like_to_regex('%[^a-z0-9]%').fullmatch('ST-01'))
+        self.assertFalse(like_to_regex('%[^a-z0-9]%').fullmatch('ST01'))
+        self.assertTrue(like_to_regex('%.tif').fullmatch('a.TIF'))
+        self.assertFalse(like_to_regex('%.tif').fullmatch('a.tiff'))
+        self.assertTrue(like_to_regex('a_[bc]').fullmatch('a.c'))
+        self.assertTrue(like_to_regex('100%').fullmatch('100 percent'))
+
+class TestRules(unittest.TestCase):
+    """ Tests the rules against a synthetic data base """
+    @classmethod
+    def setUpClass(cls):
+        backend = ABlueCherrySample(n_styles=10, n_stores=300).create()
+        cls.engine = AQueryEngine(backend=backend)
+
+    def test_pushdown(self):
+        stores = AStores()
+        self.engine.execute(stores)
+        expected = ACheckStores(stores)
+        expected.filter()
+        query = AInvalidStores()
+        self.assertEqual(query.fallback, [])
+        self.engine.execute(query)
+        self.assertEqual(query.table.columns, expected.table.columns)
+        self.assertEqual(query.table.data, expected.table.data)
+        self.assertTrue(len(query.table) < len(stores.table))
+
+    def test_padded(self):
+        # CHAR columns are padded with blanks on the server
+        backend = ABlueCherrySample(n_styles=10, n_stores=300).create()
+        backend.executescript(
+            "UPDATE zzxstorr SET store = ' ' || store || '   '")
+        engine = AQueryEngine(backend=backend)
+        stores = AStores()
+        engine.execute(stores)
+        expected = ACheckStores(stores)
+        expected.filter()
+        query = AInvalidStores()
+        engine.execute(query)
+        self.assertEqual(query.table.data, expected.table.data)
+        self.assertEqual(len(query.table), len(self.invalid()))
+
+    def invalid(self):
+        query = AInvalidStores()
+        self.engine.execute(query)
+        return query.table
+
+    def test_fallback(self):
+        rules = [AIsEmpty('ZIPCODE', 'No zip code'),
+            AMismatch('STORE', r'ST\d+', 'Bad store'),
+            AIsEmpty('STATE1', 'No state')]
+        query = ARuleQuery(AStores(), rules, order_by=['STORE'])
+        self.assertEqual(len(query.pushed), 1)
+        self.engine.execute(query)
+        results = ARuleFilter(query)
+        results.filter()
+        stores = AStores()
+        self.engine.execute(stores)
+        checks = [(rule.bind(stores.table.columns), rule.reason)
+            for rule in rules]
+        expected = []
+        for row in stores.table:
+            reasons = [reason for check, reason in checks if check(row)]
+            if reasons:
+                expected.append(row + reasons[:1])
+        self.assertEqual(results.table.data, expected)
+
+if __name__ == '__main__':
+    unittest.main()
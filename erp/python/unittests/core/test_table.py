@@ -0,0 +1,227 @@
+""" This file implements the unit tests for the table.
+
+The tables are built by hand, so no data base is needed.
+"""
+import datetime
+import decimal
+import os
+import tempfile
+import unittest
+from core import ATable
+from core import AColumnarTable
+from core import AAggregate
+from core.snapshot import pyarrow
+
+def make_table(columns, rows):
+    table = ATable()
+    table._columns = list(columns)
+    table._types = [None] * len(columns)
+    table._data = list(rows)
+    return table
+
+class TestTable(unittest.TestCase):
+    """ Tests the validation and the operations of a table """
+    def test_validate(self):
+        table = make_table(['A', 'B'], [[1, 'x'], [None, 'y'], [3, None]])
+        self.assertFalse(table.validated)
+        self.assertTrue(table._validate())
+        self.assertTrue(table.validated)
+        table.extend([[4, 'z']])
+        self.assertTrue(table.validated)
+        with self.assertRaisesRegex(RuntimeError, 'row 4 column B'):
+            table.append([5, 5])
+        table = make_table(['A'], [[None], [1], [2.0]])
+        with self.assertRaisesRegex(RuntimeError, 'row 2 column A'):
+            table._validate()
+        self.assertTrue(make_table(['A'], [])._validate())
+
+    def test_validate_trusted(self):
+        rows = [[idx, datetime.date(2020, 1, 1)] for idx in range(10000)]
+        rows[5001][0] = 'bad'
+        table = make_table(['A', 'B'], rows)
+        table._trusted = True
+        # The bad row is not in the sample
+        self.assertTrue(table._validate())
+        self.assertTrue(table.sampled)
+        self.assertFalse(table.validated)
+        table._data = list(rows)
+        table._trusted = False
+        self.assertFalse(table.sampled)
+        with self.assertRaisesRegex(RuntimeError, 'row 5001'):
+            table._validate()
+        table._data = rows[:5000]
+        self.assertTrue(table._validate())
+        self.assertTrue(table.validated)
+        self.assertFalse(table.sampled)
+    def test_index(self):
+        table = make_table(['Style', 'Color', 'Qty'], [['S1', 'RED', 1],
+            ['S1', 'BLU', 2], ['S2', 'RED', 3], ['S1', 'RED', 4],
+            [None, 'RED', 5]])
+        index = table.create_index(['Style', 'Color'])
+        self.assertIs(table.create_index(['Style', 'Color']), index)
+        self.assertEqual(index.lookup(('S1', 'RED')),
+            [['S1', 'RED', 1], ['S1', 'RED', 4]])
+        self.assertTrue(('S2', 'RED') in index)
+        self.assertFalse(index.contains(('S2', 'BLU')))
+        self.assertEqual(index.lookup(('S3', 'RED')), [])
+        self.assertEqual([row[2] for row in index.range(('S1', 'RED'))],
+            [1, 4, 3])
+        self.assertEqual([row[2] for row in index.range(high=('S2',))],
+            [2, 1, 4])
+        table.append(['S3', 'RED', 6])
+        self.assertTrue(('S3', 'RED') in index)
+        unique = table.create_index('Qty', unique=True)
+        self.assertEqual(unique.lookup(3), ['S2', 'RED', 3])
+        self.assertIsNone(unique.lookup(7))
+        with self.assertRaises(RuntimeError):
+            table.create_index('Style', unique=True).lookup('S1')
+        # A duplicate leaves the index as it was
+        copy = make_table(['Qty'], [[0], [1], [0]])
+        for _ in range(2):
+            with self.assertRaisesRegex(RuntimeError, 'rows 0 and 2'):
+                copy.create_index('Qty', unique=True).lookup(1)
+        columnar = AColumnarTable.from_table(table)
+        index = columnar.create_index('Style')
+        self.assertEqual(len(index.lookup('S1')), 3)
+        self.assertEqual(len(index), 4)
+class TestTableView(unittest.TestCase):
+    """ Tests the views of a table """
+    def setUp(self):
+        self.table = make_table(['Style', 'Color', 'Qty'], [['S1', 'RED', 1],
+            ['S2', 'RED', 3], ['S1', 'BLU', None], ['S3', 'RED', 4]])
+
+    def test_views(self):
+        view = self.table.rows[1:3]
+        self.assertEqual(len(view), 2)
+        self.assertIs(view.data[0], self.table.data[1])
+        view = self.table.select(['Qty', 'Style']).where(
+            lambda row: row[0] is not None)
+        self.assertEqual(view.columns, ['Qty', 'Style'])
+        self.assertEqual(view.data, [[1, 'S1'], [3, 'S2'], [4, 'S3']])
+        view = view.overlay('Reason', ['a', 'b', 'c'], ATable.STRING)
+        self.assertEqual(view.types[-1], ATable.STRING)
+        view = view.where([False, True, True]).rows[1:]
+        self.assertEqual(view.data, [[4, 'S3', 'c']])
+        self.assertIs(view.base, self.table)
+        self.assertEqual(view.index('Reason'), 2)
+        self.assertTrue(view._validate())
+        with self.assertRaises(RuntimeError):
+            view.append([1, 'S4', 'd'])
+
+    def test_iter(self):
+        pairs = [(a[0], b[0]) for a in self.table for b in self.table]
+        self.assertEqual(len(pairs), 16)
+        self.assertEqual([row for row in ATable()], [])
+
+    def test_lazy_rows(self):
+        rows = [[idx, 'S{}'.format(idx % 3)] for idx in range(5000)]
+        columnar = AColumnarTable.from_table(make_table(['A', 'B'], rows))
+        view = columnar.where([idx % 2 == 0 for idx in range(5000)])
+        for table, expected in ((columnar, rows), (view, rows[::2])):
+            self.assertEqual(len(table._data), len(expected))
+            self.assertEqual(table._data, expected)
+            self.assertEqual(table._data[-1], expected[-1])
+            self.assertEqual(table._data[4090:4100], expected[4090:4100])
+            self.assertEqual(table._data[10:1:-3], expected[10:1:-3])
+            with self.assertRaises(IndexError):
+                table._data[len(expected)]
+        self.assertTrue(columnar.validated)
+        with self.assertRaisesRegex(RuntimeError, 'columnar table'):
+            columnar.extend([[1, 'S1']])
+
+class TestOperators(unittest.TestCase):
+    """ Tests the relational operators """
+    def setUp(self):
+        self.sales = make_table(['Style', 'Color', 'Qty'], [['S1', 'RED', 1],
+            ['S2', 'RED', 3], ['S1', 'BLU', None], ['S1', 'RED', 4],
+            [None, 'RED', 5]])
+        self.styles = make_table(['Style', 'Name'], [['S1', 'Shirt'],
+            ['S3', 'Skirt']])
+
+    def test_project_sort(self):
+        table = self.sales.project(['Qty', 'Style'])
+        self.assertEqual(table.columns, ['Qty', 'Style'])
+        self.assertEqual(table.data[0], [1, 'S1'])
+        table = self.sales.sort(['Style', 'Qty'], [False, True])
+        self.assertEqual([row[2] for row in table], [5, 4, 1, None, 3])
+        self.assertEqual(self.sales.data[0], ['S1', 'RED', 1])
+
+    def test_join(self):
+        table = self.sales.join(self.styles, 'Style')
+        self.assertEqual(table.columns, ['Style', 'Color', 'Qty', 'Name'])
+        self.assertEqual([row[3] for row in table], ['Shirt'] * 3)
+        table = self.sales.join(self.styles, ['Style'], how='left')
+        self.assertEqual([row[3] for row in table],
+            ['Shirt', None, 'Shirt', 'Shirt', None])
+        table = self.sales.join(self.styles, 'Style', how='anti')
+        self.assertEqual(table.data, [['S2', 'RED', 3], [None, 'RED', 5]])
+        table = self.styles.join(self.sales, 'Style', how='anti')
+        self.assertEqual(table.data, [['S3', 'Skirt']])
+
+    def test_group_by(self):
+        table = self.sales.group_by(['Style'], [AAggregate('COUNT'),
+            AAggregate('SUM', 'Qty'), AAggregate('COUNT', 'Qty'),
+            AAggregate('COUNT', 'Color', distinct=True),
+            AAggregate('MAX', 'Qty')])
+        self.assertEqual(table.columns, ['Style', 'COUNT', 'SUM_Qty',
+            'COUNT_Qty', 'COUNT_DISTINCT_Color', 'MAX_Qty'])
+        self.assertEqual(table.data, [['S1', 3, 5, 2, 2, 4],
+            ['S2', 1, 3, 1, 1, 3], [None, 1, 5, 1, 1, 5]])
+    def test_group_by_columnar(self):
+        table = make_table(['Style', 'Qty', 'Price', 'Date'], [
+            ['S%d' % (idx % 3) if idx % 7 else None,
+            idx % 4 if idx % 5 else None, idx * 0.5,
+            datetime.date(2020, 1, 1 + idx % 5) if idx % 6 else None]
+            for idx in range(50)])
+        table._types = [ATable.STRING, ATable.NUMBER, ATable.NUMBER,
+            ATable.DATETIME]
+        columnar = AColumnarTable.from_table(table)
+        aggregates = [AAggregate('COUNT'), AAggregate('COUNT', 'Qty'),
+            AAggregate('SUM', 'Qty'), AAggregate('AVG', 'Price'),
+            AAggregate('MIN', 'Date'), AAggregate('MAX', 'Style'),
+            AAggregate('COUNT', 'Qty', distinct=True),
+            AAggregate('SUM', 'Price', distinct=True)]
+        for columns in (['Style'], ['Style', 'Qty'], ['Date'], []):
+            expected = table.group_by(columns, aggregates)
+            grouped = columnar.group_by(columns, aggregates)
+            self.assertEqual(grouped.columns, expected.columns)
+            self.assertEqual(grouped.data, expected.data)
+        # A column of Decimal is grouped row by row
+        table._data = [[decimal.Decimal(idx % 2), idx] for idx in range(4)]
+        table._columns = ['Price', 'Qty']
+        table._types = [ATable.NUMBER, ATable.NUMBER]
+        columnar = AColumnarTable.from_table(table)
+        self.assertIsNone(columnar.groups(['Price']))
+        self.assertEqual(columnar.group_by('Price',
+            [AAggregate('SUM', 'Qty')]).data, [[0, 2], [1, 4]])
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class TestSnapshot(unittest.TestCase):
+    """ Tests writing tables to files and opening them again """
+    def test_snapshot(self):
+        table = make_table(['Style', 'Qty', 'Price', 'Date'], [
+            ['S1', 1, decimal.Decimal('9.99'), datetime.date(2020, 1, 1)],
+            ['S2', None, None, datetime.date(2020, 1, 2)],
+            [None, 3, decimal.Decimal('1.50'), None]])
+        table._types = [ATable.STRING, ATable.NUMBER, ATable.NUMBER,
+            ATable.DATETIME]
+        columnar = AColumnarTable.from_table(table)
+        with tempfile.TemporaryDirectory() as tmp:
+            for source in (table, columnar):
+                for name in ('to_parquet', 'to_arrow_ipc'):
+                    path = os.path.join(tmp, name)
+                    getattr(source, name)(path)
+                    snapshot = ATable.open_snapshot(path)
+                    self.assertEqual(snapshot.columns, table.columns)
+                    self.assertEqual(snapshot.types, table.types)
+                    self.assertEqual(snapshot.data, table.data)
+                    self.assertEqual(snapshot.data[1:], table.data[1:])
+                    self.assertEqual(snapshot.column('Qty'), [1, None, 3])
+                    self.assertEqual(snapshot._data[-1], table.data[-1])
+                    self.assertTrue(snapshot.validated)
+                    with self.assertRaisesRegex(RuntimeError, 'arrow table'):
+                        snapshot.extend(table.data)
+                    del snapshot
+
+if __name__ == '__main__':
+    unittest.main()
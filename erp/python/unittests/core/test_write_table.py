@@ -0,0 +1,238 @@
+""" This file implements the unit tests for the xlsx export.
+
+The written workbooks are read back with openpyxl.
+"""
+from copy import copy
+import csv
+import datetime
+import decimal
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from openpyxl import Workbook
+from openpyxl import load_workbook
+from core import ATable
+from core import AWriteTable
+from core import AWriteWorkbook
+from core.write_workbook import _payload
+from core import AQueryError
+from core import AQueryEngine
+from core import ACSVWriter
+from core import AJSONLinesWriter
+from core import AParquetWriter
+from core.writer import DEFAULT_BATCH_SIZE
+from core.snapshot import pyarrow
+from misc.queries import AStockSales
+from offline import ABlueCherrySample
+
+def make_table(n_rows):
+    table = ATable()
+    table._columns = ['Style', 'Qty', 'Date', 'UPC']
+    table._types = [ATable.STRING, ATable.NUMBER, ATable.DATETIME,
+        ATable.STRING]
+    table._data = [['A long style name ' + str(idx), idx,
+        datetime.datetime(2020, 1, 1 + idx % 28), '0123' if idx % 2 else None]
+        for idx in range(n_rows)]
+    return table
+
+class TestWriteTable(unittest.TestCase):
+    """ Tests the xlsx export of a table """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'table.xlsx')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_write(self):
+        table = make_table(50)
+        AWriteTable(table, self.path).execute()
+        ws = load_workbook(self.path).active
+        rows = list(ws.iter_rows(values_only=True))
+        self.assertEqual(list(rows[0]), table.columns)
+        self.assertEqual(len(rows), 51)
+        self.assertEqual(rows[1][:3], tuple(table.data[0][:3]))
+        self.assertEqual(rows[2][3], '0123')
+        self.assertEqual(ws['D3'].number_format, '@')
+        self.assertEqual(ws['D3'].style, AWriteTable.TEXT)
+        self.assertEqual(ws['B3'].style, AWriteTable.CELL)
+        self.assertTrue(ws['A1'].font.b)
+        banding, = ws.conditional_formatting
+        self.assertEqual(str(banding.sqref), 'A2:D51')
+        self.assertEqual(ws.column_dimensions['A'].width,
+            len('A long style name 49') * AWriteTable.WIDTH_FACTOR)
+        self.assertEqual(ws.column_dimensions['B'].width,
+            AWriteTable.MIN_WIDTH)
+    def test_shared_styles(self):
+        writer = AWriteTable(make_table(1), self.path)
+        ws = Workbook(write_only=True).create_sheet()
+        style = writer._register(ws)[AWriteTable.CELL]
+        before = copy(style)
+        self.assertIs(writer._cell(ws, 'A', style)._style, style)
+        self.assertIs(writer._cell(ws, 1, style)._style, style)
+        cell = writer._cell(ws, datetime.date(2020, 1, 1), style)
+        self.assertIsNot(cell._style, style)
+        self.assertEqual(style, before)
+        self.assertTrue(cell.is_date)
+
+    def test_write_stream(self):
+        engine = AQueryEngine(backend=ABlueCherrySample(n_styles=5).create())
+        query = AStockSales()
+        engine.execute(query)
+        with engine.execute_iter(AStockSales(), batch_size=7) as stream:
+            self.assertEqual(AWriteTable(stream, self.path).execute(),
+                len(query.table))
+        rows = list(load_workbook(self.path).active.iter_rows(
+            values_only=True))
+        # Excel has no empty strings
+        self.assertEqual([list(row) for row in rows[1:]], [[value or None
+            if isinstance(value, str) else value for value in row]
+            for row in query.table])
+
+    def test_split(self):
+        table = make_table(10)
+        writer = AWriteTable(table, self.path, max_rows=5)
+        self.assertEqual((writer.n_rows, writer.n_parts), (10, 3))
+        self.assertEqual(writer.execute(), 10)
+        wb = load_workbook(self.path)
+        self.assertEqual(wb.sheetnames, ['Sheet', 'Sheet (2)', 'Sheet (3)'])
+        rows = [list(row) for ws in wb for row in ws.iter_rows(
+            values_only=True) if row[0] != 'Style']
+        self.assertEqual(rows, table.data)
+        ws = wb['Sheet (3)']
+        self.assertEqual(ws.max_row, 3)
+        self.assertEqual([cell.value for cell in ws[1]], table.columns)
+        self.assertEqual(ws['D3'].style, AWriteTable.TEXT)
+        # Files
+        writer = AWriteTable(table, self.path, split=AWriteTable.FILES,
+            max_rows=6)
+        self.assertEqual(writer.execute(), 10)
+        self.assertEqual(writer.files, [self.path,
+            os.path.join(self.tmp.name, 'table-2.xlsx')])
+        self.assertEqual(load_workbook(writer.files[1]).active.max_row, 6)
+        # The size is checked before anything is written
+        with self.assertRaises(AQueryError):
+            AWriteTable(table, self.path + '.none', split=None,
+                max_rows=10).execute()
+        self.assertFalse(os.path.exists(self.path + '.none'))
+        self.assertTrue(AWriteTable.fits(1048575))
+        self.assertFalse(AWriteTable.fits(1048576))
+
+    def test_split_stream(self):
+        engine = AQueryEngine(backend=ABlueCherrySample(n_styles=5).create())
+        n_rows = engine.count(AStockSales())
+        with engine.execute_iter(AStockSales(), batch_size=7) as stream:
+            writer = AWriteTable(stream, self.path, n_rows=n_rows,
+                max_rows=n_rows - n_rows // 2 + 1)
+            self.assertEqual(writer.n_parts, 2)
+            self.assertEqual(writer.execute(), n_rows)
+        wb = load_workbook(self.path)
+        self.assertEqual([ws.max_row for ws in wb],
+            [n_rows - n_rows // 2 + 1, n_rows // 2 + 1])
+        with engine.execute_iter(AStockSales()) as stream:
+            with self.assertRaises(AQueryError):
+                AWriteTable(stream, self.path, split=None,
+                    max_rows=n_rows).execute()
+
+    def test_write_workbook(self):
+        tables = [('Stock', make_table(30)), ('Sales', make_table(5))]
+        for processes in (1, 2):
+            self.assertEqual(AWriteWorkbook(tables, self.path,
+                processes=processes).execute(), 35)
+            wb = load_workbook(self.path)
+            self.assertEqual(wb.sheetnames, ['Summary', 'Stock', 'Sales'])
+            self.assertEqual(list(wb['Summary'].iter_rows(values_only=True)),
+                [('Sheet', 'Rows', 'Columns'), ('Stock', 30, 4),
+                    ('Sales', 5, 4)])
+            rows = list(wb['Sales'].iter_rows(values_only=True))
+            self.assertEqual([list(row) for row in rows[1:]],
+                tables[1][1].data)
+            self.assertEqual(wb['Stock']['D3'].style, AWriteTable.TEXT)
+            self.assertEqual(wb['Stock'].max_row, 31)
+        self.assertEqual(AWriteWorkbook(tables, self.path, processes=1,
+            max_rows=21).execute(), 35)
+        wb = load_workbook(self.path)
+        self.assertEqual(wb.sheetnames, ['Summary', 'Stock', 'Stock (2)',
+            'Sales'])
+        # A worker receives the rows of its part only
+        part = _payload(AWriteWorkbook(tables, self.path,
+            max_rows=21).tables[1][1])
+        self.assertEqual(part.data, tables[0][1].data[20:])
+        self.assertTrue(len(pickle.dumps(part)) <
+            len(pickle.dumps(tables[0][1])) / 2)
+        self.assertEqual(AWriteWorkbook(tables, self.path, processes=2,
+            max_rows=11).execute(), 35)
+        rows = [list(row) for name in ('Stock', 'Stock (2)', 'Stock (3)')
+            for row in load_workbook(self.path)[name].iter_rows(
+                min_row=2, values_only=True)]
+        self.assertEqual(rows, tables[0][1].data)
+        self.assertEqual(wb['Summary']['B3'].value, 10)
+        self.assertEqual(AWriteWorkbook([], self.path).execute(), 0)
+        wb = load_workbook(self.path)
+        self.assertEqual(wb.sheetnames, ['Summary'])
+        self.assertEqual(list(wb['Summary'].iter_rows(values_only=True)),
+            [('Sheet', 'Rows', 'Columns')])
+        with self.assertRaises(AQueryError):
+            AWriteWorkbook({'Stock:2020' : make_table(1)}, self.path)
+        with self.assertRaises(AQueryError):
+            AWriteWorkbook(tables + [('stock', make_table(1))], self.path)
+
+class TestWriters(unittest.TestCase):
+    """ Tests the CSV, JSON Lines and Parquet writers """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engine = AQueryEngine(
+            backend=ABlueCherrySample(n_styles=5).create())
+        self.query = AStockSales()
+        self.engine.execute(self.query)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_csv(self):
+        path = os.path.join(self.tmp.name, 'table.csv')
+        with self.engine.execute_iter(AStockSales()) as stream:
+            ACSVWriter(stream, path).execute()
+        with open(path, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], self.query.table.columns)
+        self.assertEqual(rows[1:], [['' if value is None else str(value)
+            for value in row] for row in self.query.table])
+
+    def test_json_lines(self):
+        path = os.path.join(self.tmp.name, 'table.jsonl')
+        table = make_table(3)
+        self.assertEqual(AJSONLinesWriter(table, path).execute(), 3)
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(records[1], {'Style' : 'A long style name 1',
+            'Qty' : 1, 'Date' : '2020-01-02T00:00:00', 'UPC' : '0123'})
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet(self):
+        path = os.path.join(self.tmp.name, 'table.parquet')
+        with self.engine.execute_iter(AStockSales(), batch_size=10) as stream:
+            AParquetWriter(stream, path).execute()
+        snapshot = ATable.open_snapshot(path)
+        self.assertEqual(snapshot.types, self.query.table.types)
+        self.assertEqual(snapshot.data, self.query.table.data)
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_parquet_decimal(self):
+        path = os.path.join(self.tmp.name, 'table.parquet')
+        table = ATable()
+        table._columns = ['Style', 'Price']
+        table._types = [ATable.STRING, ATable.NUMBER]
+        # The later batch needs more digits than the first
+        table._data = [['A', decimal.Decimal('1.5')]] * DEFAULT_BATCH_SIZE + \
+            [['B', decimal.Decimal('123456.789')]]
+        self.assertEqual(AParquetWriter(table, path).execute(),
+            DEFAULT_BATCH_SIZE + 1)
+        snapshot = ATable.open_snapshot(path)
+        self.assertEqual(snapshot.data[0], table.data[0])
+        self.assertEqual(snapshot.data[-1], table.data[-1])
+
+if __name__ == '__main__':
+    unittest.main()